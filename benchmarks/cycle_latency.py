@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+    Per-cycle latency benchmark for the CE test update loops
+
+    Purpose:
+        Measure how much of each test cycle the processing takes
+
+    Description:
+        The benchmark drives the MCC 118, 128 and 172 workers through their
+        processing path with synthetic scan blocks. It covers the channel
+        count and sample rate matrix, with and without NumPy. Each cycle is
+        timed in phases:
+
+            read     worker.scanRead() of a block that is already acquired
+            compute  the block statistics or RMS calculation, and the
+                     MCC 172 spectral monitor when NumPy is used
+            limits   worker.checkLimits()
+            log      writing the values to the session log (binary, or CSV
+                     with --log csv)
+            display  building the result record and the label text the GUI
+                     shows (the Tk redraw itself is not included)
+
+        The p50/p99 latency of each phase is printed and written to a JSON
+        file, which can be passed back with --compare to check a later
+        release against it. No board is needed; the simulated boards are
+        used unless DAQHATS_SIM is already set.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+for folder in ("mcc118", "mcc128", "mcc172"):
+    sys.path.insert(0, os.path.join(ROOT, folder))
+os.environ.setdefault("DAQHATS_SIM", "1")
+
+from ce_common.blockstats import numpy, HAVE_NUMPY
+from ce_common.binlog import BinaryLog
+from ce_common.csvlog import CsvLog
+import mcc118_worker
+import mcc128_worker
+import mcc172_worker
+
+PHASES = ["read", "compute", "limits", "log", "display"]
+LOGS = {"binary": BinaryLog, "csv": CsvLog}
+WARMUP_CYCLES = 3
+NOISE = 100e-6           # V rms of the synthetic blocks
+
+
+class SyntheticBoard(object):
+    """ Returns a prepared block from the scan reads, as a completed scan. """
+    def __init__(self, data):
+        self.data = data
+        self.array = numpy.array(data) if HAVE_NUMPY else None
+
+    def a_in_scan_read(self, samples_per_channel, timeout):
+        # the library builds a new list for every read
+        return CycleRead(list(self.data))
+
+    def a_in_scan_read_numpy(self, samples_per_channel, timeout):
+        return CycleRead(self.array.copy())
+
+
+class CycleRead(object):
+    def __init__(self, data):
+        self.data = data
+        self.running = False
+        self.hardware_overrun = False
+        self.buffer_overrun = False
+        self.triggered = False
+        self.timeout = False
+
+
+def makeWorker(board, channels, rate, use_numpy):
+    """ Return the worker and its cycle time in s. """
+    if board == "mcc118":
+        worker = mcc118_worker.Mcc118Worker(channels, rate,
+                                            use_numpy=use_numpy)
+        return worker, worker.scan_count / rate
+    if board == "mcc128":
+        worker = mcc128_worker.Mcc128Worker(channels, rate,
+                                            use_numpy=use_numpy)
+        return worker, 2 * mcc128_worker.PHASE_TIME
+    samples = max(int(rate * mcc172_worker.SCAN_SAMPLE_COUNT /
+                      mcc172_worker.SCAN_RATE), 1)
+    worker = mcc172_worker.Mcc172Worker(samples_per_channel=samples,
+                                        use_numpy=use_numpy,
+                                        spectrum=use_numpy)
+    return worker, 2 * worker.phase_time
+
+
+def compute(worker, data):
+    if isinstance(worker, mcc172_worker.Mcc172Worker):
+        if worker.spectrum:
+            worker.spectrum.process(data, worker.scan_count)
+        return worker.rms_engine.calculate(data, worker.scan_count)
+    return worker.block_stats.calculate(data, worker.scan_count)
+
+
+def displayTexts(result):
+    """ Build the label text the GUI sets from a result record. """
+    texts = ["{:.1f}".format(value) for value in result.values]
+    texts += ["{}".format(value) for value in result.failures]
+    texts.append("{}".format(result.trigger_errors))
+    texts.append("{}".format(result.software_errors))
+    texts.append("{}".format(result.test_count))
+    return texts
+
+
+def matrix(boards, quick):
+    """ Yield the (board, channels, rate) cases. """
+    for board in boards:
+        if board == "mcc172":
+            for divisor in ((1, 16) if quick else (1, 4, 16, 64)):
+                yield board, 2, 51200.0 / divisor
+            continue
+        channel_counts = (1, 8) if quick else range(1, 9)
+        for channels in channel_counts:
+            rate_max = int(100000 / channels)
+            rates = [rate_max] if quick else sorted(
+                set(rate for rate in (1000, 10000) if rate < rate_max) |
+                set([rate_max]))
+            for rate in rates:
+                yield board, channels, rate
+
+
+def percentile(values, fraction):
+    """ Nearest-rank percentile of a sorted list. """
+    index = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def summary(times):
+    times = sorted(times)
+    return {"p50_us": percentile(times, 0.50) * 1e6,
+            "p99_us": percentile(times, 0.99) * 1e6,
+            "mean_us": sum(times) / len(times) * 1e6,
+            "max_us": times[-1] * 1e6}
+
+
+def runCase(board, channels, rate, use_numpy, cycles, directory, log_type):
+    worker, cycle_time = makeWorker(board, channels, rate, use_numpy)
+    worker.baseline_set = True
+    samples = worker.scan_count * worker.num_channels
+    gauss = random.Random(0).gauss
+    worker.board = SyntheticBoard([gauss(0.0, NOISE) for _ in range(samples)])
+    worker.log = LOGS[log_type](board + "_bench",
+                                ["Ch {}".format(channel) for channel in
+                                 range(worker.num_channels)],
+                                directory=directory)
+
+    times = dict((phase, []) for phase in PHASES + ["total"])
+    clock = time.perf_counter
+    try:
+        for cycle in range(WARMUP_CYCLES + cycles):
+            worker.current_failures = 0
+            start = clock()
+            read_result = worker.scanRead(worker.scan_count, -1)
+            read_done = clock()
+            values = compute(worker, read_result.data)
+            compute_done = clock()
+            worker.checkLimits(values)
+            limits_done = clock()
+            worker.writeLog(worker.voltages[:worker.num_channels], "",
+                            datetime.datetime.now())
+            worker.test_count += 1
+            log_done = clock()
+            displayTexts(worker.result())
+            display_done = clock()
+
+            if cycle >= WARMUP_CYCLES:
+                times["read"].append(read_done - start)
+                times["compute"].append(compute_done - read_done)
+                times["limits"].append(limits_done - compute_done)
+                times["log"].append(log_done - limits_done)
+                times["display"].append(display_done - log_done)
+                times["total"].append(display_done - start)
+    finally:
+        worker.log.close()
+
+    phases = dict((phase, summary(values)) for phase, values in times.items())
+    return {"board": board, "channels": channels, "rate": rate,
+            "samples_per_channel": worker.scan_count, "numpy": use_numpy,
+            "cycle_time": cycle_time, "phases": phases,
+            "budget_used": phases["total"]["p99_us"] * 1e-6 / cycle_time}
+
+
+def caseKey(case):
+    return (case["board"], case["channels"], case["rate"], case["numpy"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the per-cycle processing latency of the tests.")
+    parser.add_argument("--boards", nargs="+",
+                        default=["mcc118", "mcc128", "mcc172"],
+                        choices=["mcc118", "mcc128", "mcc172"])
+    parser.add_argument("--cycles", type=int, default=50,
+                        help="measured cycles per case (default 50)")
+    parser.add_argument("--backend", choices=["numpy", "python", "both"],
+                        default="both" if HAVE_NUMPY else "python")
+    parser.add_argument("--log", choices=sorted(LOGS), default="binary",
+                        help="session log to write (default binary)")
+    parser.add_argument("--quick", action="store_true",
+                        help="only the lowest and highest channel counts")
+    parser.add_argument("--output", default="cycle_latency.json",
+                        help="JSON results file (default cycle_latency.json)")
+    parser.add_argument("--compare", metavar="JSON",
+                        help="earlier results to compare the p99 totals to")
+    args = parser.parse_args()
+
+    if args.backend != "python" and not HAVE_NUMPY:
+        parser.error("NumPy is not installed")
+    backends = {"numpy": [True], "python": [False],
+                "both": [True, False]}[args.backend]
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as compare_file:
+            baseline = dict((caseKey(case), case) for case in
+                            json.load(compare_file)["results"])
+
+    directory = tempfile.mkdtemp()
+    results = []
+    try:
+        for board, channels, rate in matrix(args.boards, args.quick):
+            for use_numpy in backends:
+                case = runCase(board, channels, rate, use_numpy, args.cycles,
+                               directory, args.log)
+                results.append(case)
+                line = "{} ch {} {:>8.1f} Hz {:<6}".format(
+                    board, channels, rate, "numpy" if use_numpy else "python")
+                for phase in PHASES + ["total"]:
+                    line += " {} {:.0f}/{:.0f}".format(
+                        phase, case["phases"][phase]["p50_us"],
+                        case["phases"][phase]["p99_us"])
+                line += " us, {:.2%} of cycle".format(case["budget_used"])
+                old = baseline.get(caseKey(case))
+                if old:
+                    line += ", p99 x{:.2f}".format(
+                        case["phases"]["total"]["p99_us"] /
+                        old["phases"]["total"]["p99_us"])
+                print(line)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report = {"version": 1,
+              "created": datetime.datetime.now().isoformat(),
+              "python": platform.python_version(),
+              "numpy": numpy.__version__ if HAVE_NUMPY else None,
+              "platform": platform.platform(),
+              "machine": platform.machine(),
+              "cycles": args.cycles,
+              "log": args.log,
+              "results": results}
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=1)
+    print("Results written to " + args.output)
+
+
+if __name__ == "__main__":
+    main()
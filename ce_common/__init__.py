@@ -0,0 +1,10 @@
+"""
+    Shared support for the MCC DAQ HAT CE test applications
+
+    Purpose:
+        Hold the code that is common to the board test programs
+
+    Description:
+        The board test programs add the top level of this repository to the
+        module search path and import these modules from it.
+"""
@@ -0,0 +1,195 @@
+"""
+    Background acquisition for the CE test applications
+
+    Purpose:
+        Run the board I/O for a test on its own thread
+
+    Description:
+        An AcquisitionWorker owns the board handle for a test session. It runs
+        the baseline, update, limit check and watchdog logic and hands a
+        result record to the GUI through a bounded queue at the end of every
+        cycle, so acquisition timing does not depend on the Tk mainloop. A
+        test runs one worker for each board address.
+"""
+from collections import namedtuple
+from ce_common.hats import hat_list
+from ce_common.phasetimer import PhaseTimer
+import datetime
+import queue
+import threading
+import time
+
+QUEUE_SIZE = 64          # results held for the GUI before old ones are dropped
+REOPEN_INTERVAL = 0.5    # s between attempts to open the board
+WATCHDOG_LIMIT = 5       # consecutive errors before the board is reopened
+
+# Result record for the analog input boards. The counters are running totals
+# so the GUI only needs the most recent record. peak_to_peak is the spread of
+# each channel in the last block, or None on boards that do not measure it.
+CycleResult = namedtuple(
+    'CycleResult', ['address', 'timestamp', 'ready', 'serial', 'values',
+                    'failures',
+                    'current_failures', 'test_count', 'software_errors',
+                    'trigger_errors', 'status', 'stats',
+                    'spectrum_flags', 'peak_to_peak'])
+
+
+def find_boards(hat_id):
+    """
+    Return the addresses of all boards of the given type. If none are found
+    address 0 is returned so the test keeps trying to open it as before.
+    """
+    addresses = [info.address for info in hat_list(filter_by_id=hat_id)]
+    if not addresses:
+        addresses = [0]
+    return sorted(addresses)
+
+
+class AcquisitionWorker(threading.Thread):
+    """
+    Base class for the board acquisition threads.
+
+    Subclasses implement initBoard(), closeBoard(), establishBaseline(),
+    updateInputs() and result(). updateInputs() performs one test cycle and
+    calls publish() with the result and writeLog() with the logged values.
+    A board with extra results reports them through reportLines() and
+    metrics().
+    """
+    def __init__(self, name, address=0, watchdog=False, log=None,
+                 log_group=0, timing=False):
+        threading.Thread.__init__(
+            self, name="{} {}".format(name, address), daemon=True)
+        self.address = address
+        self.results = queue.Queue(maxsize=QUEUE_SIZE)
+        self.dropped_results = 0
+        self.watchdog = watchdog
+        self.log = log
+        self.log_group = log_group
+        self.board = None
+        self.device_open = False
+        self.serial = ""
+        self.baseline_set = False
+        self.watchdog_count = 0
+        self.test_count = 0
+        self.software_errors = 0
+        self.current_failures = 0
+        self.cycle_period = 0.0
+        self.max_cycle_period = 0.0
+        self._cycle_start = None
+        # phase timing histograms, idle unless timing is on
+        self.timer = PhaseTimer(timing)
+        self.capture = None
+        self.stats = None
+        self.spectrum = None
+        self.scheduler = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped():
+                if not self.device_open:
+                    # Open the device
+                    self.initBoard()
+                    if not self.device_open:
+                        # report the error and schedule another attempt
+                        self.publish(self.result())
+                        self.sleep(REOPEN_INTERVAL)
+                        continue
+                    if self.log:
+                        self.log.describe(self.log_group, address=self.address,
+                                          serial=self.serial)
+                    if self.capture:
+                        self.capture.serial = self.serial
+
+                if self.baseline_set:
+                    self.timeCycle()
+                    self.updateInputs()
+                else:
+                    self.establishBaseline()
+
+                if (self.watchdog and
+                        self.watchdog_count >= WATCHDOG_LIMIT):
+                    # close the board so it is reopened on the next cycle
+                    self.closeBoard()
+                    self.watchdog_count = 0
+        finally:
+            self.closeBoard()
+            if self.capture:
+                self.capture.close()
+
+    def timeCycle(self):
+        """ Measure the time since the start of the previous cycle. """
+        now = time.monotonic()
+        if self._cycle_start is not None:
+            self.cycle_period = now - self._cycle_start
+            if self.cycle_period > self.max_cycle_period:
+                self.max_cycle_period = self.cycle_period
+        self._cycle_start = now
+
+    def stop(self, timeout=5.0):
+        """ Ask the worker to finish and wait for it to release the board. """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def sleep(self, seconds):
+        """ Sleep for the given time, returning early if stop() is called. """
+        if seconds > 0:
+            self._stop_event.wait(seconds)
+
+    def publish(self, result):
+        """
+        Pass a result to the GUI. If the GUI has fallen behind the oldest
+        result is discarded; the counters in the newest one are still correct.
+        """
+        while True:
+            try:
+                self.results.put_nowait(result)
+                return
+            except queue.Full:
+                try:
+                    self.results.get_nowait()
+                    self.dropped_results += 1
+                except queue.Empty:
+                    pass
+
+    def writeLog(self, values, status="", timestamp=None):
+        """
+        Log this cycle's values and status. Call it before test_count is
+        incremented so the boards' rows line up.
+        """
+        if self.log:
+            if timestamp is None:
+                timestamp = datetime.datetime.now()
+            self.log.write(self.log_group, self.test_count, timestamp, values,
+                           status, self.current_failures > 0)
+
+    def reportLines(self, summary=False):
+        """
+        Return lines of text with any board specific results for the status
+        report, or for the summary file when summary is True.
+        """
+        return []
+
+    def metrics(self):
+        """ Return any board specific results as ce_common.metrics Metrics. """
+        return []
+
+    # Board specific methods
+    def initBoard(self):
+        raise NotImplementedError
+
+    def closeBoard(self):
+        raise NotImplementedError
+
+    def establishBaseline(self):
+        raise NotImplementedError
+
+    def updateInputs(self):
+        raise NotImplementedError
+
+    def result(self, status=""):
+        raise NotImplementedError
@@ -0,0 +1,205 @@
+"""
+    Analog output sweep for the CE test applications
+
+    Purpose:
+        Check the analog output over a table of DAC codes, not just one
+
+    Description:
+        An AoSweep steps through a table of output codes, one step per test
+        cycle. The DMM takes a buffer of readings at each step in one
+        transaction, and add() stores them as a row of a (points, samples)
+        block. When the last code of the table has been read the whole
+        block is evaluated in one pass: the mean and standard deviation of
+        each point, its error from the ideal output, and a straight line
+        fit of the means against the codes giving the gain, the offset and
+        the integral and differential nonlinearity (INL and DNL) in LSB.
+
+        With NumPy the block is an array and each result is one vectorized
+        call; without it the rows are reduced with the builtins.
+"""
+from collections import namedtuple
+from math import sqrt
+
+from ce_common.blockstats import numpy, HAVE_NUMPY
+from ce_common.metrics import Metric
+
+DEFAULT_CODES = [0, 512, 1024, 1536, 2048, 2560, 3072, 3584, 4095]
+DEFAULT_SAMPLES = 4       # DMM readings per step
+
+SweepPoint = namedtuple(
+    'SweepPoint', ['code', 'expected', 'mean', 'std_dev', 'error', 'inl',
+                   'failures'])
+
+# The evaluation of the latest complete pass. gain is in V per code, the
+# offset in V, the INL and DNL in LSB and dnl[i] is between points i and i+1.
+SweepResult = namedtuple(
+    'SweepResult', ['passes', 'gain', 'offset', 'max_error', 'max_inl',
+                    'max_dnl', 'dnl', 'points'])
+
+# Sweep results of the last pass: (field, metric name, type, help)
+SWEEP_METRICS = [
+    ("passes", "ao_sweep_passes_total", "counter",
+     "Analog output sweep passes completed"),
+    ("max_error", "ao_sweep_error_volts_max", "gauge",
+     "Largest analog output error in the last sweep pass"),
+    ("max_inl", "ao_sweep_inl_lsb_max", "gauge",
+     "Largest integral nonlinearity in the last sweep pass"),
+    ("max_dnl", "ao_sweep_dnl_lsb_max", "gauge",
+     "Largest differential nonlinearity in the last sweep pass"),
+]
+
+
+def parseCodes(text, max_code):
+    """
+    Return the codes in a comma separated list such as "0,2048,4095". The
+    codes must rise so the steps between them can be checked.
+    """
+    codes = [int(code, 0) for code in text.replace(",", " ").split()]
+    for code in codes:
+        if code < 0 or code > max_code:
+            raise ValueError("Code {} is out of range".format(code))
+    if len(codes) < 2:
+        raise ValueError("A sweep needs at least two codes")
+    if any(second <= first for first, second in zip(codes, codes[1:])):
+        raise ValueError("The sweep codes must rise")
+    return codes
+
+
+class AoSweep(object):
+    """
+    A sweep of the given codes with a number of DMM readings at each step.
+    A point fails when the mean of its readings is more than limit V from
+    the ideal output.
+    """
+    def __init__(self, codes, samples, max_code, max_range, limit,
+                 use_numpy=HAVE_NUMPY):
+        self.codes = list(codes)
+        self.samples = samples
+        self.limit = limit
+        self.lsb = max_range / float(max_code + 1)
+        self.expected = [code * self.lsb for code in self.codes]
+        self.use_numpy = use_numpy and HAVE_NUMPY
+        if self.use_numpy:
+            self._block = numpy.zeros((len(self.codes), samples))
+            self._codes = numpy.array(self.codes, dtype=float)
+            self._expected = numpy.array(self.expected)
+        else:
+            self._block = [[0.0]*samples for _ in self.codes]
+        self.index = 0
+        self.passes = 0
+        self.failures = [0]*len(self.codes)
+        self.result = None
+
+    def code(self):
+        """ Return the code of the current step. """
+        return self.codes[self.index]
+
+    def voltage(self):
+        """ Return the ideal output voltage of the current step. """
+        return self.expected[self.index]
+
+    def add(self, readings):
+        """
+        Store the readings of the current step and move to the next one.
+        Returns the mean of the readings and its error from the ideal
+        output.
+        """
+        if len(readings) != self.samples:
+            raise ValueError("Expected {} readings, got {}".format(
+                self.samples, len(readings)))
+        index = self.index
+        self._block[index][:] = readings
+        mean = sum(readings) / float(self.samples)
+        error = mean - self.expected[index]
+        if abs(error) > self.limit:
+            self.failures[index] += 1
+        self.index += 1
+        if self.index == len(self.codes):
+            self.index = 0
+            self.passes += 1
+            self.result = self.evaluate()
+        return mean, error
+
+    def evaluate(self):
+        """ Evaluate the readings of the last complete pass. """
+        if self.use_numpy:
+            block = self._block
+            means = block.mean(axis=1)
+            std_devs = block.std(axis=1, ddof=1 if self.samples > 1 else 0)
+            errors = means - self._expected
+            gain, offset = numpy.polyfit(self._codes, means, 1)
+            inl = (means - (gain * self._codes + offset)) / self.lsb
+            dnl = numpy.diff(means) / (numpy.diff(self._codes) * self.lsb) - 1
+            means, std_devs, errors, inl, dnl = (
+                means.tolist(), std_devs.tolist(), errors.tolist(),
+                inl.tolist(), dnl.tolist())
+        else:
+            count = len(self.codes)
+            means = [sum(row) / float(self.samples) for row in self._block]
+            std_devs = [_stdDev(row, mean)
+                        for row, mean in zip(self._block, means)]
+            errors = [mean - expected
+                      for mean, expected in zip(means, self.expected)]
+            # least squares line through the means
+            code_mean = sum(self.codes) / float(count)
+            value_mean = sum(means) / count
+            gain = (sum((code - code_mean) * (mean - value_mean)
+                        for code, mean in zip(self.codes, means)) /
+                    sum((code - code_mean) ** 2 for code in self.codes))
+            offset = value_mean - gain * code_mean
+            inl = [(mean - (gain * code + offset)) / self.lsb
+                   for code, mean in zip(self.codes, means)]
+            dnl = [(means[i + 1] - means[i]) /
+                   ((self.codes[i + 1] - self.codes[i]) * self.lsb) - 1
+                   for i in range(count - 1)]
+        points = [SweepPoint(*values) for values in zip(
+            self.codes, self.expected, means, std_devs, errors, inl,
+            self.failures)]
+        return SweepResult(
+            self.passes, float(gain), float(offset),
+            max(abs(error) for error in errors),
+            max(abs(value) for value in inl),
+            max(abs(value) for value in dnl) if dnl else 0.0, dnl, points)
+
+
+def _stdDev(values, mean):
+    if len(values) < 2:
+        return 0.0
+    return sqrt(sum((value - mean) ** 2 for value in values) /
+                (len(values) - 1))
+
+
+def sweepLines(result, lsb):
+    """ Return the evaluation of a sweep pass as lines of text. """
+    lines = ["AO sweep: {} passes, gain error {:+.3f} %, offset {:+.3f} mV, "
+             "max error {:.3f} mV, max INL {:.2f} LSB, max DNL {:.2f} LSB"
+             .format(result.passes, (result.gain / lsb - 1) * 100.0,
+                     result.offset * 1000.0, result.max_error * 1000.0,
+                     result.max_inl, result.max_dnl),
+             "{:>6} {:>10} {:>10} {:>10} {:>10} {:>8} {:>8}".format(
+                 "Code", "Ideal V", "Mean V", "Std mV", "Error mV",
+                 "INL LSB", "Failures")]
+    for point in result.points:
+        lines.append("{:>6} {:>10.6f} {:>10.6f} {:>10.3f} {:>10.3f} {:>8.2f} "
+                     "{:>8}".format(point.code, point.expected, point.mean,
+                                    point.std_dev * 1000.0,
+                                    point.error * 1000.0, point.inl,
+                                    point.failures))
+    return lines
+
+
+def sweepMetrics(sweep):
+    """ Return the results of a sweep as ce_common.metrics Metrics. """
+    if sweep.result is None:
+        return []
+    metrics = [Metric(name, kind, text, [], getattr(sweep.result, field))
+               for field, name, kind, text in SWEEP_METRICS]
+    metrics.extend(Metric("ao_sweep_error_volts", "gauge",
+                          "Analog output error per code in the last sweep "
+                          "pass", [("code", point.code)], point.error)
+                   for point in sweep.result.points)
+    metrics.extend(Metric("ao_sweep_failures_total", "counter",
+                          "Analog output sweep limit failures per code",
+                          [("code", code)], count)
+                   for code, count in zip(sweep.codes, sweep.failures))
+    return metrics
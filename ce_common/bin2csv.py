@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+    Binary session log to CSV converter
+
+    Purpose:
+        Convert the binary CE test logs to CSV files
+
+    Description:
+        The CSV file has the same layout as the CSV logs of the test apps,
+        one row per test cycle with a group of columns for each board, but
+        the values and times are written at full precision. Run it from the
+        top level of the repository:
+
+            python3 -m ce_common.bin2csv data/mcc128_test_<date>.bin
+
+        The header, board serial numbers and failure flags are printed with
+        --info.
+"""
+import argparse
+import datetime
+import math
+import sys
+
+from ce_common.binlog import readLog, statusText, CYCLE_FAILED
+from ce_common.csvlog import CsvLog
+
+DEFAULT_FORMAT = "{:.9g}"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def convert(filename, csv_filename=None, value_format=DEFAULT_FORMAT):
+    """ Convert a binary log to CSV and return the CSV file name. """
+    header, _infos, records = readLog(filename)
+    if csv_filename is None:
+        csv_filename = filename.rsplit(".", 1)[0] + ".csv"
+    groups = header["groups"]
+    log = CsvLog(header["board"], header["columns"], groups,
+                 formats=value_format, filename=csv_filename,
+                 time_format=TIME_FORMAT, queue_size=0)
+    try:
+        for timestamp, cycle, group, flags, values in records:
+            values = [None if math.isnan(value) else value
+                      for value in values]
+            log.write(group, cycle,
+                      datetime.datetime.fromtimestamp(timestamp / 1e9),
+                      values, statusText(flags))
+    finally:
+        log.close()
+    return csv_filename
+
+
+def printInfo(filename):
+    header, infos, records = readLog(filename)
+    for key in sorted(header):
+        print("{}: {}".format(key, header[key]))
+    groups = header["groups"] or [header["board"]]
+    for info in infos:
+        print("{} opened: {}".format(
+            groups[info["group"]], ", ".join(
+                "{} {}".format(key, value) for key, value in
+                sorted(info.items()) if key != "group")))
+    for index, group in enumerate(groups):
+        cycles = [record for record in records if record[2] == index]
+        failed = sum(1 for record in cycles if record[3] & CYCLE_FAILED)
+        print("{}: {} cycles, {} failed".format(group, len(cycles), failed))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert binary CE test logs to CSV.")
+    parser.add_argument("logs", nargs="+", help="binary log files")
+    parser.add_argument("--output", help="CSV file name (one log only)")
+    parser.add_argument("--format", default=DEFAULT_FORMAT,
+                        help="value format (default {})".format(
+                            DEFAULT_FORMAT))
+    parser.add_argument("--info", action="store_true",
+                        help="print the log header instead of converting")
+    args = parser.parse_args()
+    if args.output and len(args.logs) > 1:
+        parser.error("--output can only be used with one log")
+
+    for filename in args.logs:
+        if args.info:
+            printInfo(filename)
+        else:
+            print(convert(filename, args.output, args.format))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+    Binary session log for the CE test applications
+
+    Purpose:
+        Log every value at full precision with little work per cycle
+
+    Description:
+        The log is an append-only file of chunks. It starts with MAGIC and a
+        header chunk, then has one record chunk per board per test cycle.
+        The header is JSON describing the test: board, columns, board groups,
+        rate, limits and so on. A record holds the epoch timestamp in ns,
+        the test cycle, the board group, the status flags and one float64
+        per column, with NaN for a missing value. When a board is opened an
+        info chunk with its address and serial number is appended.
+
+        Chunks start with a type byte. Header and info chunks follow it with
+        a uint32 length and UTF-8 JSON; record chunks are a fixed RECORD
+        struct. All values are little-endian. Convert a log to CSV with
+        ce_common.bin2csv. The file is written by a LogWriter thread.
+"""
+from collections import OrderedDict
+import datetime
+import json
+import math
+import os
+import struct
+import threading
+
+from ce_common.logwriter import LogWriter, FLUSH_INTERVAL
+
+MAGIC = b"CEBLOG1\n"
+HEADER_CHUNK = b"H"
+INFO_CHUNK = b"I"
+RECORD_CHUNK = b"R"
+LENGTH = struct.Struct("<I")
+# timestamp (ns), cycle, group, status flags; the column values follow
+RECORD = struct.Struct("<qIHH")
+
+# status flags
+SOFTWARE_ERROR = 0x0001
+SCAN_OVERRUN = 0x0002
+TRIGGER_ERROR = 0x0004
+CYCLE_FAILED = 0x0008     # the cycle counted a failure
+OPEN_TC = 0x0010          # an MCC 134 thermocouple is open
+COMMON_MODE = 0x0020      # an MCC 134 input is out of common mode range
+DIO_STRESS = 0x0040       # the MCC 152 DIO stress pattern had errors
+OTHER_STATUS = 0x8000
+
+# A status is one or more of these texts separated by "; ", each optionally
+# followed by detail such as the channels
+STATUS_FLAGS = OrderedDict([("Software error", SOFTWARE_ERROR),
+                            ("Scan overrun", SCAN_OVERRUN),
+                            ("Trigger error", TRIGGER_ERROR),
+                            ("Open TC", OPEN_TC),
+                            ("Common mode", COMMON_MODE),
+                            ("DIO stress errors", DIO_STRESS)])
+
+
+def epochNs(timestamp):
+    """ Return a datetime as integer ns since the epoch. """
+    return (int(timestamp.replace(microsecond=0).timestamp()) * 1000000000 +
+            timestamp.microsecond * 1000)
+
+
+def statusFlags(status, failed=False):
+    flags = CYCLE_FAILED if failed else 0
+    for part in status.split("; ") if status else []:
+        for text, flag in STATUS_FLAGS.items():
+            if part.startswith(text):
+                flags |= flag
+                break
+        else:
+            flags |= OTHER_STATUS
+    return flags
+
+
+def statusText(flags):
+    """ Return the status text logged in the CSV file for the flags. """
+    return "; ".join(text for text, flag in STATUS_FLAGS.items()
+                     if flags & flag)
+
+
+class BinaryLog(object):
+    def __init__(self, prefix, columns, groups=None, directory='./data',
+                 info=None, flush_interval=FLUSH_INTERVAL, fsync=False):
+        """
+        Create the log file. columns are the per-board column names; groups
+        are the labels of the boards, or None for a single board. info is a
+        dict of test settings for the header, such as the rate and limits.
+        flush_interval and fsync set how often the file is flushed to the
+        storage.
+        """
+        if not os.path.isdir(directory):
+            # create the data directory
+            os.mkdir(directory)
+        self.filename = os.path.join(
+            directory, prefix + "_test_" + datetime.datetime.now().strftime(
+                "%d-%m-%Y_%H-%M-%S") + ".bin")
+        self.num_columns = len(columns)
+        self._record = struct.Struct(
+            RECORD.format + "{}d".format(self.num_columns))
+        self._lock = threading.Lock()
+        self.writer = LogWriter(self.filename, 'wb',
+                                flush_interval=flush_interval, fsync=fsync)
+
+        header = {"board": prefix, "columns": list(columns),
+                  "groups": list(groups) if groups else None,
+                  "created": datetime.datetime.now().isoformat()}
+        header.update(info or {})
+        self.writer.write(MAGIC)
+        self._writeJson(HEADER_CHUNK, header)
+
+    def _writeJson(self, chunk_type, value):
+        data = json.dumps(value).encode("utf-8")
+        self.writer.write(chunk_type + LENGTH.pack(len(data)) + data)
+
+    def describe(self, group, **info):
+        """ Record information about a board, such as its serial number. """
+        info["group"] = group
+        with self._lock:
+            if self.writer is not None:
+                self._writeJson(INFO_CHUNK, info)
+
+    def write(self, group, cycle, timestamp, values, status="", failed=False):
+        """
+        Log the values and status of one board for a test cycle. Missing
+        values, or None, are logged as NaN.
+        """
+        values = list(values)[:self.num_columns]
+        values = [math.nan if value is None else value for value in values]
+        values += [math.nan]*(self.num_columns - len(values))
+        record = RECORD_CHUNK + self._record.pack(
+            epochNs(timestamp), cycle, group, statusFlags(status, failed),
+            *values)
+        with self._lock:
+            if self.writer is not None:
+                self.writer.write(record)
+
+    def stats(self):
+        """ Return the writer statistics, or None once the log is closed. """
+        writer = self.writer
+        return writer.stats() if writer else None
+
+    def close(self):
+        with self._lock:
+            if self.writer is None:
+                return
+            writer = self.writer
+            self.writer = None
+        writer.close()
+
+
+def readLog(filename):
+    """
+    Read a binary log, returning (header, infos, records). records are
+    (timestamp_ns, cycle, group, flags, values) tuples. A record cut short
+    at the end of the file by a crash is ignored.
+    """
+    with open(filename, 'rb') as logfile:
+        data = logfile.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(filename + " is not a binary CE test log")
+
+    header = None
+    infos = []
+    records = []
+    record = None
+    offset = len(MAGIC)
+    while offset < len(data):
+        chunk_type = data[offset:offset + 1]
+        offset += 1
+        if chunk_type in (HEADER_CHUNK, INFO_CHUNK):
+            if offset + LENGTH.size > len(data):
+                break
+            length = LENGTH.unpack_from(data, offset)[0]
+            offset += LENGTH.size
+            if offset + length > len(data):
+                break
+            value = json.loads(data[offset:offset + length].decode("utf-8"))
+            offset += length
+            if chunk_type == HEADER_CHUNK:
+                header = value
+                record = struct.Struct(
+                    RECORD.format + "{}d".format(len(header["columns"])))
+            else:
+                infos.append(value)
+        elif chunk_type == RECORD_CHUNK and record is not None:
+            if offset + record.size > len(data):
+                break
+            fields = record.unpack_from(data, offset)
+            offset += record.size
+            records.append(fields[:4] + (fields[4:],))
+        else:
+            raise ValueError("Bad chunk in {} at {}".format(filename,
+                                                            offset - 1))
+    return header, infos, records
@@ -0,0 +1,63 @@
+"""
+    Block statistics for the CE test applications
+
+    Purpose:
+        Reduce a block of interleaved scan data to per-channel values
+
+    Description:
+        The scans return the samples for all channels interleaved in one
+        buffer. When NumPy is installed the block is reshaped to
+        (samples, channels) without copying and reduced with vectorized calls
+        into preallocated result arrays. Without NumPy the per-channel samples
+        are taken with list slices and reduced with the builtins.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+HAVE_NUMPY = numpy is not None
+
+
+class BlockStats(object):
+    """
+    Per-channel mean, minimum, maximum and peak-to-peak of a block of
+    interleaved samples. The result arrays are reused for every block.
+    """
+    def __init__(self, num_channels, use_numpy=HAVE_NUMPY):
+        self.num_channels = num_channels
+        self.use_numpy = use_numpy and HAVE_NUMPY
+        if self.use_numpy:
+            self.mean = numpy.zeros(num_channels)
+            self.minimum = numpy.zeros(num_channels)
+            self.maximum = numpy.zeros(num_channels)
+            self.peak_to_peak = numpy.zeros(num_channels)
+        else:
+            self.mean = [0.0]*num_channels
+            self.minimum = [0.0]*num_channels
+            self.maximum = [0.0]*num_channels
+            self.peak_to_peak = [0.0]*num_channels
+
+    def calculate(self, data, samples_per_channel):
+        """
+        Calculate the statistics for the first samples_per_channel samples of
+        each channel in data, returning the per-channel means.
+        """
+        num_channels = self.num_channels
+        count = samples_per_channel * num_channels
+        if self.use_numpy and isinstance(data, numpy.ndarray):
+            # a view of the scan buffer with one column per channel
+            block = data[:count].reshape(samples_per_channel, num_channels)
+            block.mean(axis=0, out=self.mean)
+            block.min(axis=0, out=self.minimum)
+            block.max(axis=0, out=self.maximum)
+            numpy.subtract(self.maximum, self.minimum, out=self.peak_to_peak)
+        else:
+            for channel in range(num_channels):
+                samples = data[channel:count:num_channels]
+                self.mean[channel] = sum(samples) / samples_per_channel
+                self.minimum[channel] = min(samples)
+                self.maximum[channel] = max(samples)
+                self.peak_to_peak[channel] = (self.maximum[channel] -
+                                              self.minimum[channel])
+        return self.mean
@@ -0,0 +1,171 @@
+"""
+    Raw data capture for the CE test applications
+
+    Purpose:
+        Save the raw samples around a test failure
+
+    Description:
+        A CaptureBuffer keeps the last RING_TIME seconds of raw scan blocks
+        for one board. The worker adds each block it reads and calls
+        trigger() when a limit or the trigger test fails. The blocks from
+        pre_time before the failing block to post_time after it are then
+        frozen and written to a capture CSV file on the buffer's own thread,
+        so the acquisition cycle is not held up. The blocks are kept as read,
+        without copying the samples.
+
+        The sample times in the file are relative to the end of the failing
+        block. They are calculated from the time each block was read, so
+        they are approximate for the scans that are read after they
+        complete.
+"""
+import collections
+import datetime
+import os
+import queue
+import threading
+
+from ce_common.blockstats import numpy, HAVE_NUMPY
+
+RING_TIME = 4.0          # s of samples kept
+PRE_TIME = 2.0           # s captured before the failing block
+POST_TIME = 1.0          # s captured after the failing block
+MAX_CAPTURES = 20        # captures written per board per session
+
+# A block of interleaved samples and the time it was read
+Block = collections.namedtuple('Block', ['timestamp', 'data',
+                                         'samples_per_channel'])
+
+
+class CaptureBuffer(object):
+    def __init__(self, prefix, address, num_channels, rate,
+                 directory='./data', pre_time=PRE_TIME, post_time=POST_TIME,
+                 ring_time=RING_TIME, max_captures=MAX_CAPTURES):
+        self.prefix = prefix
+        self.address = address
+        self.serial = ""
+        self.num_channels = num_channels
+        self.rate = float(rate)
+        self.directory = directory
+        self.pre_time = pre_time
+        self.post_time = post_time
+        self.ring_time = max(ring_time, pre_time + post_time)
+        self.max_captures = max_captures
+        self.captures = 0
+        self.write_errors = 0
+        self.filenames = []
+        self._blocks = collections.deque()
+        self._event = None
+        self._last_event = None
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def _duration(self, block):
+        return datetime.timedelta(
+            seconds=block.samples_per_channel / self.rate)
+
+    def add(self, data, samples_per_channel, timestamp=None):
+        """ Add a block of interleaved samples that was just read. """
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+        block = Block(timestamp, data, samples_per_channel)
+        self._blocks.append(block)
+
+        # drop the blocks that ended before the ring time
+        oldest = (timestamp - self._duration(block) -
+                  datetime.timedelta(seconds=self.ring_time))
+        while self._blocks and self._blocks[0].timestamp < oldest:
+            self._blocks.popleft()
+
+        if (self._event is not None and
+                timestamp >= self._event[1] +
+                datetime.timedelta(seconds=self.post_time)):
+            self._freeze()
+
+    def trigger(self, reason):
+        """
+        Capture the samples around the last block added. Triggers that would
+        overlap the last capture are ignored, so a failure that persists
+        does not save the same samples again.
+        """
+        if (self._event is not None or not self._blocks or
+                self.captures >= self.max_captures):
+            return
+        event_time = self._blocks[-1].timestamp
+        if (self._last_event is not None and
+                event_time - self._last_event < datetime.timedelta(
+                    seconds=self.pre_time + self.post_time)):
+            return
+        self.captures += 1
+        self._last_event = event_time
+        self._event = (reason, event_time)
+        if self.post_time <= 0:
+            self._freeze()
+
+    def _freeze(self):
+        reason, event_time = self._event
+        self._event = None
+        start = event_time - datetime.timedelta(seconds=self.pre_time)
+        blocks = [block for block in self._blocks if block.timestamp > start]
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._writer, name="capture {}".format(self.address),
+                daemon=True)
+            self._thread.start()
+        self._queue.put((reason, event_time, self.serial, blocks))
+
+    def _writer(self):
+        while True:
+            capture = self._queue.get()
+            if capture is None:
+                return
+            try:
+                self.filenames.append(self._write(*capture))
+            except OSError:
+                self.write_errors += 1
+
+    def _write(self, reason, event_time, serial, blocks):
+        if not os.path.isdir(self.directory):
+            os.mkdir(self.directory)
+        filename = os.path.join(
+            self.directory, "{}_capture_{}_bd{}.csv".format(
+                self.prefix, event_time.strftime("%d-%m-%Y_%H-%M-%S-%f"),
+                self.address))
+        with open(filename, 'w') as capture_file:
+            capture_file.write(
+                "# {} address {} serial {}\n# {} at {}\n# rate {:g} Hz\n"
+                .format(self.prefix, self.address, serial, reason,
+                        event_time.isoformat(), self.rate))
+            capture_file.write("Time (s)," + ",".join(
+                "Ch {}".format(channel) for channel in
+                range(self.num_channels)) + "\n")
+            for block in blocks:
+                # block start relative to the event
+                first = ((block.timestamp - event_time).total_seconds() -
+                         block.samples_per_channel / self.rate)
+                self._writeBlock(capture_file, block, first)
+        return filename
+
+    def _writeBlock(self, capture_file, block, first):
+        count = block.samples_per_channel
+        if HAVE_NUMPY and isinstance(block.data, numpy.ndarray):
+            times = first + numpy.arange(1, count + 1) / self.rate
+            numpy.savetxt(capture_file, numpy.column_stack(
+                (times, block.data[:count*self.num_channels].reshape(
+                    count, self.num_channels))),
+                fmt="%.9g", delimiter=",")
+            return
+        for index in range(count):
+            row = block.data[index*self.num_channels:
+                             (index + 1)*self.num_channels]
+            capture_file.write(
+                "{:.9g},".format(first + (index + 1) / self.rate) +
+                ",".join("{:.9g}".format(value) for value in row) + "\n")
+
+    def close(self, timeout=5.0):
+        """ Write a capture still waiting for samples and stop the writer. """
+        if self._event is not None:
+            self._freeze()
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,120 @@
+"""
+    CSV session log for the CE test applications
+
+    Purpose:
+        Log the results of one or more boards to a single CSV file
+
+    Description:
+        Each board has a group of columns followed by a status column. The
+        workers write their fields for each test cycle from their own threads
+        and a row is written once every board has reported that cycle. If a
+        board stops reporting, rows are written with its group left empty as
+        soon as another board is LAG_CYCLES cycles ahead. The log has the
+        same interface as BinaryLog; the values are formatted here for the
+        text file, which is written by a LogWriter thread.
+"""
+import datetime
+import os
+import threading
+
+from ce_common.logwriter import LogWriter, FLUSH_INTERVAL, QUEUE_SIZE
+
+LAG_CYCLES = 2           # cycles to wait for a board before logging without it
+
+
+class CsvLog(object):
+    def __init__(self, prefix, columns, groups=None, directory='./data',
+                 info=None, formats="{:.1f}", filename=None,
+                 time_format="%H:%M:%S", flush_interval=FLUSH_INTERVAL,
+                 fsync=False, queue_size=QUEUE_SIZE):
+        """
+        Create the log file. columns are the per-board column names; groups
+        are the labels of the boards, or None to log a single board with the
+        plain column names. formats is the format string for the values, or a
+        list with one per column. info is only used by the binary log.
+        flush_interval, fsync and queue_size are passed to the LogWriter.
+        """
+        if not os.path.isdir(directory):
+            # create the data directory
+            os.mkdir(directory)
+        if filename is None:
+            filename = os.path.join(
+                directory, prefix + "_test_" +
+                datetime.datetime.now().strftime("%d-%m-%Y_%H-%M-%S") + ".csv")
+        self.filename = filename
+        self.num_columns = len(columns)
+        if isinstance(formats, str):
+            formats = [formats]*self.num_columns
+        self.formats = list(formats)
+        self.time_format = time_format
+        self.num_groups = len(groups) if groups else 1
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.writer = LogWriter(self.filename, 'w',
+                                flush_interval=flush_interval, fsync=fsync,
+                                queue_size=queue_size)
+
+        if groups:
+            header = ",".join(
+                ",".join("{} {}".format(group, column) for column in
+                         list(columns) + ["Status"]) for group in groups)
+        else:
+            header = ",".join(list(columns) + ["Status"])
+        self.writer.write("Time," + header + "\n")
+
+    def describe(self, group, **info):
+        """ The CSV file has no place for board information. """
+        pass
+
+    def write(self, group, cycle, timestamp, values, status="", failed=False):
+        """
+        Log the values and status of one board for a test cycle. Missing
+        trailing values, or None, are left empty. failed is only used by the
+        binary log.
+        """
+        fields = ["" if value is None else form.format(value)
+                  for form, value in zip(self.formats, values)]
+        fields += [""]*(self.num_columns - len(fields))
+        text = ",".join(fields + [status])
+
+        with self._lock:
+            if self.writer is None:
+                return
+            if cycle not in self._pending:
+                self._pending[cycle] = [timestamp, [None]*self.num_groups]
+            self._pending[cycle][1][group] = text
+
+            # write the rows that are complete or that a board has left
+            # behind
+            while self._pending:
+                oldest = min(self._pending)
+                row = self._pending[oldest]
+                if (None in row[1] and
+                        max(self._pending) - oldest < LAG_CYCLES):
+                    break
+                self._writeRow(row)
+                del self._pending[oldest]
+
+    def _writeRow(self, row):
+        timestamp, texts = row
+        empty = ","*self.num_columns
+        self.writer.write(
+            timestamp.strftime(self.time_format) + "," +
+            ",".join(empty if text is None else text for text in texts) +
+            "\n")
+
+    def stats(self):
+        """ Return the writer statistics, or None once the log is closed. """
+        writer = self.writer
+        return writer.stats() if writer else None
+
+    def close(self):
+        with self._lock:
+            if self.writer is None:
+                return
+            for cycle in sorted(self._pending):
+                self._writeRow(self._pending[cycle])
+            self._pending = {}
+            writer = self.writer
+            self.writer = None
+        writer.close()
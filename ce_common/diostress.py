@@ -0,0 +1,208 @@
+"""
+    DIO stress patterns for the CE test applications
+
+    Purpose:
+        Catch short upsets of the MCC 152 digital I/O during an immunity test
+
+    Description:
+        The normal loopback check changes the outputs once a cycle, so an
+        event much shorter than the cycle rarely meets a transition. A
+        DioStress drives a deterministic pattern through the four loopback
+        pins as fast as the bus allows: write the outputs, read the inputs
+        back and compare, over and over. The patterns are
+
+            walk     walking ones, 0001 0010 0100 1000
+            prbs     four bits at a time of a PRBS7 sequence
+            toggle   all pins toggling, 0000 1111
+
+        It counts the pin transitions, the checks and the errors of each
+        pin, and groups errors less than BURST_GAP apart into bursts with
+        the time they started and ended.
+"""
+from collections import deque, namedtuple, OrderedDict
+import datetime
+import time
+
+from ce_common.metrics import Metric
+
+BURST_GAP = 0.01          # s between errors that belong to the same burst
+MAX_BURSTS = 100          # most recent bursts kept
+NUM_PINS = 4
+
+# A group of errors. bits is the mask of the pins that failed in it.
+ErrorBurst = namedtuple('ErrorBurst', ['start', 'end', 'errors', 'bits'])
+
+StressStats = namedtuple(
+    'StressStats', ['pattern', 'checks', 'transitions', 'seconds',
+                    'transition_rate', 'bit_errors', 'error_rates',
+                    'burst_count', 'bursts'])
+
+# DIO stress statistics: (field, metric name, type, help)
+STRESS_METRICS = [
+    ("checks", "dio_stress_checks_total", "counter",
+     "DIO stress pattern values checked"),
+    ("transitions", "dio_stress_transitions_total", "counter",
+     "DIO stress output pin transitions"),
+    ("transition_rate", "dio_stress_transitions_per_second", "gauge",
+     "DIO stress output pin transitions per second"),
+    ("burst_count", "dio_stress_bursts_total", "counter",
+     "DIO stress error bursts"),
+]
+
+
+def walkingOnes():
+    while True:
+        for pin in range(NUM_PINS):
+            yield 1 << pin
+
+
+def prbs7(seed=0x7F):
+    """ x^7 + x^6 + 1, taken four bits at a time. """
+    state = seed & 0x7F
+    while True:
+        value = 0
+        for _ in range(NUM_PINS):
+            bit = ((state >> 6) ^ (state >> 5)) & 1
+            state = ((state << 1) | bit) & 0x7F
+            value = (value << 1) | bit
+        yield value
+
+
+def allToggle():
+    mask = (1 << NUM_PINS) - 1
+    while True:
+        yield 0
+        yield mask
+
+
+PATTERNS = OrderedDict([("walk", walkingOnes), ("prbs", prbs7),
+                        ("toggle", allToggle)])
+
+
+class DioStress(object):
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self._values = PATTERNS[pattern]()
+        self.last_value = 0
+        self.checks = 0
+        self.transitions = 0
+        self.seconds = 0.0
+        self.bit_errors = [0]*NUM_PINS
+        self._new_errors = [0]*NUM_PINS
+        self.bursts = deque(maxlen=MAX_BURSTS)
+        self.burst_count = 0
+        self._burst = None
+        self._burst_time = 0.0
+
+    def run(self, write, read, seconds, stopped):
+        """
+        Check patterns for the given time or until stopped() is true.
+        write(value) sets the output pins and read() returns the input pins
+        wired to them. Returns the errors of each pin in this run; they are
+        also added to the ones takeErrors() returns, in case write() or
+        read() raises.
+        """
+        errors = [0]*NUM_PINS
+        start = time.monotonic()
+        end = start + seconds
+        now = start
+        last = self.last_value
+        checks = 0
+        transitions = 0
+        values = self._values
+        try:
+            while now < end and not stopped():
+                value = next(values)
+                write(value)
+                failed = read() ^ value
+                now = time.monotonic()
+                transitions += bin(value ^ last).count("1")
+                last = value
+                checks += 1
+                if failed:
+                    for pin in range(NUM_PINS):
+                        if (failed >> pin) & 1:
+                            errors[pin] += 1
+                    self._addError(now, failed, bin(failed).count("1"))
+        finally:
+            self.last_value = last
+            self.checks += checks
+            self.transitions += transitions
+            self.seconds += now - start
+            for pin in range(NUM_PINS):
+                self.bit_errors[pin] += errors[pin]
+                self._new_errors[pin] += errors[pin]
+        return errors
+
+    def takeErrors(self):
+        """ Return the errors of each pin since the last call. """
+        errors = self._new_errors
+        self._new_errors = [0]*NUM_PINS
+        return errors
+
+    def _addError(self, now, bits, count):
+        if self._burst is not None and now - self._burst_time <= BURST_GAP:
+            burst = self._burst
+            self._burst = ErrorBurst(burst.start, datetime.datetime.now(),
+                                     burst.errors + count, burst.bits | bits)
+        else:
+            self._closeBurst()
+            timestamp = datetime.datetime.now()
+            self._burst = ErrorBurst(timestamp, timestamp, count, bits)
+            self.burst_count += 1
+        self._burst_time = now
+
+    def _closeBurst(self):
+        if self._burst is not None:
+            self.bursts.append(self._burst)
+            self._burst = None
+
+    def stats(self):
+        bursts = list(self.bursts)
+        if self._burst is not None:
+            bursts.append(self._burst)
+        rate = self.transitions / self.seconds if self.seconds else 0.0
+        error_rates = [errors / float(self.checks) if self.checks else 0.0
+                       for errors in self.bit_errors]
+        return StressStats(self.pattern, self.checks, self.transitions,
+                           self.seconds, rate, list(self.bit_errors),
+                           error_rates, self.burst_count, bursts)
+
+
+def stressLines(stats, max_bursts=20):
+    """
+    Return the stress test results as lines of text, listing at most
+    max_bursts of the latest error bursts, or all that are kept if None.
+    """
+    lines = ["DIO stress {}: {} checks, {:.0f} transitions/s, bit errors "
+             "{}, error rates {}".format(
+                 stats.pattern, stats.checks, stats.transition_rate,
+                 " ".join(str(errors) for errors in stats.bit_errors),
+                 " ".join("{:.2e}".format(rate)
+                          for rate in stats.error_rates))]
+    bursts = stats.bursts
+    if max_bursts is not None:
+        bursts = bursts[max(len(bursts) - max_bursts, 0):]
+    if stats.burst_count:
+        lines.append("{} error bursts{}".format(
+            stats.burst_count, ", the last {}:".format(len(bursts))
+            if len(bursts) < stats.burst_count else ":"))
+        for burst in bursts:
+            lines.append("  {} to {} {} errors, pins {}".format(
+                burst.start.strftime("%H:%M:%S.%f")[:-3],
+                burst.end.strftime("%H:%M:%S.%f")[:-3], burst.errors,
+                ",".join(str(pin) for pin in range(NUM_PINS)
+                         if (burst.bits >> pin) & 1)))
+    return lines
+
+
+def stressMetrics(stats):
+    """ Return the stress test results as ce_common.metrics Metrics. """
+    labels = [("pattern", stats.pattern)]
+    metrics = [Metric(name, kind, text, labels, getattr(stats, field))
+               for field, name, kind, text in STRESS_METRICS]
+    metrics.extend(Metric("dio_stress_errors_total", "counter",
+                          "DIO stress errors per output bit",
+                          labels + [("bit", index)], count)
+                   for index, count in enumerate(stats.bit_errors))
+    return metrics
@@ -0,0 +1,20 @@
+"""
+    DAQ HAT library selection for the CE test applications
+
+    Purpose:
+        Let the tests run on the real boards or on simulated ones
+
+    Description:
+        The tests import the board classes and enums from this module. It
+        provides the daqhats library, or the simulated boards in
+        ce_common.simhats when the DAQHATS_SIM environment variable is set
+        to anything but an empty string or 0.
+"""
+import os
+
+SIMULATED = os.environ.get("DAQHATS_SIM", "") not in ("", "0")
+
+if SIMULATED:
+    from ce_common.simhats import *
+else:
+    from daqhats import *
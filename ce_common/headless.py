@@ -0,0 +1,259 @@
+"""
+    Command line runner for the CE test applications
+
+    Purpose:
+        Run a CE test without a display
+
+    Description:
+        The runner starts one worker per board, as the test apps do, and logs
+        to the same binary session log, or to a CSV file with --csv. Instead
+        of updating a window it prints a compact status line for every board
+        periodically. It runs until Ctrl+C, SIGTERM or the requested
+        duration, then prints a summary and exits with status 1 if any board
+        failed. It does not import tkinter, so it runs on Raspbian Lite over
+        SSH.
+"""
+import argparse
+import datetime
+import queue
+import signal
+import sys
+import threading
+import time
+
+from ce_common.binlog import BinaryLog
+from ce_common.csvlog import CsvLog
+from ce_common.logwriter import FLUSH_INTERVAL
+from ce_common.metrics import MetricsServer, DEFAULT_HOST
+from ce_common.phasetimer import timingLines
+from ce_common.scheduler import scheduleLine
+from ce_common.sessionstats import writeSummary, summaryFilename, summaryLines
+from ce_common.spectrum import spectrumFilename
+
+POLL_INTERVAL = 0.1      # s between checks for new results
+STATUS_INTERVAL = 10.0   # s between status lines
+
+
+def argumentParser(product):
+    """ Return a parser with the options that every board test has. """
+    parser = argparse.ArgumentParser(
+        description="Run the {} CE test without a display.".format(product))
+    parser.add_argument("--address", type=int, nargs="+",
+                        help="board addresses (default: all boards found)")
+    parser.add_argument("--watchdog", action="store_true",
+                        help="reopen a board after repeated errors")
+    parser.add_argument("--interval", type=float, default=STATUS_INTERVAL,
+                        help="seconds between status lines (default {:g})"
+                        .format(STATUS_INTERVAL))
+    parser.add_argument("--duration", type=float,
+                        help="stop after this many seconds")
+    parser.add_argument("--csv", action="store_true",
+                        help="log to a CSV file instead of a binary log")
+    parser.add_argument("--flush-interval", type=float,
+                        default=FLUSH_INTERVAL,
+                        help="seconds between log flushes (default {:g})"
+                        .format(FLUSH_INTERVAL))
+    parser.add_argument("--fsync", action="store_true",
+                        help="fsync the log after every flush")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve the counters in the Prometheus format on "
+                        "this port")
+    parser.add_argument("--metrics-host", default=DEFAULT_HOST,
+                        help="address to serve the counters on (default {})"
+                        .format(DEFAULT_HOST))
+    parser.add_argument("--timing", action="store_true",
+                        help="time the phases of each cycle; SIGUSR1 prints "
+                        "the histograms")
+    parser.set_defaults(product=product)
+    return parser
+
+
+def analogFailures(result):
+    """ Total failures in an analog input result record. """
+    return sum(result.failures) + result.trigger_errors
+
+
+def statusLine(result, failures, failed):
+    return "{} Bd {} {} {} cycles {} sw_err {} fail {} {}".format(
+        result.timestamp.strftime("%H:%M:%S"), result.address,
+        result.serial or "--------", "ready" if result.ready else "no_dev",
+        result.test_count, result.software_errors, failures,
+        "FAIL" if failed else "PASS")
+
+
+def logLine(stats):
+    return ("log queue {} (max {}) records {} dropped {} write {:.1f} ms "
+            "(max {:.1f} ms)".format(
+                stats.queue_depth, stats.max_queue_depth, stats.records,
+                stats.dropped, stats.last_write_time * 1e3,
+                stats.max_write_time * 1e3))
+
+
+def maskLine(flags):
+    return "    mask " + " ".join(
+        "Ch {} {:.0f} Hz {:.3f} mV".format(flag.channel, flag.frequency,
+                                           flag.level) for flag in flags)
+
+
+def printTiming(workers):
+    for worker in workers:
+        if worker.timer.enabled:
+            print("Bd {} phase timing".format(worker.address))
+            for line in timingLines(worker.timer):
+                print("    " + line)
+        else:
+            print("Bd {} phase timing is off (--timing)".format(
+                worker.address))
+    sys.stdout.flush()
+
+
+def drainResults(workers, results, board_failed):
+    """ Keep the newest result of each worker and latch any failure. """
+    for index, worker in enumerate(workers):
+        while True:
+            try:
+                result = worker.results.get_nowait()
+            except queue.Empty:
+                break
+            results[index] = result
+            # latch a failure from any of the cycles
+            if result.current_failures > 0:
+                board_failed[index] = True
+
+
+def run(prefix, addresses, columns, makeWorker, countFailures, args,
+        info=None, formats="{:.1f}", units=""):
+    """
+    Run the test on the boards at addresses. makeWorker(address, log,
+    log_group) returns a worker for one board and countFailures(result)
+    returns the total failures in a result record. info is the test settings
+    for the binary log header, formats the CSV value formats and units the
+    units of the session statistics. Returns the exit status.
+    """
+    groups = None
+    if len(addresses) > 1:
+        groups = ["Bd {}".format(address) for address in addresses]
+    try:
+        if args.csv:
+            log = CsvLog(prefix, columns, groups, formats=formats,
+                         flush_interval=args.flush_interval, fsync=args.fsync)
+        else:
+            log = BinaryLog(prefix, columns, groups, info=info,
+                            flush_interval=args.flush_interval,
+                            fsync=args.fsync)
+    except FileNotFoundError:
+        print("Cannot create log file")
+        return 2
+    print("Logging to " + log.filename)
+    writer = log.writer
+
+    stop_event = threading.Event()
+
+    def handleSignal(_signum, _frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handleSignal)
+    signal.signal(signal.SIGTERM, handleSignal)
+    dump_event = threading.Event()
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda _signum, _frame: dump_event.set())
+
+    workers = []
+    for index, address in enumerate(addresses):
+        worker = makeWorker(address, log, index)
+        worker.start()
+        workers.append(worker)
+
+    metrics = None
+    if args.metrics_port is not None:
+        try:
+            metrics = MetricsServer(args.product, lambda: workers,
+                                    lambda: log, args.metrics_port,
+                                    args.metrics_host)
+            print("Metrics at http://{}:{}/metrics".format(
+                *metrics.address[:2]))
+        except OSError as error:
+            print("Cannot serve metrics: {}".format(error))
+
+    results = [None]*len(addresses)
+    board_failed = [False]*len(addresses)
+    start = time.monotonic()
+    next_status = start + args.interval
+    try:
+        while not stop_event.is_set():
+            stop_event.wait(POLL_INTERVAL)
+            drainResults(workers, results, board_failed)
+
+            now = time.monotonic()
+            if now >= next_status:
+                next_status += args.interval
+                for index, result in enumerate(results):
+                    if result is not None:
+                        print(statusLine(result, countFailures(result),
+                                         board_failed[index]), flush=True)
+                        spectrum = workers[index].spectrum
+                        if spectrum and spectrum.last_flags:
+                            print(maskLine(spectrum.last_flags), flush=True)
+                print(logLine(writer.stats()), flush=True)
+            if dump_event.is_set():
+                dump_event.clear()
+                printTiming(workers)
+            if args.duration is not None and now - start >= args.duration:
+                break
+    finally:
+        if metrics:
+            metrics.close()
+        for worker in workers:
+            worker.stop()
+        # the results of the last cycles, published while stopping
+        drainResults(workers, results, board_failed)
+        summary_filename = summaryFilename(log.filename)
+        try:
+            writeSummary(summary_filename, args.product, workers, units)
+        except OSError:
+            summary_filename = None
+        spectrum_filenames = {}
+        for worker in workers:
+            if worker.spectrum:
+                filename = spectrumFilename(log.filename, worker.address)
+                try:
+                    worker.spectrum.write(filename)
+                    spectrum_filenames[worker.address] = filename
+                except OSError:
+                    pass
+        log.close()
+
+    print("Stopped at " + datetime.datetime.now().strftime("%H:%M:%S"))
+    print(logLine(writer.stats()))
+    for index, result in enumerate(results):
+        if result is None:
+            print("Bd {} no results".format(addresses[index]))
+        else:
+            print(statusLine(result, countFailures(result),
+                             board_failed[index]))
+        scheduler = workers[index].scheduler
+        if scheduler and scheduler.deadlines:
+            print("    Schedule " + scheduleLine(scheduler.stats()))
+        for line in workers[index].reportLines():
+            print("    " + line)
+        stats = workers[index].stats
+        if stats:
+            for line in summaryLines(stats.summary()):
+                print("    " + line)
+        if workers[index].timer.enabled:
+            printTiming([workers[index]])
+        capture = workers[index].capture
+        if capture:
+            for filename in capture.filenames:
+                print("Bd {} capture {}".format(addresses[index], filename))
+        spectrum = workers[index].spectrum
+        if spectrum:
+            print("    Mask flags " + " ".join(
+                "Ch {} {}".format(channel, count)
+                for channel, count in enumerate(spectrum.flags)))
+        if addresses[index] in spectrum_filenames:
+            print("Bd {} spectrum {}".format(
+                addresses[index], spectrum_filenames[addresses[index]]))
+    if summary_filename:
+        print("Summary written to " + summary_filename)
+    return 1 if any(board_failed) else 0
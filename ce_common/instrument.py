@@ -0,0 +1,402 @@
+"""
+    Instrument connections for the CE test applications
+
+    Purpose:
+        Talk SCPI to a bench instrument without tying the test to one bus
+
+    Description:
+        An instrument is named by a resource string. openInstrument()
+        returns a transport with the same small interface whatever the bus:
+        write() a command, read() a reply, query() both, setTimeout() in s,
+        local() to return the front panel and close().
+
+            gpib:<board>:<address>   linux-gpib, such as gpib:0:5
+            usbtmc:<path>            the Linux USBTMC driver, such as
+                                     usbtmc:/dev/usbtmc0
+            tcp:<host>:<port>        SCPI over a raw socket, such as
+                                     tcp:localhost:5025
+            tty:<path>               a serial line or pty, such as
+                                     tty:/dev/pts/3
+            sim:<address>            the ce_common.simdmm emulator in this
+                                     process, measuring the simulated
+                                     MCC 152 at that address
+
+        Messages end with a newline and the replies are returned without it.
+        The Gpib module is only imported when a GPIB resource is opened.
+        Every transport raises InstrumentTimeout when the instrument does
+        not answer in time; for GPIB that is a GpibError with the TIMO
+        status or an EABO error.
+
+        An Instrument keeps one transport open for the whole test. When a
+        transaction fails it closes the transport, reopens it and tries
+        again, waiting BACKOFF_START s before the second attempt and twice
+        as long before each one after, up to BACKOFF_MAX. It gives up with
+        an InstrumentError after ATTEMPTS tries, so a lost link fails the
+        cycle instead of hanging the test. The time of every transaction is
+        kept in a Histogram. A reply that times out is not asked for again,
+        as a slow instrument would only time out again, but the transport
+        is still reopened so a late reply cannot be taken for the next one.
+"""
+from collections import namedtuple
+import fcntl
+import os
+import select
+import socket
+import termios
+import time
+import tty
+
+from ce_common.metrics import Metric
+from ce_common.phasetimer import Histogram
+
+DEFAULT_TIMEOUT = 10.0   # s to wait for a reply
+TERMINATOR = "\n"
+ATTEMPTS = 5             # tries of a transaction before giving up
+BACKOFF_START = 0.1      # s before the first retry
+BACKOFF_MAX = 2.0        # s between retries at most
+
+# Linux USBTMC ioctls, from linux/usb/tmc.h
+USBTMC_IOCTL_SET_TIMEOUT = 0x40045B0A    # _IOW('[', 10, __u32), ms
+USBTMC488_IOCTL_GOTO_LOCAL = 0x5B14      # _IO('[', 20)
+
+InstrumentStats = namedtuple(
+    'InstrumentStats', ['resource', 'connected', 'transactions', 'errors',
+                        'reconnects', 'last_latency', 'latency'])
+
+# Instrument link statistics: (field, metric name, type, help)
+INSTRUMENT_METRICS = [
+    ("connected", "instrument_connected", "gauge",
+     "1 if the instrument connection is open"),
+    ("transactions", "instrument_transactions_total", "counter",
+     "Instrument transactions completed"),
+    ("errors", "instrument_errors_total", "counter",
+     "Instrument transactions that failed"),
+    ("reconnects", "instrument_reconnects_total", "counter",
+     "Times the instrument connection was reopened"),
+]
+
+# linux-gpib status bit and error set when an I/O times out
+GPIB_TIMO = 0x4000
+GPIB_EABO = 6
+
+# linux-gpib timeout codes and the times they stand for in s
+GPIB_TIMEOUTS = [(0.00001, 1), (0.00003, 2), (0.0001, 3), (0.0003, 4),
+                 (0.001, 5), (0.003, 6), (0.01, 7), (0.03, 8), (0.1, 9),
+                 (0.3, 10), (1.0, 11), (3.0, 12), (10.0, 13), (30.0, 14),
+                 (100.0, 15), (300.0, 16), (1000.0, 17)]
+
+
+class InstrumentError(Exception):
+    pass
+
+
+class InstrumentTimeout(InstrumentError):
+    pass
+
+
+class GpibTransport(object):
+    def __init__(self, board, address):
+        import Gpib
+        import gpib
+        self._gpib = gpib
+        self.device = Gpib.Gpib(board, address)
+        self.setTimeout(DEFAULT_TIMEOUT)
+
+    def _timedOut(self):
+        # the status of the call that just failed
+        try:
+            if self._gpib.ibsta() & GPIB_TIMO:
+                return True
+            return self._gpib.iberr() == GPIB_EABO
+        except Exception:
+            return False
+
+    def _call(self, action, *args):
+        try:
+            return action(*args)
+        except self._gpib.GpibError as error:
+            if self._timedOut():
+                raise InstrumentTimeout("Timed out: {}".format(error))
+            raise
+
+    def setTimeout(self, seconds):
+        # the shortest GPIB timeout that is at least as long
+        for limit, code in GPIB_TIMEOUTS:
+            if limit >= seconds:
+                break
+        self.device.timeout(code)
+
+    def write(self, command):
+        self._call(self.device.write, command)
+
+    def read(self):
+        reply = self._call(self.device.read)
+        if isinstance(reply, bytes):
+            reply = reply.decode("ascii", "replace")
+        return reply.rstrip("\r\n")
+
+    def query(self, command):
+        self.write(command)
+        return self.read()
+
+    def local(self):
+        self.device.ibloc()
+
+    def close(self):
+        # free the device descriptor (ibonl 0) so a reconnect does not leak
+        # it; newer bindings do that in close() and then forget the handle
+        try:
+            self.local()
+        finally:
+            close = getattr(self.device, "close", None)
+            if close:
+                close()
+            else:
+                self._gpib.online(self.device.id, 0)
+
+
+class _StreamTransport(object):
+    """ Line based SCPI over a file descriptor or socket. """
+    def __init__(self):
+        self.timeout = DEFAULT_TIMEOUT
+        self._buffer = b""
+
+    def setTimeout(self, seconds):
+        self.timeout = seconds
+
+    def write(self, command):
+        self._send((command + TERMINATOR).encode("ascii"))
+
+    def read(self):
+        deadline = time.monotonic() + self.timeout
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise InstrumentTimeout("Timed out waiting for a reply")
+            data = self._receive(remaining)
+            if not data:
+                raise InstrumentError("Connection closed")
+            self._buffer += data
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return line.decode("ascii", "replace").rstrip("\r")
+
+    def query(self, command):
+        self.write(command)
+        return self.read()
+
+    def local(self):
+        pass
+
+
+class UsbtmcTransport(_StreamTransport):
+    """ A USBTMC device; the driver returns a whole reply for each read. """
+    def __init__(self, path):
+        _StreamTransport.__init__(self)
+        self.fd = os.open(path, os.O_RDWR)
+        self.setTimeout(self.timeout)
+
+    def setTimeout(self, seconds):
+        self.timeout = seconds
+        try:
+            fcntl.ioctl(self.fd, USBTMC_IOCTL_SET_TIMEOUT,
+                        max(int(seconds * 1000), 100).to_bytes(4, "little"))
+        except OSError:
+            # older kernels keep the driver's own timeout
+            pass
+
+    def _send(self, data):
+        os.write(self.fd, data)
+
+    def _receive(self, timeout):
+        try:
+            return os.read(self.fd, 4096)
+        except TimeoutError:
+            raise InstrumentTimeout("Timed out waiting for a reply")
+
+    def local(self):
+        try:
+            fcntl.ioctl(self.fd, USBTMC488_IOCTL_GOTO_LOCAL)
+        except OSError:
+            pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class SocketTransport(_StreamTransport):
+    def __init__(self, host, port):
+        _StreamTransport.__init__(self)
+        self.sock = socket.create_connection((host, port), self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send(self, data):
+        self.sock.settimeout(self.timeout)
+        self.sock.sendall(data)
+
+    def _receive(self, timeout):
+        self.sock.settimeout(timeout)
+        try:
+            return self.sock.recv(4096)
+        except socket.timeout:
+            raise InstrumentTimeout("Timed out waiting for a reply")
+
+    def close(self):
+        self.sock.close()
+
+
+class TtyTransport(_StreamTransport):
+    def __init__(self, path):
+        _StreamTransport.__init__(self)
+        self.fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(self.fd, termios.TCSANOW)
+
+    def _send(self, data):
+        while data:
+            data = data[os.write(self.fd, data):]
+
+    def _receive(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            raise InstrumentTimeout("Timed out waiting for a reply")
+        return os.read(self.fd, 4096)
+
+    def close(self):
+        os.close(self.fd)
+
+
+def openInstrument(resource):
+    """ Open the instrument named by a resource string. """
+    kind, _, location = resource.partition(":")
+    kind = kind.lower()
+    try:
+        if kind == "gpib":
+            board, address = location.split(":")
+            return GpibTransport(int(board), int(address))
+        if kind == "usbtmc":
+            return UsbtmcTransport(location)
+        if kind == "tcp":
+            host, port = location.rsplit(":", 1)
+            return SocketTransport(host, int(port))
+        if kind == "tty":
+            return TtyTransport(location)
+        if kind == "sim":
+            from ce_common.simdmm import simulatedTransport
+            return simulatedTransport(location)
+    except ValueError:
+        pass
+    raise ValueError("Unknown instrument resource " + resource)
+
+
+class Instrument(object):
+    """
+    A persistent connection to the instrument named by resource. The
+    transport is opened on the first transaction and reopened after a
+    failure.
+    """
+    def __init__(self, resource, timeout=DEFAULT_TIMEOUT, attempts=ATTEMPTS,
+                 sleep=time.sleep):
+        self.resource = resource
+        self.timeout = timeout
+        self.attempts = attempts
+        self.sleep = sleep
+        self.transport = None
+        self.transactions = 0
+        self.errors = 0
+        self.reconnects = 0
+        self.last_latency = 0.0
+        self.latency = Histogram()
+
+    def connect(self):
+        if self.transport is None:
+            transport = openInstrument(self.resource)
+            transport.setTimeout(self.timeout)
+            if self.transactions or self.errors:
+                self.reconnects += 1
+            self.transport = transport
+
+    def disconnect(self):
+        if self.transport is not None:
+            transport = self.transport
+            self.transport = None
+            try:
+                transport.close()
+            except Exception:
+                pass
+
+    def setTimeout(self, seconds):
+        self.timeout = seconds
+        if self.transport is not None:
+            self.transport.setTimeout(seconds)
+
+    def _transaction(self, action):
+        delay = BACKOFF_START
+        for attempt in range(self.attempts):
+            if attempt:
+                self.sleep(delay)
+                delay = min(delay * 2, BACKOFF_MAX)
+            start = time.monotonic()
+            try:
+                self.connect()
+                result = action(self.transport)
+            except ValueError:
+                # a bad resource does not get better with retries
+                raise
+            except InstrumentTimeout as error:
+                self.errors += 1
+                self.disconnect()
+                raise InstrumentTimeout("{}: {}".format(self.resource,
+                                                        error))
+            except Exception as error:
+                self.errors += 1
+                self.disconnect()
+                last_error = error
+                continue
+            self.last_latency = time.monotonic() - start
+            self.latency.add(self.last_latency)
+            self.transactions += 1
+            return result
+        raise InstrumentError("{}: {}".format(self.resource, last_error))
+
+    def write(self, command):
+        self._transaction(lambda transport: transport.write(command))
+
+    def query(self, command):
+        return self._transaction(lambda transport: transport.query(command))
+
+    def local(self):
+        if self.transport is not None:
+            self.transport.local()
+
+    def close(self):
+        if self.transport is not None:
+            try:
+                self.transport.local()
+            except Exception:
+                pass
+        self.disconnect()
+
+    def stats(self):
+        return InstrumentStats(self.resource, self.transport is not None,
+                               self.transactions, self.errors,
+                               self.reconnects, self.last_latency,
+                               self.latency)
+
+
+def instrumentLine(stats):
+    return ("{} transactions, {} errors, {} reconnects, latency {:.2f} ms "
+            "(mean {:.2f} ms, p99 {:.2f} ms, max {:.2f} ms)".format(
+                stats.transactions, stats.errors, stats.reconnects,
+                stats.last_latency * 1e3, stats.latency.mean() * 1e3,
+                stats.latency.percentile(0.99) * 1e3,
+                stats.latency.maximum * 1e3))
+
+
+def instrumentMetrics(stats):
+    """ Return the link statistics as ce_common.metrics Metrics. """
+    labels = [("resource", stats.resource)]
+    metrics = [Metric(name, kind, text, labels, getattr(stats, field))
+               for field, name, kind, text in INSTRUMENT_METRICS]
+    metrics.append(Metric("instrument_seconds", "histogram",
+                          "Time taken by each instrument transaction", labels,
+                          stats.latency))
+    return metrics
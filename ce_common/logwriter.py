@@ -0,0 +1,145 @@
+"""
+    Background log file writer for the CE test applications
+
+    Purpose:
+        Keep slow storage from holding up the acquisition threads
+
+    Description:
+        A LogWriter owns a log file and writes to it on its own thread. The
+        logs queue each record with write(), which never blocks; the thread
+        writes the queued records in batches and flushes the file every
+        flush_interval seconds or flush_records records, whichever comes
+        first, optionally with an fsync. At most that much data is lost if
+        the Pi resets. If the storage stalls for long enough to fill the
+        queue, records are dropped and counted rather than stopping the test.
+
+        stats() reports the queue depth and how long the writes and flushes
+        take.
+"""
+from collections import namedtuple
+import os
+import queue
+import threading
+import time
+
+QUEUE_SIZE = 10000       # records held before new ones are dropped
+FLUSH_INTERVAL = 1.0     # s between flushes
+FLUSH_RECORDS = 100      # records between flushes
+
+WriterStats = namedtuple(
+    'WriterStats', ['queue_depth', 'max_queue_depth', 'records', 'dropped',
+                    'flushes', 'last_write_time', 'max_write_time'])
+
+
+class LogWriter(threading.Thread):
+    def __init__(self, filename, mode='w', flush_interval=FLUSH_INTERVAL,
+                 flush_records=FLUSH_RECORDS, fsync=False,
+                 queue_size=QUEUE_SIZE):
+        """
+        Open the file, so an error is raised here, and start the writer.
+        mode is 'w' for text records or 'wb' for bytes. A queue_size of 0
+        queues any number of records.
+        """
+        threading.Thread.__init__(self, name="log writer", daemon=True)
+        self.file = open(filename, mode)
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+        self.fsync = fsync
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self.max_queue_depth = 0
+        self.records = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.last_write_time = 0.0
+        self.max_write_time = 0.0
+        self.start()
+
+    def write(self, record):
+        """ Queue a record to be written. """
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def stats(self):
+        with self._stats_lock:
+            return WriterStats(
+                self._queue.qsize(), self.max_queue_depth, self.records,
+                self.dropped, self.flushes, self.last_write_time,
+                self.max_write_time)
+
+    def run(self):
+        pending = []
+        last_flush = time.monotonic()
+        done = False
+        while not done:
+            timeout = max(last_flush + self.flush_interval - time.monotonic(),
+                          0)
+            try:
+                record = self._queue.get(timeout=timeout)
+                if record is None:
+                    done = True
+                else:
+                    pending.append(record)
+                # take everything that is already queued
+                while not done:
+                    record = self._queue.get_nowait()
+                    if record is None:
+                        done = True
+                    else:
+                        pending.append(record)
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            if (done or len(pending) >= self.flush_records or
+                    now - last_flush >= self.flush_interval):
+                if pending:
+                    self._writeBatch(pending)
+                    pending = []
+                last_flush = now
+        self.file.close()
+
+    def _writeBatch(self, records):
+        start = time.monotonic()
+        try:
+            if isinstance(records[0], bytes):
+                self.file.write(b"".join(records))
+            else:
+                self.file.write("".join(records))
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+        except (OSError, ValueError):
+            with self._stats_lock:
+                self.dropped += len(records)
+            return
+        elapsed = time.monotonic() - start
+        with self._stats_lock:
+            self.records += len(records)
+            self.flushes += 1
+            self.last_write_time = elapsed
+            if elapsed > self.max_write_time:
+                self.max_write_time = elapsed
+
+    def close(self, timeout=10.0):
+        """ Write the queued records and close the file. """
+        if self._closed:
+            return
+        self._closed = True
+        while True:
+            try:
+                # wait for room if the queue is full
+                self._queue.put(None, timeout=timeout)
+                break
+            except queue.Full:
+                if not self.is_alive():
+                    break
+        self.join(timeout)
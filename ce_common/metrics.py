@@ -0,0 +1,281 @@
+"""
+    Metrics endpoint for the CE test applications
+
+    Purpose:
+        Let a lab monitor read the test counters without a display
+
+    Description:
+        A MetricsServer serves the counters of every worker, the loop timing
+        and deadline jitter, the phase timing histograms when timing is on
+        and the log writer state in the Prometheus text format at /metrics.
+        A worker adds the results only its board has through its metrics()
+        method.
+        It runs a small HTTP server on its own thread and reads the worker
+        attributes only when it is scraped, so it costs nothing between
+        scrapes. It listens on localhost unless another host is given.
+
+        The test apps start it when the DAQHATS_CE_METRICS_PORT environment
+        variable is set; the command line runners use --metrics-port.
+"""
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import os
+import threading
+
+DEFAULT_HOST = "127.0.0.1"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PORT_VARIABLE = "DAQHATS_CE_METRICS_PORT"
+HOST_VARIABLE = "DAQHATS_CE_METRICS_HOST"
+
+# Worker attributes exported when a worker has them:
+# (attribute, metric name, type, help)
+WORKER_METRICS = [
+    ("test_count", "test_count_total", "counter", "Test cycles run"),
+    ("software_errors", "software_errors_total", "counter",
+     "Board access errors"),
+    ("trigger_errors", "trigger_errors_total", "counter",
+     "External trigger test failures"),
+    ("ao_errors", "ao_errors_total", "counter",
+     "Analog output voltage failures"),
+    ("current_failures", "current_failures", "gauge",
+     "Failures in the last cycle"),
+    ("watchdog_count", "watchdog_count", "gauge",
+     "Consecutive cycles with errors"),
+    ("dropped_results", "dropped_results_total", "counter",
+     "Results discarded because the display fell behind"),
+    ("cycle_period", "cycle_seconds", "gauge",
+     "Time between the starts of the last two cycles"),
+    ("max_cycle_period", "cycle_seconds_max", "gauge",
+     "Longest time between the starts of two cycles"),
+    ("sample_age", "sample_age_seconds", "gauge",
+     "Age of the oldest reading checked in the last cycle"),
+    ("max_sample_age", "sample_age_seconds_max", "gauge",
+     "Oldest reading checked in a cycle"),
+]
+
+# Per-channel worker counters: (attribute, metric name, label, help)
+CHANNEL_METRICS = [
+    ("failures", "channel_failures_total", "channel",
+     "Limit failures per channel"),
+    ("tc_failures", "tc_failures_total", "channel",
+     "Thermocouple limit failures per channel"),
+    ("cjc_failures", "cjc_failures_total", "channel",
+     "CJC limit failures per channel"),
+    ("open_tc_failures", "open_tc_total", "channel",
+     "Open thermocouple readings per channel"),
+    ("common_mode_failures", "common_mode_total", "channel",
+     "Thermocouple common mode errors per channel"),
+    ("dio_errors", "dio_errors_total", "bit",
+     "Digital I/O loopback failures per output bit"),
+]
+
+# Cycle schedule statistics: (field, metric name, type, help)
+SCHEDULE_METRICS = [
+    ("deadlines", "deadlines_total", "counter", "Cycle deadlines reached"),
+    ("missed", "deadlines_missed_total", "counter",
+     "Cycle deadlines reached late"),
+    ("skipped", "deadlines_skipped_total", "counter",
+     "Cycle deadlines skipped because a whole period passed"),
+    ("last_jitter", "deadline_jitter_seconds", "gauge",
+     "How late the last deadline was reached"),
+    ("max_jitter", "deadline_jitter_seconds_max", "gauge",
+     "Latest a deadline was reached"),
+]
+
+# Log writer statistics: (field, metric name, type, help)
+LOG_METRICS = [
+    ("queue_depth", "log_queue_depth", "gauge", "Log records waiting"),
+    ("max_queue_depth", "log_queue_depth_max", "gauge",
+     "Most log records waiting"),
+    ("records", "log_records_total", "counter", "Log records written"),
+    ("dropped", "log_dropped_total", "counter", "Log records dropped"),
+    ("last_write_time", "log_write_seconds", "gauge",
+     "Time of the last log write"),
+    ("max_write_time", "log_write_seconds_max", "gauge",
+     "Longest log write"),
+]
+
+PREFIX = "daqhats_ce_"
+
+# A board specific sample from AcquisitionWorker.metrics(). The board labels
+# are added to labels and value is a Histogram when kind is "histogram".
+Metric = namedtuple('Metric', ['name', 'kind', 'text', 'labels', 'value'])
+
+
+def _escape(value):
+    return (str(value).replace("\\", "\\\\").replace("\n", "\\n")
+            .replace('"', '\\"'))
+
+
+def _labels(labels):
+    return "{" + ",".join('{}="{}"'.format(name, _escape(value))
+                          for name, value in labels) + "}"
+
+
+def _header(lines, name, kind, text):
+    lines.append("# HELP {}{} {}".format(PREFIX, name, text))
+    lines.append("# TYPE {}{} {}".format(PREFIX, name, kind))
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(int(value))
+
+
+def _sample(lines, name, labels, value):
+    lines.append("{}{}{} {}".format(PREFIX, name, _labels(labels),
+                                    _number(value)))
+
+
+def _histogram(lines, name, labels, histogram):
+    total = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        total += count
+        _sample(lines, name + "_bucket", labels + [("le", repr(bound))], total)
+    _sample(lines, name + "_bucket", labels + [("le", "+Inf")],
+            histogram.count)
+    _sample(lines, name + "_sum", labels, float(histogram.total))
+    _sample(lines, name + "_count", labels, histogram.count)
+
+
+def render(product, workers, log=None):
+    """ Return the metrics of the workers and log as Prometheus text. """
+    lines = []
+    boards = [(worker, [("product", product), ("address", worker.address)])
+              for worker in workers]
+
+    _header(lines, "board_info", "gauge", "The serial number of the board")
+    for worker, labels in boards:
+        _sample(lines, "board_info", labels + [("serial", worker.serial)], 1)
+    _header(lines, "board_ready", "gauge", "1 if the board is open")
+    for worker, labels in boards:
+        _sample(lines, "board_ready", labels, 1 if worker.device_open else 0)
+
+    for attribute, name, kind, text in WORKER_METRICS:
+        present = [(worker, labels) for worker, labels in boards
+                   if hasattr(worker, attribute)]
+        if present:
+            _header(lines, name, kind, text)
+            for worker, labels in present:
+                _sample(lines, name, labels, getattr(worker, attribute))
+
+    for attribute, name, label, text in CHANNEL_METRICS:
+        present = [(worker, labels) for worker, labels in boards
+                   if hasattr(worker, attribute)]
+        if present:
+            _header(lines, name, "counter", text)
+            for worker, labels in present:
+                counts = list(getattr(worker, attribute))
+                # the analog boards keep counters for unused channels too
+                counts = counts[:getattr(worker, "num_channels", len(counts))]
+                for index, count in enumerate(counts):
+                    _sample(lines, name, labels + [(label, index)], count)
+
+    scheduled = [(worker.scheduler.stats(), labels)
+                 for worker, labels in boards if worker.scheduler]
+    if scheduled:
+        for field, name, kind, text in SCHEDULE_METRICS:
+            _header(lines, name, kind, text)
+            for stats, labels in scheduled:
+                _sample(lines, name, labels, getattr(stats, field))
+
+    # board specific metrics, grouped by name under one header each
+    names = []
+    samples = {}
+    for worker, labels in boards:
+        for metric in worker.metrics():
+            if metric.name not in samples:
+                names.append(metric.name)
+                samples[metric.name] = []
+            samples[metric.name].append((metric, labels + metric.labels))
+    for name in names:
+        first = samples[name][0][0]
+        _header(lines, name, first.kind, first.text)
+        for metric, labels in samples[name]:
+            if metric.kind == "histogram":
+                _histogram(lines, name, labels, metric.value)
+            else:
+                _sample(lines, name, labels, metric.value)
+
+    timed = [(worker, labels) for worker, labels in boards
+             if worker.timer.enabled]
+    if timed:
+        _header(lines, "phase_seconds", "histogram",
+                "Time taken by each phase of a test cycle")
+        for worker, labels in timed:
+            for phase, histogram in worker.timer.histograms():
+                _histogram(lines, "phase_seconds",
+                           labels + [("phase", phase)], histogram)
+
+    if log is not None:
+        stats = log.writer.stats()
+        labels = [("product", product)]
+        for field, name, kind, text in LOG_METRICS:
+            _header(lines, name, kind, text)
+            _sample(lines, name, labels, getattr(stats, field))
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        try:
+            body = self.server.metrics.render().encode("utf-8")
+        except Exception as error:
+            self.send_error(500, str(error))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # a scrape every few seconds would fill the terminal
+        pass
+
+
+class MetricsServer(object):
+    def __init__(self, product, getWorkers, getLog, port, host=DEFAULT_HOST):
+        """
+        Serve the metrics on host:port. getWorkers() returns the current
+        workers and getLog() the current session log or None, so the test
+        can replace them while the server runs. Raises OSError if the port
+        cannot be opened.
+        """
+        self.product = product
+        self.getWorkers = getWorkers
+        self.getLog = getLog
+        self.server = HTTPServer((host, port), _Handler)
+        self.server.metrics = self
+        self.address = self.server.server_address
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       name="metrics", daemon=True)
+        self.thread.start()
+
+    def render(self):
+        log = self.getLog() if self.getLog else None
+        return render(self.product, list(self.getWorkers()), log)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+def serverFromEnvironment(product, getWorkers, getLog=None):
+    """
+    Start a MetricsServer on the port in DAQHATS_CE_METRICS_PORT, or return
+    None if it is not set or the port cannot be opened.
+    """
+    port = os.environ.get(PORT_VARIABLE, "")
+    if not port:
+        return None
+    try:
+        return MetricsServer(product, getWorkers, getLog, int(port),
+                             os.environ.get(HOST_VARIABLE, DEFAULT_HOST))
+    except (OSError, ValueError):
+        return None
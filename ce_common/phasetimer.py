@@ -0,0 +1,130 @@
+"""
+    Phase timing for the CE test applications
+
+    Purpose:
+        Show which part of a test cycle takes the time
+
+    Description:
+        A PhaseTimer keeps a fixed-bucket histogram of the time each phase of
+        a cycle takes, such as the scan read, the averaging, the limit check,
+        the log write or the DMM reading. The worker marks the end of each
+        phase with lap(), which records the monotonic time since the last
+        mark. A disabled timer returns straight away from start() and lap(),
+        so the calls can stay in the cycle code.
+
+        The histograms are written to the session summary, printed on
+        SIGUSR1 and served by the metrics endpoint. Timing is turned on with
+        --timing in the command line runners and with the DAQHATS_CE_TIMING
+        environment variable in the test apps.
+"""
+from collections import OrderedDict
+import bisect
+import os
+import threading
+import time
+
+# Upper bounds of the histogram buckets in s; the last bucket has no bound
+BUCKETS = (0.00001, 0.00003, 0.0001, 0.0003, 0.001, 0.003, 0.01, 0.03, 0.1,
+           0.3, 1.0, 3.0)
+TIMING_VARIABLE = "DAQHATS_CE_TIMING"
+
+
+def timingEnabled():
+    """ True if DAQHATS_CE_TIMING is set for the test apps. """
+    return os.environ.get(TIMING_VARIABLE, "") not in ("", "0")
+
+
+class Histogram(object):
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.counts = [0]*(len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction):
+        """
+        Return the upper bound of the bucket that holds the given fraction
+        of the times, or the maximum if that is the last bucket.
+        """
+        target = fraction * self.count
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            if total >= target and total > 0:
+                return min(bound, self.maximum)
+        return self.maximum
+
+
+class PhaseTimer(object):
+    def __init__(self, enabled=False, bounds=BUCKETS):
+        self.enabled = enabled
+        self.bounds = bounds
+        self.phases = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """ Return the time to measure the first phase from. """
+        if not self.enabled:
+            return 0.0
+        return time.monotonic()
+
+    def lap(self, phase, start):
+        """ Record the time since start for phase and return the time now. """
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        self.add(phase, now - start)
+        return now
+
+    def add(self, phase, seconds):
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            with self._lock:
+                histogram = self.phases.setdefault(phase,
+                                                   Histogram(self.bounds))
+        histogram.add(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.phases = OrderedDict()
+
+    def histograms(self):
+        """ Return a list of (phase, Histogram) in the order first seen. """
+        with self._lock:
+            return list(self.phases.items())
+
+
+def formatBound(seconds):
+    if seconds >= 1.0:
+        return "{:g}s".format(seconds)
+    if seconds >= 0.001:
+        return "{:g}ms".format(seconds * 1e3)
+    return "{:g}us".format(seconds * 1e6)
+
+
+def timingLines(timer):
+    """
+    Return the histograms of a timer as lines of text: the count, mean, p99
+    and maximum time of each phase in ms, then the count in each bucket.
+    """
+    lines = ["{:<28} {:>7} {:>9} {:>9} {:>9} ".format(
+        "Phase", "Count", "Mean ms", "p99 ms", "Max ms") +
+        " ".join("{:>7}".format("<=" + formatBound(bound))
+                 for bound in timer.bounds) + " {:>7}".format("more")]
+    for phase, histogram in timer.histograms():
+        lines.append("{:<28} {:>7} {:>9.3f} {:>9.3f} {:>9.3f} ".format(
+            phase, histogram.count, histogram.mean() * 1e3,
+            histogram.percentile(0.99) * 1e3, histogram.maximum * 1e3) +
+            " ".join("{:>7}".format(count) for count in histogram.counts))
+    return lines
@@ -0,0 +1,66 @@
+"""
+    RMS calculation for the CE test applications
+
+    Purpose:
+        Reduce a block of interleaved scan data to per-channel RMS values
+
+    Description:
+        The engine calculates the RMS, DC offset and AC-coupled RMS of every
+        channel from the per-channel sums and sums of squares. With NumPy the
+        sums come from a (samples, channels) view of the scan buffer in one
+        pass with no temporary arrays; the result arrays are reused for every
+        block. Without NumPy each channel is reduced from a list slice.
+"""
+from math import sqrt
+import operator
+
+from ce_common.blockstats import numpy, HAVE_NUMPY
+
+
+class RmsEngine(object):
+    """ RMS, DC offset and AC-coupled RMS for all channels of a block. """
+    def __init__(self, num_channels, use_numpy=HAVE_NUMPY):
+        self.num_channels = num_channels
+        self.use_numpy = use_numpy and HAVE_NUMPY
+        if self.use_numpy:
+            self._sums = numpy.zeros(num_channels)
+            self._squares = numpy.zeros(num_channels)
+            self.rms = numpy.zeros(num_channels)
+            self.dc = numpy.zeros(num_channels)
+            self.ac_rms = numpy.zeros(num_channels)
+        else:
+            self.rms = [0.0]*num_channels
+            self.dc = [0.0]*num_channels
+            self.ac_rms = [0.0]*num_channels
+
+    def calculate(self, data, samples_per_channel):
+        """
+        Calculate the values for the first samples_per_channel samples of
+        each channel in data, returning the per-channel RMS values.
+        """
+        num_channels = self.num_channels
+        count = samples_per_channel * num_channels
+        if self.use_numpy and isinstance(data, numpy.ndarray):
+            block = data[:count].reshape(samples_per_channel, num_channels)
+            block.sum(axis=0, out=self._sums)
+            # sum of squares per column without a squared copy of the block
+            numpy.einsum('ij,ij->j', block, block, out=self._squares)
+
+            numpy.divide(self._sums, samples_per_channel, out=self.dc)
+            numpy.divide(self._squares, samples_per_channel, out=self._squares)
+            numpy.sqrt(self._squares, out=self.rms)
+            # AC-coupled mean square = mean square - DC^2
+            numpy.multiply(self.dc, self.dc, out=self.ac_rms)
+            numpy.subtract(self._squares, self.ac_rms, out=self.ac_rms)
+            numpy.maximum(self.ac_rms, 0.0, out=self.ac_rms)
+            numpy.sqrt(self.ac_rms, out=self.ac_rms)
+        else:
+            for channel in range(num_channels):
+                samples = data[channel:count:num_channels]
+                mean = sum(samples) / samples_per_channel
+                mean_square = (sum(map(operator.mul, samples, samples)) /
+                               samples_per_channel)
+                self.dc[channel] = mean
+                self.rms[channel] = sqrt(mean_square)
+                self.ac_rms[channel] = sqrt(max(mean_square - mean*mean, 0.0))
+        return self.rms
@@ -0,0 +1,110 @@
+"""
+    Cycle scheduler for the CE test applications
+
+    Purpose:
+        Keep the test cycles on a fixed cadence over a long run
+
+    Description:
+        A DeadlineScheduler fires at absolute deadlines on the monotonic
+        clock, origin + n * period + offset, instead of sleeping for the
+        period after the work is done, so the time spent processing does not
+        add up over a run. A period can have several phases at fixed
+        offsets, such as the input and trigger scans of the MCC 128 and 172,
+        and each phase keeps its place in the period.
+
+        Each wait records how late it woke (the jitter). A wake more than
+        MISS_LIMIT after its deadline counts as a missed deadline. If a whole
+        period has gone by, the deadlines that passed are skipped and
+        counted, and the schedule carries on from the next one in step with
+        the original origin.
+"""
+from collections import namedtuple
+import time
+
+MISS_LIMIT = 0.05        # s late before a deadline counts as missed
+EARLY_LIMIT = 0.001      # s early that a timed wait can wake and be on time
+
+ScheduleStats = namedtuple(
+    'ScheduleStats', ['period', 'deadlines', 'missed', 'skipped',
+                      'last_jitter', 'mean_jitter', 'max_jitter'])
+
+
+class DeadlineScheduler(object):
+    def __init__(self, period, offsets=None, miss_limit=MISS_LIMIT):
+        """
+        period is the cycle time in s and offsets the times into each
+        period that the phases are due, by default the end of the period.
+        """
+        self.period = float(period)
+        if offsets is None:
+            offsets = (period,)
+        self.offsets = tuple(float(offset) for offset in offsets)
+        self.miss_limit = miss_limit
+        self.origin = None
+        self.cycle = 0
+        self.last_deadline = None
+        self.deadlines = 0
+        self.missed = 0
+        self.skipped = 0
+        self.last_jitter = 0.0
+        self.total_jitter = 0.0
+        self.max_jitter = 0.0
+
+    def start(self, now=None):
+        """ Start the schedule with the first period beginning now. """
+        self.origin = time.monotonic() if now is None else now
+        self.cycle = 0
+        self.last_deadline = None
+
+    def wait(self, sleep, phase=0):
+        """
+        Wait for the next deadline of a phase, using sleep(seconds) so the
+        caller can cut the wait short. Returns how late it woke in s.
+        """
+        now = time.monotonic()
+        if self.origin is None:
+            self.start(now - self.offsets[phase])
+        deadline = (self.origin + self.cycle * self.period +
+                    self.offsets[phase])
+        if self.last_deadline is not None and deadline <= self.last_deadline:
+            # this phase has already run in the current period
+            self.cycle += 1
+            deadline += self.period
+        if now - deadline >= self.period:
+            # skip the deadlines that have passed, staying in step
+            skip = int((now - deadline) // self.period)
+            self.cycle += skip
+            self.skipped += skip
+            deadline += skip * self.period
+        self.last_deadline = deadline
+
+        if deadline > now:
+            sleep(deadline - now)
+        jitter = time.monotonic() - deadline
+        if jitter < -EARLY_LIMIT:
+            # the wait was cut short to stop
+            return jitter
+        jitter = max(jitter, 0.0)
+
+        self.deadlines += 1
+        self.last_jitter = jitter
+        self.total_jitter += jitter
+        if jitter > self.max_jitter:
+            self.max_jitter = jitter
+        if jitter > self.miss_limit:
+            self.missed += 1
+        return jitter
+
+    def stats(self):
+        mean = self.total_jitter / self.deadlines if self.deadlines else 0.0
+        return ScheduleStats(self.period, self.deadlines, self.missed,
+                             self.skipped, self.last_jitter, mean,
+                             self.max_jitter)
+
+
+def scheduleLine(stats):
+    return ("period {:.3f} s, {} deadlines, {} missed, {} skipped, jitter "
+            "{:.2f} ms (mean {:.2f} ms, max {:.2f} ms)".format(
+                stats.period, stats.deadlines, stats.missed, stats.skipped,
+                stats.last_jitter * 1e3, stats.mean_jitter * 1e3,
+                stats.max_jitter * 1e3))
@@ -0,0 +1,170 @@
+"""
+    Session statistics for the CE test applications
+
+    Purpose:
+        Keep running statistics of every channel over a test session
+
+    Description:
+        A SessionStats holds a ChannelStats for each channel of a board. The
+        worker updates it with the channel values once per cycle, which takes
+        constant time per channel whatever the length of the test. Each
+        channel keeps the mean and variance (Welford's method), the minimum
+        and maximum with their times, and the worst deviation from the
+        channel's reference value with its margin to the limit. A negative
+        margin means the limit was exceeded.
+
+        When a test stops, writeSummary() writes the statistics of every
+        board, any board specific results and the phase timing when it is
+        on to a summary file next to the session log.
+"""
+from collections import namedtuple
+import datetime
+import math
+import os
+
+from ce_common.phasetimer import timingLines
+from ce_common.scheduler import scheduleLine
+
+ChannelSummary = namedtuple(
+    'ChannelSummary', ['name', 'count', 'mean', 'std_dev', 'minimum',
+                       'min_time', 'maximum', 'max_time', 'worst',
+                       'worst_time', 'limit', 'margin'])
+
+
+class ChannelStats(object):
+    def __init__(self, name, limit, reference=0.0):
+        self.name = name
+        self.limit = limit
+        self.reference = reference
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.min_time = None
+        self.maximum = None
+        self.max_time = None
+        self.worst = None
+        self.worst_time = None
+
+    def update(self, value, timestamp):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+            self.min_time = timestamp
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+            self.max_time = timestamp
+        deviation = value - self.reference
+        if self.worst is None or abs(deviation) > abs(self.worst):
+            self.worst = deviation
+            self.worst_time = timestamp
+
+    def variance(self):
+        """ The sample variance, or 0 before there are two values. """
+        if self.count < 2:
+            return 0.0
+        return self.m2 / (self.count - 1)
+
+    def summary(self):
+        margin = None
+        if self.worst is not None:
+            margin = self.limit - abs(self.worst)
+        return ChannelSummary(
+            self.name, self.count, self.mean, math.sqrt(self.variance()),
+            self.minimum, self.min_time, self.maximum, self.max_time,
+            self.worst, self.worst_time, self.limit, margin)
+
+
+class SessionStats(object):
+    def __init__(self, names, limits):
+        """ names are the channel names and limits their +/- limits. """
+        self.channels = [ChannelStats(name, limit)
+                         for name, limit in zip(names, limits)]
+
+    def setReference(self, channel, reference):
+        """ Measure the deviation of a channel from reference, not 0. """
+        self.channels[channel].reference = reference
+
+    def update(self, values, timestamp=None, first=0):
+        """ Add one cycle's values, starting at channel first. """
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+        for channel, value in zip(self.channels[first:], values):
+            channel.update(value, timestamp)
+
+    def summary(self):
+        return [channel.summary() for channel in self.channels]
+
+
+def formatTime(timestamp):
+    return timestamp.strftime("%H:%M:%S") if timestamp else "--"
+
+
+def formatValue(value):
+    return "--" if value is None else "{:.4f}".format(value)
+
+
+def summaryLines(summaries):
+    """ Return a table of the channel statistics as lines of text. """
+    lines = ["{:<8} {:>7} {:>10} {:>10} {:>10} {:>8} {:>10} {:>8} "
+             "{:>10} {:>8} {:>10}".format(
+                 "Channel", "Cycles", "Mean", "Std dev", "Min", "at", "Max",
+                 "at", "Worst", "at", "Margin")]
+    for summary in summaries:
+        lines.append(
+            "{:<8} {:>7} {:>10} {:>10} {:>10} {:>8} {:>10} {:>8} {:>10} "
+            "{:>8} {:>10}".format(
+                summary.name, summary.count,
+                formatValue(summary.mean if summary.count else None),
+                formatValue(summary.std_dev if summary.count else None),
+                formatValue(summary.minimum), formatTime(summary.min_time),
+                formatValue(summary.maximum), formatTime(summary.max_time),
+                formatValue(summary.worst), formatTime(summary.worst_time),
+                formatValue(summary.margin)))
+    return lines
+
+
+def summaryFilename(log_filename):
+    return os.path.splitext(log_filename)[0] + "_summary.txt"
+
+
+def writeSummary(filename, product, workers, units="", timer=None):
+    """
+    Write the session statistics of each worker to a text file. Workers
+    without statistics are listed with their counters only. timer is the
+    display PhaseTimer of a test app.
+    """
+    with open(filename, 'w') as summary_file:
+        summary_file.write("{} CE test summary, {}\n".format(
+            product, datetime.datetime.now().strftime("%d-%m-%Y %H:%M:%S")))
+        if units:
+            summary_file.write("Values in {}\n".format(units))
+        for worker in workers:
+            summary_file.write(
+                "\nBoard {} serial {}: {} cycles, {} software errors\n".format(
+                    worker.address, worker.serial or "--------",
+                    worker.test_count, worker.software_errors))
+            if worker.scheduler and worker.scheduler.deadlines:
+                summary_file.write("Schedule: {}\n".format(
+                    scheduleLine(worker.scheduler.stats())))
+            for line in worker.reportLines(summary=True):
+                summary_file.write(line + "\n")
+            if worker.stats:
+                for line in summaryLines(worker.stats.summary()):
+                    summary_file.write(line + "\n")
+            if worker.timer.enabled:
+                summary_file.write("\nBoard {} phase timing\n".format(
+                    worker.address))
+                for line in timingLines(worker.timer):
+                    summary_file.write(line + "\n")
+        if timer and timer.enabled:
+            summary_file.write("\nDisplay timing\n")
+            for line in timingLines(timer):
+                summary_file.write(line + "\n")
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+    Emulated HP 34401A DMM for the CE test applications
+
+    Purpose:
+        Run and profile the MCC 152 analog output check without a DMM
+
+    Description:
+        Sim34401A answers the SCPI subset the tests use: *CLS, *RST, *IDN?,
+        CONFigure:VOLTage:DC, MEASure:VOLTage:DC?, READ?, INITiate, FETCh?,
+        SAMPle:COUNt, TRIGger:SOURce, TRIGger:COUNt, DATA:POINts?,
+        DISPlay:TEXT,
+        INPut:IMPedance:AUTO and SYSTem:ERRor?. Keywords take the short or
+        long form in any case, and commands on a line are separated by ";".
+
+        A measurement takes the latency for each sample. INITiate starts
+        SAMPle:COUNt readings for each of TRIGger:COUNt triggers into the
+        reading memory and returns at once; FETCh? waits for them to finish
+        and returns them separated by commas. The reading memory keeps the
+        first 512. The readings are the voltage plus Gaussian noise.
+
+        The emulator serves the instrument on a localhost TCP port or a pty
+        so the test reaches it through ce_common.instrument as tcp:host:port
+        or tty:path. Run it from the top level of the repository:
+
+            python3 -m ce_common.simdmm --port 5025 --latency 0.1
+            python3 -m ce_common.simdmm --pty
+
+        The voltage can instead come from a source function. The sim:address
+        resource opens an emulator in the test's own process whose source is
+        output 0 of the simulated MCC 152 at that address, so the analog
+        output check and sweep measure what the test wrote.
+"""
+import argparse
+import os
+import random
+import re
+import select
+import socketserver
+import sys
+import threading
+import time
+import tty
+
+from ce_common.instrument import InstrumentTimeout
+
+DEFAULT_VOLTAGE = 5.0 - (5.0 / 4096)   # the MCC 152 full scale output
+DEFAULT_NOISE = 10e-6                  # V rms
+DEFAULT_LATENCY = 0.1                  # s per reading, 5 PLC at 50 Hz
+DEFAULT_PORT = 5025
+IDENTITY = "HEWLETT-PACKARD,34401A,0,11-5-2"
+MAX_READINGS = 512                     # the size of the reading memory
+MAX_COUNT = 50000                      # most samples or triggers
+
+
+def _keyword(pattern):
+    # "CONFigure" matches CONF or CONFIGURE in any case
+    short = "".join(char for char in pattern if char.isupper() or
+                    not char.isalpha())
+    return (short.upper(), pattern.upper())
+
+
+# (header keywords, query, method name); optional keywords are in brackets
+COMMANDS = [
+    ("*CLS", False, "clear"),
+    ("*RST", False, "reset"),
+    ("*IDN", True, "identify"),
+    ("CONFigure:VOLTage[:DC]", False, "configure"),
+    ("MEASure:VOLTage[:DC]", True, "measure"),
+    ("READ", True, "readQuery"),
+    ("INITiate[:IMMediate]", False, "initiate"),
+    ("FETCh", True, "fetch"),
+    ("SAMPle:COUNt", False, "setSampleCount"),
+    ("SAMPle:COUNt", True, "sampleCount"),
+    ("TRIGger:SOURce", False, "setTriggerSource"),
+    ("TRIGger:SOURce", True, "triggerSource"),
+    ("TRIGger:COUNt", False, "setTriggerCount"),
+    ("TRIGger:COUNt", True, "triggerCount"),
+    ("DATA:POINts", True, "points"),
+    ("DISPlay:TEXT[:DATA]", False, "setText"),
+    ("DISPlay:TEXT[:DATA]", True, "text"),
+    ("DISPlay:TEXT:CLEar", False, "clearText"),
+    ("INPut:IMPedance:AUTO", False, "setAutoImpedance"),
+    ("SYSTem:ERRor[:NEXT]", True, "error"),
+]
+
+
+def _parseHeader(pattern):
+    nodes = []
+    for node in re.findall(r"\[?:?[^:\[\]]+\]?", pattern):
+        optional = node.startswith("[")
+        nodes.append((_keyword(node.strip("[]:")), optional))
+    return nodes
+
+
+def _matches(nodes, words):
+    if not nodes:
+        return not words
+    (short, full), optional = nodes[0]
+    if words and words[0] in (short, full):
+        if _matches(nodes[1:], words[1:]):
+            return True
+    return optional and _matches(nodes[1:], words)
+
+
+class SimError(Exception):
+    def __init__(self, code, message):
+        Exception.__init__(self, message)
+        self.code = code
+
+
+class Sim34401A(object):
+    def __init__(self, voltage=DEFAULT_VOLTAGE, noise=DEFAULT_NOISE,
+                 latency=DEFAULT_LATENCY, seed=None, source=None):
+        self.voltage = voltage
+        self.source = source
+        self.noise = noise
+        self.latency = latency
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._commands = [(_parseHeader(header), query, getattr(self, name))
+                          for header, query, name in COMMANDS]
+        self.errors = []
+        self.reset()
+
+    def reset(self, _arguments=""):
+        self.sample_count = 1
+        self.trigger_count = 1
+        self.trigger_source = "IMM"
+        self.display_text = ""
+        self.auto_impedance = False
+        self.readings = []
+        self.started = None
+
+    def handle(self, line):
+        """ Run the commands on a line and return the replies, or None. """
+        replies = []
+        with self._lock:
+            for command in line.strip().split(";"):
+                command = command.strip()
+                if not command:
+                    continue
+                try:
+                    reply = self._run(command)
+                except SimError as error:
+                    self._error(error.code, str(error))
+                    continue
+                if reply is not None:
+                    replies.append(reply)
+        return ";".join(replies) if replies else None
+
+    def _run(self, command):
+        header, _, arguments = command.partition(" ")
+        query = header.endswith("?")
+        words = header.rstrip("?").lstrip(":").upper().split(":")
+        for nodes, is_query, method in self._commands:
+            if is_query == query and _matches(nodes, words):
+                return method(arguments.strip())
+        raise SimError(-113, "Undefined header")
+
+    def _error(self, code, message):
+        if len(self.errors) < 20:
+            self.errors.append('{:+d},"{}"'.format(code, message))
+
+    def _reading(self):
+        voltage = self.source() if self.source else self.voltage
+        return voltage + self._random.gauss(0.0, self.noise)
+
+    def _wait(self):
+        # the readings are ready when the integration time has passed
+        if self.started is not None:
+            finish = self.started + self.latency * self._count()
+            remaining = finish - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            count = min(self._count(), MAX_READINGS)
+            self.readings = [self._reading() for _ in range(count)]
+            self.started = None
+
+    def _count(self):
+        return self.sample_count * self.trigger_count
+
+    # Commands
+    def clear(self, _arguments):
+        self.errors = []
+
+    def identify(self, _arguments):
+        return IDENTITY
+
+    def configure(self, _arguments):
+        self.sample_count = 1
+        self.trigger_count = 1
+        self.trigger_source = "IMM"
+        self.readings = []
+        self.started = None
+
+    def measure(self, arguments):
+        self.configure(arguments)
+        return self.readQuery(arguments)
+
+    def readQuery(self, arguments):
+        self.initiate(arguments)
+        return self.fetch(arguments)
+
+    def initiate(self, _arguments):
+        if self.started is not None:
+            raise SimError(-213, "Init ignored")
+        self.readings = []
+        self.started = time.monotonic()
+
+    def fetch(self, _arguments):
+        self._wait()
+        if not self.readings:
+            raise SimError(-230, "Data stale")
+        return ",".join("{:+.8E}".format(value) for value in self.readings)
+
+    @staticmethod
+    def _parseCount(arguments):
+        try:
+            count = int(float(arguments))
+        except ValueError:
+            raise SimError(-104, "Data type error")
+        if count < 1 or count > MAX_COUNT:
+            raise SimError(-222, "Data out of range")
+        return count
+
+    def setSampleCount(self, arguments):
+        self.sample_count = self._parseCount(arguments)
+
+    def sampleCount(self, _arguments):
+        return "{:+d}".format(self.sample_count)
+
+    def setTriggerSource(self, arguments):
+        source = arguments.upper()[:3]
+        if source not in ("IMM", "BUS", "EXT"):
+            raise SimError(-224, "Illegal parameter value")
+        self.trigger_source = source
+
+    def triggerSource(self, _arguments):
+        return self.trigger_source
+
+    def setTriggerCount(self, arguments):
+        self.trigger_count = self._parseCount(arguments)
+
+    def triggerCount(self, _arguments):
+        return "{:+d}".format(self.trigger_count)
+
+    def points(self, _arguments):
+        if (self.started is not None and time.monotonic() >=
+                self.started + self.latency * self._count()):
+            self._wait()
+        return "{:+d}".format(len(self.readings))
+
+    def setText(self, arguments):
+        self.display_text = arguments.strip("\"'")[:12]
+
+    def text(self, _arguments):
+        return '"{}"'.format(self.display_text)
+
+    def clearText(self, _arguments):
+        self.display_text = ""
+
+    def setAutoImpedance(self, arguments):
+        self.auto_impedance = arguments.upper() in ("ON", "1")
+
+    def error(self, _arguments):
+        if self.errors:
+            return self.errors.pop(0)
+        return '+0,"No error"'
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            reply = self.server.instrument.handle(
+                line.decode("ascii", "replace"))
+            if reply is not None:
+                self.wfile.write((reply + "\n").encode("ascii"))
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serveSocket(instrument, port=DEFAULT_PORT, host="127.0.0.1"):
+    """
+    Serve the instrument on a TCP port on a background thread and return
+    the server; port 0 picks a free port, found in server.server_address.
+    """
+    server = _Server((host, port), _Handler)
+    server.instrument = instrument
+    thread = threading.Thread(target=server.serve_forever,
+                              name="simdmm socket", daemon=True)
+    thread.start()
+    return server
+
+
+def servePty(instrument):
+    """
+    Serve the instrument on a new pty on a background thread and return
+    the path of the pty for the test to open.
+    """
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    path = os.ttyname(slave)
+
+    def serve():
+        buffer = b""
+        while True:
+            select.select([master], [], [])
+            buffer += os.read(master, 4096)
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                reply = instrument.handle(line.decode("ascii", "replace"))
+                if reply is not None:
+                    os.write(master, (reply + "\n").encode("ascii"))
+
+    # slave is left open so the pty outlives the test's connections
+    thread = threading.Thread(target=serve, name="simdmm pty", daemon=True)
+    thread.start()
+    return path
+
+
+class LocalTransport(object):
+    """ An ce_common.instrument transport for an emulator in this process. """
+    def __init__(self, instrument):
+        self.instrument = instrument
+        self._replies = []
+
+    def setTimeout(self, seconds):
+        pass
+
+    def write(self, command):
+        reply = self.instrument.handle(command)
+        if reply is not None:
+            self._replies.append(reply)
+
+    def read(self):
+        if not self._replies:
+            raise InstrumentTimeout("No reply waiting")
+        return self._replies.pop(0)
+
+    def query(self, command):
+        self.write(command)
+        return self.read()
+
+    def local(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# the emulators opened by simulatedTransport(), by board address
+_simulated = {}
+
+
+def simulatedTransport(location):
+    """
+    Return a transport to an emulated DMM that measures output 0 of the
+    simulated MCC 152 at the address in location, or the first one if it
+    is empty. The emulator is kept for reconnects.
+    """
+    from ce_common import simhats
+    if location:
+        address = int(location)
+    else:
+        boards = simhats.hat_list(filter_by_id=simhats.HatIDs.MCC_152)
+        address = boards[0].address if boards else 0
+    if address not in _simulated:
+        _simulated[address] = Sim34401A(
+            source=lambda: simhats.aoVoltage(address))
+    return LocalTransport(_simulated[address])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Emulated HP 34401A DMM for the MCC 152 CE test")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="TCP port to serve (default {})"
+                        .format(DEFAULT_PORT))
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address to serve on (default 127.0.0.1)")
+    parser.add_argument("--pty", action="store_true",
+                        help="serve on a pty instead of a TCP port")
+    parser.add_argument("--voltage", type=float, default=DEFAULT_VOLTAGE,
+                        help="voltage read in V (default {:.6f})"
+                        .format(DEFAULT_VOLTAGE))
+    parser.add_argument("--noise", type=float, default=DEFAULT_NOISE,
+                        help="reading noise in V rms (default {:g})"
+                        .format(DEFAULT_NOISE))
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY,
+                        help="s per reading (default {:g})"
+                        .format(DEFAULT_LATENCY))
+    args = parser.parse_args()
+
+    instrument = Sim34401A(args.voltage, args.noise, args.latency)
+    if args.pty:
+        print("Serving tty:" + servePty(instrument), flush=True)
+    else:
+        server = serveSocket(instrument, args.port, args.host)
+        print("Serving tcp:{}:{}".format(*server.server_address[:2]),
+              flush=True)
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
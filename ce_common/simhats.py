@@ -0,0 +1,887 @@
+"""
+    Simulated DAQ HATs for the CE test applications
+
+    Purpose:
+        Run the CE tests without a Raspberry Pi or DAQ HATs
+
+    Description:
+        This module implements the part of the daqhats API that the tests use
+        for the MCC 118, 128, 134, 152 and 172. Scans produce samples in real
+        time at the scan rate into a buffer of the real size. A reader that
+        falls behind a continuous scan gets a buffer overrun, and reads wait
+        for the data just as they do on the hardware.
+
+        The analog inputs read DC offsets plus Gaussian noise, quantized to
+        the board resolution, with optional periodic bursts and a sine
+        tone. Faults can be injected: HatErrors from any call, external
+        triggers, hardware overruns, DIO bit errors and open thermocouples.
+
+        ce_common.hats selects this module when the DAQHATS_SIM environment
+        variable is set. The settings come from configure(), or from a JSON
+        file named by DAQHATS_SIM_CONFIG with the SimConfig attribute names
+        as keys.
+"""
+from collections import namedtuple
+from enum import IntEnum
+import json
+import math
+import os
+import random
+import threading
+import time
+
+from ce_common.blockstats import numpy, HAVE_NUMPY
+
+# the names that stand in for the daqhats library
+__all__ = ['hat_list', 'HatIDs', 'HatError', 'OptionFlags', 'TriggerModes',
+           'AnalogInputMode', 'AnalogInputRange', 'TcTypes', 'DIOConfigItem',
+           'SourceType', 'mcc118', 'mcc128', 'mcc134', 'mcc152', 'mcc172']
+
+
+class HatIDs(IntEnum):
+    ANY = 0
+    MCC_118 = 0x0142
+    MCC_118_BOOTLOADER = 0x8142
+    MCC_128 = 0x0146
+    MCC_134 = 0x0143
+    MCC_152 = 0x0144
+    MCC_172 = 0x0145
+
+
+class OptionFlags(IntEnum):
+    DEFAULT = 0x0000
+    NOSCALEDATA = 0x0001
+    NOCALIBRATEDATA = 0x0002
+    EXTCLOCK = 0x0004
+    EXTTRIGGER = 0x0008
+    CONTINUOUS = 0x0010
+    TEMPERATURE = 0x0020
+
+
+class TriggerModes(IntEnum):
+    RISING_EDGE = 0
+    FALLING_EDGE = 1
+    ACTIVE_HIGH = 2
+    ACTIVE_LOW = 3
+
+
+class AnalogInputMode(IntEnum):
+    SE = 0
+    DIFF = 1
+
+
+class AnalogInputRange(IntEnum):
+    BIP_10V = 0
+    BIP_5V = 1
+    BIP_2V = 2
+    BIP_1V = 3
+
+
+class TcTypes(IntEnum):
+    TYPE_J = 0
+    TYPE_K = 1
+    TYPE_T = 2
+    TYPE_E = 3
+    TYPE_R = 4
+    TYPE_S = 5
+    TYPE_B = 6
+    TYPE_N = 7
+    DISABLED = 0xFF
+
+
+class DIOConfigItem(IntEnum):
+    DIRECTION = 0
+    PULL_CONFIG = 1
+    PULL_ENABLE = 2
+    INPUT_INVERT = 3
+    INPUT_LATCH = 4
+    OUTPUT_TYPE = 5
+    INT_MASK = 6
+
+
+class SourceType(IntEnum):
+    LOCAL = 0
+    MASTER = 1
+    SLAVE = 2
+
+
+class HatError(Exception):
+    """ Exception raised by the simulated boards, as by the daqhats boards. """
+    def __init__(self, address, value):
+        Exception.__init__(self)
+        self.address = address
+        self.value = value
+
+    def __str__(self):
+        return "Addr {}: {}".format(self.address, self.value)
+
+
+HatInfo = namedtuple('HatInfo', ['address', 'id', 'version', 'product_name'])
+
+ScanReadResult = namedtuple(
+    'ScanReadResult', ['running', 'hardware_overrun', 'buffer_overrun',
+                       'triggered', 'timeout', 'data'])
+
+ScanStatus = namedtuple(
+    'ScanStatus', ['running', 'hardware_overrun', 'buffer_overrun',
+                   'triggered', 'samples_available'])
+
+ClockConfig = namedtuple(
+    'ClockConfig', ['clock_source', 'sample_rate_per_channel',
+                    'synchronized'])
+
+PRODUCT_NAMES = {
+    HatIDs.MCC_118: "MCC 118 Voltage HAT",
+    HatIDs.MCC_128: "MCC 128 Voltage HAT",
+    HatIDs.MCC_134: "MCC 134 Thermocouple HAT",
+    HatIDs.MCC_152: "MCC 152 Voltage Output / DIO HAT",
+    HatIDs.MCC_172: "MCC 172 IEPE HAT",
+}
+
+SYNC_TIME = 0.05         # s for the MCC 172 clock to synchronize
+
+
+class SimConfig(object):
+    """
+    Simulation settings. The analog input settings are either one value for
+    every channel or a list with a value for each channel.
+    """
+    def __init__(self):
+        # board type -> addresses of the simulated boards
+        self.boards = {HatIDs.MCC_118: [0], HatIDs.MCC_128: [1],
+                       HatIDs.MCC_134: [2], HatIDs.MCC_152: [3],
+                       HatIDs.MCC_172: [4]}
+        self.offset = 0.0           # V
+        self.noise = 100e-6         # V rms
+        self.burst_amplitude = 0.0  # V added to the inputs during a burst
+        self.burst_interval = 1.0   # s from the start of one burst to the next
+        self.burst_length = 0.01    # s
+        self.tone_amplitude = 0.0   # V peak of a sine added to the inputs
+        self.tone_frequency = 1000.0  # Hz
+        self.tc_offset = 0.0        # V
+        self.tc_noise = 2e-6        # V rms
+        self.cjc_temp = 25.0        # C
+        self.cjc_noise = 0.05       # C rms
+        self.open_tc = []           # MCC 134 channels with an open thermocouple
+        self.common_mode_tc = []    # MCC 134 channels out of common mode range
+        self.fault_rate = 0.0       # chance that a board call raises HatError
+        self.trigger_rate = 0.0     # external triggers per second
+        self.overrun_rate = 0.0     # hardware overruns per second of scanning
+        self.dio_error_rate = 0.0   # chance that an input bit reads wrong
+        # MCC 152 output bit -> input bit wired to it
+        self.dio_loopback = {0: 4, 1: 5, 2: 6, 3: 7}
+        self.seed = None            # random seed, or None for a random start
+
+    def channelValue(self, name, channel):
+        value = getattr(self, name)
+        if isinstance(value, (list, tuple)):
+            return value[channel] if channel < len(value) else 0.0
+        return value
+
+
+config = SimConfig()
+
+# state that belongs to the board rather than to an open handle, by address
+_board_state = {}
+_state_lock = threading.Lock()
+
+
+def configure(**settings):
+    """ Change the simulation settings; the names are SimConfig attributes. """
+    for name, value in settings.items():
+        if not hasattr(config, name) or name == "channelValue":
+            raise ValueError("Unknown simulation setting " + name)
+        if name == "boards":
+            # JSON files name the board types
+            value = {(HatIDs[key] if isinstance(key, str) else HatIDs(key)):
+                     list(addresses) for key, addresses in value.items()}
+        elif name == "dio_loopback":
+            value = {int(key): int(bit) for key, bit in value.items()}
+        setattr(config, name, value)
+
+
+def reset():
+    """ Forget the board state, as if the boards were power cycled. """
+    with _state_lock:
+        _board_state.clear()
+
+
+def aoVoltage(address, channel=0):
+    """ Return an output voltage of a simulated MCC 152, 0 until it is set. """
+    with _state_lock:
+        return _board_state.get(address, {}).get('ao', [0.0, 0.0])[channel]
+
+
+def hat_list(filter_by_id=HatIDs.ANY):
+    """ Return the simulated boards, as daqhats.hat_list() does. """
+    boards = []
+    for hat_id, addresses in config.boards.items():
+        if filter_by_id in (HatIDs.ANY, hat_id):
+            boards.extend(HatInfo(address, hat_id, 1, PRODUCT_NAMES[hat_id])
+                          for address in addresses)
+    return sorted(boards)
+
+
+class _SimHat(object):
+    """ Board identity, shared board state and fault injection. """
+    _id = HatIDs.ANY
+
+    def __init__(self, address=0):
+        self._address = address
+        if config.seed is None:
+            self._random = random.Random()
+        else:
+            self._random = random.Random(config.seed + address)
+        self._fault()
+        if address not in config.boards.get(self._id, []):
+            raise HatError(address, "Invalid board type.")
+        with _state_lock:
+            self._state = _board_state.setdefault(address, {})
+
+    def _fault(self):
+        if config.fault_rate and self._random.random() < config.fault_rate:
+            raise HatError(self._address, "Simulated fault.")
+
+    def address(self):
+        return self._address
+
+    def serial(self):
+        self._fault()
+        return "SIM{:05d}".format(self._address)
+
+
+class _Scan(object):
+    """ Progress of one scan in samples per channel. """
+    def __init__(self, channels, samples_per_channel, rate, options,
+                 buffer_size, start_time, overrun_time):
+        self.channels = channels
+        self.rate = rate
+        self.options = options
+        self.continuous = bool(options & OptionFlags.CONTINUOUS)
+        self.total = None if self.continuous else samples_per_channel
+        self.buffer_size = buffer_size
+        self.start_time = start_time
+        self.overrun_time = overrun_time
+        self.produced = 0
+        self.consumed = 0
+        self.limit = None
+        self.hardware_overrun = False
+        self.buffer_overrun = False
+
+    def update(self, now):
+        """ Advance the scan to the time now. """
+        if self.limit is None and now >= self.overrun_time:
+            self.hardware_overrun = True
+            self.limit = self.samplesAt(self.overrun_time)
+        produced = self.samplesAt(now)
+        if self.limit is not None:
+            produced = min(produced, self.limit)
+        if (self.continuous and self.limit is None and
+                produced - self.consumed > self.buffer_size):
+            # the reader fell behind; the scan stops with a full buffer
+            self.buffer_overrun = True
+            self.limit = self.consumed + self.buffer_size
+            produced = self.limit
+        self.produced = produced
+
+    def samplesAt(self, when):
+        if when < self.start_time:
+            return 0
+        samples = int((when - self.start_time) * self.rate)
+        if self.total is not None:
+            samples = min(samples, self.total)
+        return samples
+
+    def running(self):
+        return (self.limit is None and
+                (self.total is None or self.produced < self.total))
+
+    def triggered(self, now):
+        return now >= self.start_time
+
+
+class _ScanHat(_SimHat):
+    """ Analog input scanning and single reads for the MCC 118, 128 and 172. """
+    _max_rate = 100000.0     # aggregate S/s
+    _resolution = 12         # bits
+
+    def __init__(self, address=0):
+        _SimHat.__init__(self, address)
+        self._scan = None
+        if HAVE_NUMPY:
+            if config.seed is None:
+                self._generator = numpy.random.default_rng()
+            else:
+                self._generator = numpy.random.default_rng(
+                    config.seed + address)
+
+    def _range(self):
+        """ Return the (minimum, maximum) input voltage. """
+        raise NotImplementedError
+
+    def _numChannels(self):
+        raise NotImplementedError
+
+    def _generate(self, channels, first, count, rate):
+        """
+        Return count samples per channel starting at sample first, with the
+        channels interleaved.
+        """
+        min_range, max_range = self._range()
+        lsb = (max_range - min_range) / 2**self._resolution
+        max_voltage = max_range - lsb
+        interval = config.burst_interval
+        length = config.burst_length
+        amplitude = config.burst_amplitude
+
+        if HAVE_NUMPY:
+            block = numpy.empty((count, len(channels)))
+            times = numpy.arange(first, first + count) / rate
+            if amplitude and interval > 0:
+                burst = (times % interval) < length
+            for column, channel in enumerate(channels):
+                samples = block[:, column]
+                samples[:] = self._generator.standard_normal(count)
+                samples *= config.channelValue("noise", channel)
+                samples += config.channelValue("offset", channel)
+                if amplitude and interval > 0:
+                    samples[burst] += amplitude
+                tone = config.channelValue("tone_amplitude", channel)
+                if tone:
+                    samples += tone * numpy.sin(
+                        2 * math.pi *
+                        config.channelValue("tone_frequency", channel) * times)
+            numpy.round(block / lsb, out=block)
+            block *= lsb
+            numpy.clip(block, min_range, max_voltage, out=block)
+            return block.ravel()
+
+        data = []
+        gauss = self._random.gauss
+        offsets = [config.channelValue("offset", channel)
+                   for channel in channels]
+        noises = [config.channelValue("noise", channel)
+                  for channel in channels]
+        tones = [(config.channelValue("tone_amplitude", channel),
+                  config.channelValue("tone_frequency", channel))
+                 for channel in channels]
+        for index in range(first, first + count):
+            extra = 0.0
+            if amplitude and interval > 0 and (index / rate) % interval < length:
+                extra = amplitude
+            for offset, noise, tone in zip(offsets, noises, tones):
+                value = offset + extra + gauss(0.0, noise)
+                if tone[0]:
+                    value += tone[0] * math.sin(2 * math.pi * tone[1] *
+                                                index / rate)
+                value = round(value / lsb) * lsb
+                data.append(min(max(value, min_range), max_voltage))
+        return data
+
+    def _defaultBufferSize(self, rate):
+        # the library allocates a larger buffer for faster scans
+        if rate <= 1024:
+            return 1000
+        if rate <= 10240:
+            return 10000
+        return 100000
+
+    def _startScan(self, channel_mask, samples_per_channel, rate, options):
+        self._fault()
+        if self._scan is not None:
+            raise HatError(self._address, "A scan is already active.")
+        channels = [channel for channel in range(self._numChannels())
+                    if channel_mask & (1 << channel)]
+        if not channels:
+            raise ValueError("Invalid channel mask.")
+        if rate <= 0 or rate * len(channels) > self._max_rate:
+            raise ValueError("Invalid sample rate.")
+        if options & OptionFlags.CONTINUOUS:
+            buffer_size = max(samples_per_channel,
+                              self._defaultBufferSize(rate))
+        else:
+            if samples_per_channel < 1:
+                raise ValueError("Invalid samples_per_channel.")
+            buffer_size = samples_per_channel
+
+        now = time.monotonic()
+        start_time = now
+        if options & OptionFlags.EXTTRIGGER:
+            start_time = float("inf")
+            if config.trigger_rate > 0:
+                start_time = now + self._random.expovariate(
+                    config.trigger_rate)
+        overrun_time = float("inf")
+        if config.overrun_rate > 0:
+            overrun_time = start_time + self._random.expovariate(
+                config.overrun_rate)
+        self._scan = _Scan(channels, samples_per_channel, rate, options,
+                           buffer_size, start_time, overrun_time)
+
+    def _read(self, samples_per_channel, timeout):
+        self._fault()
+        scan = self._scan
+        if scan is None:
+            raise HatError(self._address, "No scan is active.")
+
+        start = time.monotonic()
+        deadline = None if timeout < 0 else start + timeout
+        timed_out = False
+        while True:
+            now = time.monotonic()
+            scan.update(now)
+            available = scan.produced - scan.consumed
+            if samples_per_channel < 0:
+                # read everything, waiting for a finite scan to complete
+                wanted = available if scan.continuous else None
+            else:
+                wanted = samples_per_channel
+            if not scan.running() or (wanted is not None and
+                                      available >= wanted):
+                break
+            if deadline is not None and now >= deadline:
+                timed_out = samples_per_channel != 0
+                break
+
+            # sleep until the samples should be there
+            if wanted is None:
+                needed = scan.total
+            else:
+                needed = scan.consumed + wanted
+            ready_time = scan.start_time + needed / scan.rate
+            wait = ready_time - now
+            if wait == float("inf"):
+                # waiting for a trigger
+                wait = 0.01
+            if deadline is not None:
+                wait = min(wait, deadline - now)
+            time.sleep(max(wait, 0.0) + 1e-4)
+
+        count = available
+        if samples_per_channel >= 0:
+            count = min(samples_per_channel, available)
+        data = self._generate(scan.channels, scan.consumed, count, scan.rate)
+        scan.consumed += count
+        return ScanReadResult(scan.running(), scan.hardware_overrun,
+                              scan.buffer_overrun, scan.triggered(now),
+                              timed_out, data)
+
+    def a_in_scan_read(self, samples_per_channel, timeout):
+        result = self._read(samples_per_channel, timeout)
+        return result._replace(data=list(result.data))
+
+    def a_in_scan_read_numpy(self, samples_per_channel, timeout):
+        result = self._read(samples_per_channel, timeout)
+        if HAVE_NUMPY:
+            return result._replace(data=numpy.asarray(result.data))
+        return result
+
+    def a_in_scan_status(self):
+        self._fault()
+        scan = self._scan
+        if scan is None:
+            raise HatError(self._address, "No scan is active.")
+        now = time.monotonic()
+        scan.update(now)
+        return ScanStatus(scan.running(), scan.hardware_overrun,
+                          scan.buffer_overrun, scan.triggered(now),
+                          scan.produced - scan.consumed)
+
+    def a_in_scan_buffer_size(self):
+        if self._scan is None:
+            raise HatError(self._address, "No scan is active.")
+        return self._scan.buffer_size * len(self._scan.channels)
+
+    def a_in_scan_channel_count(self):
+        if self._scan is None:
+            return 0
+        return len(self._scan.channels)
+
+    def a_in_scan_stop(self):
+        self._fault()
+        if self._scan is not None:
+            scan = self._scan
+            scan.update(time.monotonic())
+            if scan.limit is None:
+                scan.limit = scan.produced
+
+    def a_in_scan_cleanup(self):
+        self._fault()
+        self._scan = None
+
+    def a_in_read(self, channel, options=OptionFlags.DEFAULT):
+        self._fault()
+        if channel < 0 or channel >= self._numChannels():
+            raise ValueError("Invalid channel {}.".format(channel))
+        # one sample at the current time so the bursts line up with scans
+        return float(self._generate([channel], int(time.monotonic() * 1000),
+                                    1, 1000.0)[0])
+
+
+class mcc118(_ScanHat):
+    """ Simulated MCC 118. """
+    _id = HatIDs.MCC_118
+    _resolution = 12
+
+    @staticmethod
+    def info():
+        Info = namedtuple(
+            'Mcc118Info', ['NUM_AI_CHANNELS', 'AI_MIN_CODE', 'AI_MAX_CODE',
+                           'AI_MIN_VOLTAGE', 'AI_MAX_VOLTAGE', 'AI_MIN_RANGE',
+                           'AI_MAX_RANGE'])
+        return Info(8, 0, 4095, -10.0, 10.0 - (20.0 / 4096), -10.0, 10.0)
+
+    def _range(self):
+        return (-10.0, 10.0)
+
+    def _numChannels(self):
+        return 8
+
+    def trigger_mode(self, mode):
+        self._fault()
+        self._state['trigger_mode'] = mode
+
+    def a_in_scan_actual_rate(self, channel_count, sample_rate_per_channel):
+        return sample_rate_per_channel
+
+    def a_in_scan_start(self, channel_mask, samples_per_channel,
+                        sample_rate_per_channel, options):
+        self._startScan(channel_mask, samples_per_channel,
+                        sample_rate_per_channel, options)
+
+
+class mcc128(_ScanHat):
+    """ Simulated MCC 128. """
+    _id = HatIDs.MCC_128
+    _resolution = 16
+    _ranges = {AnalogInputRange.BIP_10V: 10.0, AnalogInputRange.BIP_5V: 5.0,
+               AnalogInputRange.BIP_2V: 2.0, AnalogInputRange.BIP_1V: 1.0}
+
+    @staticmethod
+    def info():
+        Info = namedtuple(
+            'Mcc128Info', ['NUM_AI_MODES', 'NUM_AI_CHANNELS', 'AI_MIN_CODE',
+                           'AI_MAX_CODE', 'NUM_AI_RANGES', 'AI_MIN_VOLTAGE',
+                           'AI_MAX_VOLTAGE', 'AI_MIN_RANGE', 'AI_MAX_RANGE'])
+        return Info(2, [8, 4], 0, 65535, 4,
+                    [-10.0, -5.0, -2.0, -1.0],
+                    [10.0 - (20.0 / 65536), 5.0 - (10.0 / 65536),
+                     2.0 - (4.0 / 65536), 1.0 - (2.0 / 65536)],
+                    [-10.0, -5.0, -2.0, -1.0], [10.0, 5.0, 2.0, 1.0])
+
+    def _range(self):
+        full_scale = self._ranges[self._state.get(
+            'range', AnalogInputRange.BIP_10V)]
+        return (-full_scale, full_scale)
+
+    def _numChannels(self):
+        return mcc128.info().NUM_AI_CHANNELS[self._state.get(
+            'mode', AnalogInputMode.SE)]
+
+    def a_in_mode_write(self, mode):
+        self._fault()
+        if self._scan is not None:
+            raise HatError(self._address, "A scan is active.")
+        self._state['mode'] = AnalogInputMode(mode)
+
+    def a_in_mode_read(self):
+        return self._state.get('mode', AnalogInputMode.SE)
+
+    def a_in_range_write(self, input_range):
+        self._fault()
+        if self._scan is not None:
+            raise HatError(self._address, "A scan is active.")
+        self._state['range'] = AnalogInputRange(input_range)
+
+    def a_in_range_read(self):
+        return self._state.get('range', AnalogInputRange.BIP_10V)
+
+    def trigger_mode(self, mode):
+        self._fault()
+        self._state['trigger_mode'] = mode
+
+    def a_in_scan_actual_rate(self, channel_count, sample_rate_per_channel):
+        return sample_rate_per_channel
+
+    def a_in_scan_start(self, channel_mask, samples_per_channel,
+                        sample_rate_per_channel, options):
+        self._startScan(channel_mask, samples_per_channel,
+                        sample_rate_per_channel, options)
+
+
+class mcc172(_ScanHat):
+    """ Simulated MCC 172. """
+    _id = HatIDs.MCC_172
+    _resolution = 24
+    _max_rate = 2 * 51200.0
+
+    @staticmethod
+    def info():
+        Info = namedtuple(
+            'Mcc172Info', ['NUM_AI_CHANNELS', 'AI_MIN_CODE', 'AI_MAX_CODE',
+                           'AI_MIN_VOLTAGE', 'AI_MAX_VOLTAGE', 'AI_MIN_RANGE',
+                           'AI_MAX_RANGE'])
+        return Info(2, -8388608, 8388607, -5.0, 5.0 - (10.0 / 16777216),
+                    -5.0, 5.0)
+
+    def _range(self):
+        return (-5.0, 5.0)
+
+    def _numChannels(self):
+        return 2
+
+    def iepe_config_write(self, channel, mode):
+        self._fault()
+        self._state.setdefault('iepe', [0, 0])[channel] = mode
+
+    def iepe_config_read(self, channel):
+        return self._state.get('iepe', [0, 0])[channel]
+
+    def a_in_sensitivity_write(self, channel, value):
+        self._fault()
+        self._state.setdefault('sensitivity', [1000.0, 1000.0])[channel] = value
+
+    def a_in_sensitivity_read(self, channel):
+        return self._state.get('sensitivity', [1000.0, 1000.0])[channel]
+
+    def a_in_clock_config_write(self, clock_source, sample_rate_per_channel):
+        self._fault()
+        if self._scan is not None:
+            raise HatError(self._address, "A scan is active.")
+        # the rate is 51.2 kHz divided by an integer from 1 to 256
+        divisor = min(max(int(round(51200.0 / sample_rate_per_channel)), 1),
+                      256)
+        self._state['clock'] = (SourceType(clock_source), 51200.0 / divisor,
+                                time.monotonic() + SYNC_TIME)
+
+    def a_in_clock_config_read(self):
+        self._fault()
+        source, rate, sync_time = self._state.get(
+            'clock', (SourceType.LOCAL, 51200.0, 0.0))
+        return ClockConfig(source, rate, time.monotonic() >= sync_time)
+
+    def trigger_config(self, source, mode):
+        self._fault()
+        self._state['trigger'] = (source, mode)
+
+    def a_in_scan_actual_rate(self, sample_rate_per_channel):
+        return 51200.0 / min(max(int(round(
+            51200.0 / sample_rate_per_channel)), 1), 256)
+
+    def a_in_scan_start(self, channel_mask, samples_per_channel, options):
+        source, rate, sync_time = self._state.get(
+            'clock', (SourceType.LOCAL, 51200.0, 0.0))
+        if time.monotonic() < sync_time:
+            raise HatError(self._address, "The clock is not synchronized.")
+        self._startScan(channel_mask, samples_per_channel, rate, options)
+
+
+class mcc134(_SimHat):
+    """ Simulated MCC 134. The readings update once per update interval. """
+    _id = HatIDs.MCC_134
+
+    OPEN_TC_VALUE = -9999.0
+    OVERRANGE_TC_VALUE = -8888.0
+    COMMON_MODE_TC_VALUE = -7777.0
+    # like a real board, the calibration is not quite unity
+    CAL_SLOPE = 0.9985
+    CAL_OFFSET = -42.0
+
+    @staticmethod
+    def info():
+        Info = namedtuple(
+            'Mcc134Info', ['NUM_AI_CHANNELS', 'AI_MIN_CODE', 'AI_MAX_CODE',
+                           'AI_MIN_VOLTAGE', 'AI_MAX_VOLTAGE', 'AI_MIN_RANGE',
+                           'AI_MAX_RANGE'])
+        return Info(4, -8388608, 8388607, -0.078125,
+                    0.078125 - (0.15625 / 16777216), -0.078125, 0.078125)
+
+    def __init__(self, address=0):
+        _SimHat.__init__(self, address)
+        self._state.setdefault('tc_types', [TcTypes.DISABLED]*4)
+        self._state.setdefault('update_interval', 1)
+
+    def tc_type_write(self, channel, tc_type):
+        self._fault()
+        self._state['tc_types'][channel] = TcTypes(tc_type)
+
+    def tc_type_read(self, channel):
+        return self._state['tc_types'][channel]
+
+    def update_interval_write(self, interval):
+        self._fault()
+        if interval < 1 or interval > 255:
+            raise ValueError("Invalid interval {}.".format(interval))
+        self._state['update_interval'] = interval
+
+    def update_interval_read(self):
+        return self._state['update_interval']
+
+    def _readings(self):
+        """ Return the (tc voltages, cjc temperatures) of the last update. """
+        now = time.monotonic()
+        readings = self._state.get('readings')
+        if (readings is None or
+                now - readings[0] >= self._state['update_interval']):
+            gauss = self._random.gauss
+            voltages = [config.channelValue("tc_offset", channel) +
+                        gauss(0.0, config.channelValue("tc_noise", channel))
+                        for channel in range(4)]
+            temps = [config.channelValue("cjc_temp", channel) +
+                     gauss(0.0, config.channelValue("cjc_noise", channel))
+                     for channel in range(4)]
+            readings = (now, voltages, temps)
+            self._state['readings'] = readings
+        return readings[1], readings[2]
+
+    def calibration_coefficient_read(self, channel):
+        self._fault()
+        Coefficients = namedtuple('Coefficients', ['slope', 'offset'])
+        return Coefficients(mcc134.CAL_SLOPE, mcc134.CAL_OFFSET)
+
+    def a_in_read(self, channel, options=OptionFlags.DEFAULT):
+        self._fault()
+        info = mcc134.info()
+        lsb = ((info.AI_MAX_RANGE - info.AI_MIN_RANGE) /
+               (info.AI_MAX_CODE - info.AI_MIN_CODE + 1))
+        if channel in config.open_tc:
+            # an open input floats to the top of the range
+            code = info.AI_MAX_CODE
+        elif channel in config.common_mode_tc:
+            code = info.AI_MIN_CODE
+        else:
+            # the raw code that calibrates to the input voltage
+            code = int(round((self._readings()[0][channel] / lsb -
+                              mcc134.CAL_OFFSET) / mcc134.CAL_SLOPE))
+            code = min(max(code, info.AI_MIN_CODE), info.AI_MAX_CODE)
+        value = float(code)
+        if not options & OptionFlags.NOCALIBRATEDATA:
+            value = value * mcc134.CAL_SLOPE + mcc134.CAL_OFFSET
+        if options & OptionFlags.NOSCALEDATA:
+            return value
+        return value * lsb
+
+    def cjc_read(self, channel):
+        self._fault()
+        return self._readings()[1][channel]
+
+    def t_in_read(self, channel):
+        self._fault()
+        if self._state['tc_types'][channel] == TcTypes.DISABLED:
+            raise HatError(self._address, "Channel disabled.")
+        if channel in config.open_tc:
+            return mcc134.OPEN_TC_VALUE
+        if channel in config.common_mode_tc:
+            return mcc134.COMMON_MODE_TC_VALUE
+        voltages, temps = self._readings()
+        # roughly 40 uV/C for the common thermocouple types
+        return temps[channel] + voltages[channel] / 40e-6
+
+
+class mcc152(_SimHat):
+    """
+    Simulated MCC 152. Input bits read the output bit wired to them by
+    config.dio_loopback, or the pull-up when that bit is not an output.
+    """
+    _id = HatIDs.MCC_152
+
+    @staticmethod
+    def info():
+        Info = namedtuple(
+            'Mcc152Info', ['NUM_DIO_CHANNELS', 'NUM_AO_CHANNELS',
+                           'AO_MIN_CODE', 'AO_MAX_CODE', 'AO_MIN_VOLTAGE',
+                           'AO_MAX_VOLTAGE', 'AO_MIN_RANGE', 'AO_MAX_RANGE'])
+        return Info(8, 2, 0, 4095, 0.0, 5.0 - (5.0 / 4096), 0.0, 5.0)
+
+    def __init__(self, address=0):
+        _SimHat.__init__(self, address)
+        if 'dio' not in self._state:
+            self._resetDio()
+        self._state.setdefault('ao', [0.0, 0.0])
+
+    def _resetDio(self):
+        self._state['dio'] = {DIOConfigItem.DIRECTION: 0xFF,
+                              DIOConfigItem.PULL_CONFIG: 0xFF,
+                              DIOConfigItem.PULL_ENABLE: 0xFF,
+                              DIOConfigItem.INPUT_INVERT: 0x00,
+                              DIOConfigItem.INPUT_LATCH: 0x00,
+                              DIOConfigItem.OUTPUT_TYPE: 0x00,
+                              DIOConfigItem.INT_MASK: 0xFF}
+        self._state['output'] = 0xFF
+
+    def dio_reset(self):
+        self._fault()
+        self._resetDio()
+
+    def dio_config_write_port(self, item, value):
+        self._fault()
+        self._state['dio'][DIOConfigItem(item)] = value & 0xFF
+
+    def dio_config_write_bit(self, channel, item, value):
+        self._fault()
+        mask = 1 << channel
+        config_value = self._state['dio'][DIOConfigItem(item)] & ~mask
+        self._state['dio'][DIOConfigItem(item)] = (
+            config_value | (mask if value else 0))
+
+    def dio_config_read_port(self, item):
+        self._fault()
+        return self._state['dio'][DIOConfigItem(item)]
+
+    def dio_config_read_bit(self, channel, item):
+        return (self.dio_config_read_port(item) >> channel) & 1
+
+    def dio_output_write_port(self, values):
+        self._fault()
+        self._state['output'] = values & 0xFF
+
+    def dio_output_write_bit(self, channel, value):
+        self._fault()
+        mask = 1 << channel
+        self._state['output'] = ((self._state['output'] & ~mask) |
+                                 (mask if value else 0))
+
+    def dio_output_write_dict(self, value_dict):
+        for channel, value in value_dict.items():
+            self.dio_output_write_bit(channel, value)
+
+    def dio_output_read_port(self):
+        self._fault()
+        return self._state['output']
+
+    def dio_output_read_bit(self, channel):
+        return (self.dio_output_read_port() >> channel) & 1
+
+    def dio_input_read_port(self):
+        self._fault()
+        direction = self._state['dio'][DIOConfigItem.DIRECTION]
+        output = self._state['output']
+        # an output reads back its own value, an input the pull-up
+        value = (output & ~direction) | (direction & 0xFF)
+        for out_bit, in_bit in config.dio_loopback.items():
+            if (direction >> in_bit) & 1 and not (direction >> out_bit) & 1:
+                value = ((value & ~(1 << in_bit)) |
+                         (((output >> out_bit) & 1) << in_bit))
+        if config.dio_error_rate:
+            for bit in range(8):
+                if self._random.random() < config.dio_error_rate:
+                    value ^= 1 << bit
+        return value ^ self._state['dio'][DIOConfigItem.INPUT_INVERT]
+
+    def dio_input_read_bit(self, channel):
+        return (self.dio_input_read_port() >> channel) & 1
+
+    def a_out_write(self, channel, value, options=OptionFlags.DEFAULT):
+        self._fault()
+        if value < 0.0 or value > 5.0:
+            raise ValueError("Invalid voltage {}.".format(value))
+        self._state['ao'][channel] = value
+
+    def a_out_write_all(self, values, options=OptionFlags.DEFAULT):
+        for channel, value in enumerate(values):
+            self.a_out_write(channel, value, options)
+
+
+if os.environ.get("DAQHATS_SIM_CONFIG"):
+    with open(os.environ["DAQHATS_SIM_CONFIG"]) as config_file:
+        configure(**json.load(config_file))
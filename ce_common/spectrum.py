@@ -0,0 +1,174 @@
+"""
+    Spectral monitor for the CE test applications
+
+    Purpose:
+        Tell narrowband pickup from broadband noise in the scan data
+
+    Description:
+        A SpectrumMonitor runs Hann windowed FFTs over each scan block, with
+        the frames overlapping by OVERLAP, and keeps a max-hold and an
+        average (power) spectrum per channel for the whole session. Each
+        block's peak spectrum is compared to a mask and the bins above it are
+        flagged. The spectra are in mV rms per bin.
+
+        The frames are strided views of the block, and the windowed frames,
+        FFT output and magnitudes go into arrays that are allocated once and
+        reused; NumPy caches the FFT plan for the frame size. The monitor
+        needs NumPy.
+"""
+from collections import namedtuple
+import os
+
+from ce_common.blockstats import numpy, HAVE_NUMPY
+
+FFT_SIZE = 4096          # samples per FFT frame
+OVERLAP = 0.5            # fraction of a frame shared with the next one
+DEFAULT_MASK = 1.0       # mV rms in any bin above DC
+MAX_FLAGS = 8            # flagged bins reported per channel per block
+
+# A bin of one block's peak spectrum that is above the mask
+MaskFlag = namedtuple('MaskFlag', ['channel', 'frequency', 'level', 'limit'])
+
+
+def spectrumFilename(log_filename, address):
+    return "{}_spectrum_bd{}.csv".format(os.path.splitext(log_filename)[0],
+                                         address)
+
+
+def _rfftOut():
+    """ True if numpy.fft.rfft can write into an existing array. """
+    try:
+        numpy.fft.rfft(numpy.zeros(4), out=numpy.zeros(3, dtype=complex))
+        return True
+    except TypeError:
+        return False
+
+
+class SpectrumMonitor(object):
+    def __init__(self, num_channels, rate, fft_size=FFT_SIZE, overlap=OVERLAP,
+                 mask=DEFAULT_MASK):
+        """
+        mask is the limit in mV rms for every bin above DC, or a list of
+        (frequency, limit) points that are interpolated across the bins.
+        """
+        if not HAVE_NUMPY:
+            raise RuntimeError("The spectral monitor needs NumPy")
+        self.num_channels = num_channels
+        self.rate = float(rate)
+        self.fft_size = fft_size
+        self.hop = max(int(fft_size * (1.0 - overlap)), 1)
+        self.frequencies = numpy.fft.rfftfreq(fft_size, 1.0 / self.rate)
+        num_bins = len(self.frequencies)
+
+        self.window = numpy.hanning(fft_size)
+        # scale |X| to mV rms; a sine of amplitude A peaks at A*sum(w)/2
+        self._scale = numpy.full(num_bins, 1e3 * numpy.sqrt(2.0) /
+                                 self.window.sum())
+        self._scale[0] = 1e3 / self.window.sum()
+        self.setMask(mask)
+
+        self.max_hold = numpy.zeros((num_channels, num_bins))
+        self._power_sum = numpy.zeros((num_channels, num_bins))
+        self.frames = [0]*num_channels
+        self.flags = [0]*num_channels
+        self.last_flags = []
+        self._rfft_out = _rfftOut()
+        self._peak = numpy.empty(num_bins)
+        self._power = numpy.empty(num_bins)
+        self._allocate(1)
+
+    def _allocate(self, num_frames):
+        self._windowed = numpy.empty((num_frames, self.fft_size))
+        self._spectra = numpy.empty((num_frames, len(self.frequencies)),
+                                    dtype=complex)
+        self._magnitudes = numpy.empty((num_frames, len(self.frequencies)))
+
+    def setMask(self, mask):
+        if isinstance(mask, (int, float)):
+            self.mask = numpy.full(len(self.frequencies), float(mask))
+        else:
+            points = sorted(mask)
+            self.mask = numpy.interp(self.frequencies,
+                                     [point[0] for point in points],
+                                     [point[1] for point in points])
+        # the DC offset is not an emission
+        self.mask[0] = numpy.inf
+
+    def reset(self):
+        self.max_hold[:] = 0.0
+        self._power_sum[:] = 0.0
+        self.frames = [0]*self.num_channels
+        self.flags = [0]*self.num_channels
+        self.last_flags = []
+
+    def average(self):
+        """ Return the average spectrum of each channel in mV rms. """
+        frames = numpy.maximum(numpy.array(self.frames, dtype=float), 1.0)
+        return numpy.sqrt(self._power_sum / frames[:, numpy.newaxis])
+
+    def process(self, data, samples_per_channel):
+        """
+        Add a block of interleaved samples to the spectra. Returns the bins
+        of the block's peak spectrum that are above the mask, the largest
+        first, at most MAX_FLAGS per channel.
+        """
+        data = numpy.asarray(data, dtype=float)
+        block = data[:samples_per_channel*self.num_channels].reshape(
+            samples_per_channel, self.num_channels)
+        num_frames = (samples_per_channel - self.fft_size) // self.hop + 1
+        self.last_flags = []
+        if num_frames < 1:
+            return self.last_flags
+        if num_frames > len(self._windowed):
+            self._allocate(num_frames)
+        windowed = self._windowed[:num_frames]
+        spectra = self._spectra[:num_frames]
+        magnitudes = self._magnitudes[:num_frames]
+
+        for channel in range(self.num_channels):
+            column = block[:, channel]
+            frames = numpy.lib.stride_tricks.as_strided(
+                column, shape=(num_frames, self.fft_size),
+                strides=(column.strides[0] * self.hop, column.strides[0]),
+                writeable=False)
+            numpy.multiply(frames, self.window, out=windowed)
+            if self._rfft_out:
+                numpy.fft.rfft(windowed, axis=1, out=spectra)
+            else:
+                spectra[:] = numpy.fft.rfft(windowed, axis=1)
+            numpy.abs(spectra, out=magnitudes)
+            magnitudes *= self._scale
+
+            magnitudes.max(axis=0, out=self._peak)
+            numpy.maximum(self.max_hold[channel], self._peak,
+                          out=self.max_hold[channel])
+            numpy.einsum('ij,ij->j', magnitudes, magnitudes, out=self._power)
+            self._power_sum[channel] += self._power
+            self.frames[channel] += num_frames
+
+            over = numpy.flatnonzero(self._peak > self.mask)
+            if len(over):
+                self.flags[channel] += 1
+                worst = over[numpy.argsort(self._peak[over])[::-1]]
+                for index in worst[:MAX_FLAGS]:
+                    self.last_flags.append(MaskFlag(
+                        channel, float(self.frequencies[index]),
+                        float(self._peak[index]), float(self.mask[index])))
+        return self.last_flags
+
+    def write(self, filename):
+        """ Write the average and max-hold spectra to a CSV file. """
+        average = self.average()
+        with open(filename, 'w') as spectrum_file:
+            spectrum_file.write("Frequency (Hz)," + ",".join(
+                "Ch {0} average (mV rms),Ch {0} max hold (mV rms)".format(
+                    channel) for channel in range(self.num_channels)) +
+                ",Mask (mV rms)\n")
+            for index, frequency in enumerate(self.frequencies):
+                values = []
+                for channel in range(self.num_channels):
+                    values.append(average[channel, index])
+                    values.append(self.max_hold[channel, index])
+                values.append(self.mask[index])
+                spectrum_file.write("{:.2f},".format(frequency) + ",".join(
+                    "{:.6g}".format(value) for value in values) + "\n")
@@ -0,0 +1,48 @@
+"""
+    Display cache for the CE test applications
+
+    Purpose:
+        Keep the display updates from costing CPU when nothing has changed
+
+    Description:
+        Each label config() or variable set() is a round trip to Tcl, and
+        the test apps redraw every label of the selected board and the board
+        table for each new result although most values do not change. A
+        DisplayCache remembers the last text given to each widget and the
+        last value of each variable and only passes on the changes.
+
+        The cache does not import tkinter; it only calls config() and set()
+        on the objects it is given.
+"""
+
+
+class DisplayCache(object):
+    def __init__(self):
+        self._texts = {}
+        self._values = {}
+        self.updates = 0
+        self.skipped = 0
+
+    def setText(self, widget, text):
+        """ Set the text of a label if it is different. """
+        if self._texts.get(widget) == text:
+            self.skipped += 1
+            return
+        self._texts[widget] = text
+        self.updates += 1
+        widget.config(text=text)
+
+    def setVar(self, variable, value):
+        """ Set a Tk variable if its value is different. """
+        key = str(variable)
+        if key in self._values and self._values[key] == value:
+            self.skipped += 1
+            return
+        self._values[key] = value
+        self.updates += 1
+        variable.set(value)
+
+    def clear(self):
+        """ Forget the cached values, so the next updates are all applied. """
+        self._texts = {}
+        self._values = {}
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+    MCC 118 CE Test command line application
+
+    Purpose:
+        Run the MCC 118 CE test without a display
+
+    Description:
+        This app runs the same test as the MCC 118 CE Testing app on every
+        MCC 118 found, printing a status line for each board periodically and
+        logging to the same files. Stop it with Ctrl+C.
+"""
+import os
+import sys
+
+# the shared test modules are in the top level of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from ce_common.hats import mcc118, HatIDs
+from ce_common.acquisition import find_boards
+from ce_common import headless
+from mcc118_worker import Mcc118Worker, DEFAULT_V_LIMIT, SCAN_RATE
+
+
+def main():
+    parser = headless.argumentParser("MCC 118")
+    parser.add_argument("--channels", type=int, default=8,
+                        choices=range(1, mcc118.info().NUM_AI_CHANNELS + 1),
+                        help="number of channels (default 8)")
+    parser.add_argument("--rate", type=int, default=SCAN_RATE,
+                        help="sample rate per channel (default {})".format(
+                            SCAN_RATE))
+    parser.add_argument("--finite", action="store_true",
+                        help="use a finite scan every second instead of a "
+                        "continuous scan")
+    parser.add_argument("--no-capture", action="store_true",
+                        help="do not save the raw samples around failures")
+    args = parser.parse_args()
+    if args.rate < 1 or args.rate > int(100000 / args.channels):
+        parser.error("the rate must be 1 to {}".format(
+            int(100000 / args.channels)))
+
+    addresses = args.address or find_boards(HatIDs.MCC_118)
+    return headless.run(
+        "mcc118", addresses, ["Ch {}".format(channel) for channel in
+                              range(mcc118.info().NUM_AI_CHANNELS)],
+        lambda address, log, log_group: Mcc118Worker(
+            args.channels, args.rate, continuous=not args.finite,
+            watchdog=args.watchdog, address=address, log=log,
+            log_group=log_group, capture=not args.no_capture,
+            timing=args.timing),
+        headless.analogFailures, args,
+        info={"rate": args.rate, "channels": args.channels,
+              "continuous": not args.finite,
+              "voltage_limit_mV": DEFAULT_V_LIMIT},
+        units="mV")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+    MCC 118 CE Test acquisition
+
+    Purpose:
+        Acquire and check the MCC 118 inputs for the CE test
+
+    Description:
+        The worker runs the scans on its own thread, averages each block of
+        samples, compares the averages to the limits and logs them.
+
+        A test cycle is UPDATE_INTERVAL long in both scan modes. A finite
+        scan of half a cycle of samples is started at each deadline, while
+        a continuous scan is read a whole cycle of samples at a time, so the
+        board paces the cycles and every sample is checked.
+"""
+from ce_common.hats import mcc118, OptionFlags
+from ce_common.acquisition import AcquisitionWorker, CycleResult
+from ce_common.blockstats import BlockStats, HAVE_NUMPY
+from ce_common.capture import CaptureBuffer
+from ce_common.metrics import Metric
+from ce_common.sessionstats import SessionStats
+from ce_common.scheduler import DeadlineScheduler
+import datetime
+
+DEFAULT_V_LIMIT = 25.0    # mV
+SCAN_SAMPLE_COUNT = 10000
+SCAN_RATE = 12500         # Hz
+SCAN_BUFFER_TIME = 10     # s of data the continuous scan buffer can hold
+UPDATE_INTERVAL = 1.0     # s per test cycle in both scan modes
+
+
+class Mcc118Worker(AcquisitionWorker):
+    def __init__(self, num_channels, scan_rate, continuous=True,
+                 watchdog=False, address=0, log=None, log_group=0,
+                 use_numpy=HAVE_NUMPY, capture=False, timing=False):
+        AcquisitionWorker.__init__(self, "mcc118", address, watchdog, log,
+                                   log_group, timing)
+        self.voltage_limit = DEFAULT_V_LIMIT
+        self.num_channels = num_channels
+        self.scan_rate = scan_rate
+        self.continuous = continuous
+        if continuous:
+            # one read per cycle of the continuous scan
+            self.scan_count = int(scan_rate * UPDATE_INTERVAL)
+        else:
+            self.scan_count = int(scan_rate / 2)
+        if self.scan_count == 0:
+            self.scan_count = 1
+        self.scan_running = False
+        self.voltages = [0.0]*mcc118.info().NUM_AI_CHANNELS
+        self.failures = [0]*mcc118.info().NUM_AI_CHANNELS
+        # spread of the samples in the last block and the largest one, mV
+        self.peak_to_peak = [0.0]*mcc118.info().NUM_AI_CHANNELS
+        self.max_peak_to_peak = [0.0]*mcc118.info().NUM_AI_CHANNELS
+        self.block_stats = BlockStats(num_channels, use_numpy)
+        self.stats = SessionStats(
+            ["Ch {}".format(channel) for channel in range(num_channels)],
+            [self.voltage_limit]*num_channels)
+        # a continuous scan is paced by the board, a finite scan by this
+        self.scheduler = DeadlineScheduler(UPDATE_INTERVAL)
+        if capture:
+            # keep the raw samples to save when a limit fails
+            self.capture = CaptureBuffer("mcc118", address, num_channels,
+                                         scan_rate)
+
+    def initBoard(self):
+        # Try to initialize the device
+        try:
+            self.board = mcc118(self.address)
+            self.serial = self.board.serial()
+            self.device_open = True
+        except:
+            self.board = None
+            self.software_errors += 1
+            self.current_failures += 1
+
+    def closeBoard(self):
+        if self.board:
+            self.stopScan()
+        self.board = None
+        self.device_open = False
+
+    def result(self, status=""):
+        return CycleResult(
+            self.address, datetime.datetime.now(), self.device_open,
+            self.serial, list(self.voltages), list(self.failures),
+            self.current_failures, self.test_count, self.software_errors,
+            0, status, self.stats.summary(), None,
+            list(self.peak_to_peak))
+
+    def startScan(self):
+        """ Start a finite scan or the session-long continuous scan. """
+        chan_mask = 2**self.num_channels - 1
+        if self.continuous:
+            # samples_per_channel sets the buffer size for a continuous scan
+            self.board.a_in_scan_start(
+                chan_mask, self.scan_rate*SCAN_BUFFER_TIME, self.scan_rate,
+                OptionFlags.CONTINUOUS)
+        else:
+            self.board.a_in_scan_start(
+                chan_mask, self.scan_count, self.scan_rate, 0)
+        self.scan_running = True
+
+    def stopScan(self):
+        self.scan_running = False
+        try:
+            self.board.a_in_scan_stop()
+            self.board.a_in_scan_cleanup()
+        except:
+            pass
+
+    def establishBaseline(self):
+        self.current_failures = 0
+        lap = self.timer.start()
+        try:
+            # Start the first scan
+            self.startScan()
+            self.timer.lap("establishBaseline.start_scan", lap)
+
+            self.baseline_set = True
+            self.scheduler.start()
+            self.watchdog_count = 0
+        except:
+            self.software_errors += 1
+            self.current_failures += 1
+            self.watchdog_count += 1
+            self.publish(self.result())
+
+            # try again
+            self.sleep(UPDATE_INTERVAL)
+            return
+
+        self.publish(self.result())
+
+    def scanRead(self, samples_per_channel, timeout):
+        """ Read scan data, into a NumPy array when NumPy is available. """
+        if self.block_stats.use_numpy:
+            return self.board.a_in_scan_read_numpy(samples_per_channel, timeout)
+        return self.board.a_in_scan_read(samples_per_channel, timeout)
+
+    def updatePeakToPeak(self):
+        """ Keep the spread of each channel that the average hides. """
+        for channel in range(self.num_channels):
+            value = float(self.block_stats.peak_to_peak[channel])*1e3
+            self.peak_to_peak[channel] = value
+            if value > self.max_peak_to_peak[channel]:
+                self.max_peak_to_peak[channel] = value
+
+    def reportLines(self, summary=False):
+        return ["Largest block peak-to-peak mV: " + " ".join(
+            "Ch {} {:.3f}".format(channel, value) for channel, value in
+            enumerate(self.max_peak_to_peak[:self.num_channels]))]
+
+    def metrics(self):
+        return [Metric("peak_to_peak_volts_max", "gauge",
+                       "Largest spread of the samples in a block",
+                       [("channel", channel)], value / 1000.0)
+                for channel, value in
+                enumerate(self.max_peak_to_peak[:self.num_channels])]
+
+    def checkLimits(self, averages):
+        """ Update the voltages and compare them to the limits. """
+        error = False
+        for channel in range(self.num_channels):
+            self.voltages[channel] = float(averages[channel])*1e3
+            if self.baseline_set == True:
+                # compare to limits
+                if ((self.voltages[channel] > self.voltage_limit) or
+                        (self.voltages[channel] < -self.voltage_limit)):
+                    self.current_failures += 1
+                    self.failures[channel] += 1
+                    error = True
+        return error
+
+    def readBlock(self):
+        """
+        Read the next block of samples. A continuous scan keeps running, so
+        the read waits for the next block and no samples are lost between
+        cycles.
+        """
+        if self.continuous:
+            timeout = 2 * self.scan_count / self.scan_rate + 1.0
+            read_result = self.scanRead(self.scan_count, timeout)
+            if read_result.hardware_overrun or read_result.buffer_overrun:
+                raise OverflowError("scan overrun")
+            if len(read_result.data) < self.scan_count*self.num_channels:
+                raise TimeoutError("scan read timeout")
+        else:
+            read_result = self.scanRead(self.scan_count, -1)
+        return read_result
+
+    def updateInputs(self):
+        self.current_failures = 0
+
+        lap = self.timer.start()
+        if not self.continuous:
+            # wait for the finite scan
+            self.scheduler.wait(self.sleep)
+        if self.stopped():
+            return
+        lap = self.timer.lap("updateInputs.wait", lap)
+
+        try:
+            if not self.scan_running:
+                # the board was reopened
+                self.startScan()
+
+            # Read the last scan data
+            read_result = self.readBlock()
+            timestamp = datetime.datetime.now()
+            lap = self.timer.lap("updateInputs.read", lap)
+            averages = self.block_stats.calculate(read_result.data,
+                                                  self.scan_count)
+            self.updatePeakToPeak()
+            lap = self.timer.lap("updateInputs.compute", lap)
+            error = self.checkLimits(averages)
+
+            self.stats.update(self.voltages[:self.num_channels], timestamp)
+            lap = self.timer.lap("updateInputs.limits", lap)
+
+            if self.capture:
+                self.capture.add(read_result.data, self.scan_count, timestamp)
+                if error:
+                    self.capture.trigger("Limit failure")
+                lap = self.timer.lap("updateInputs.capture", lap)
+
+            if not self.continuous:
+                self.board.a_in_scan_cleanup()
+
+                # Start the next scan
+                self.startScan()
+                self.timer.lap("updateInputs.start_scan", lap)
+
+            self.watchdog_count = 0
+            status = ""
+
+            values = self.voltages[:self.num_channels]
+
+        except OverflowError:
+            # the buffer overran so restart the scan
+            self.stopScan()
+
+            self.software_errors += 1
+            self.current_failures += 1
+            timestamp = datetime.datetime.now()
+            status = "Scan overrun"
+            values = []
+        except:
+            self.stopScan()
+
+            self.software_errors += 1
+            self.current_failures += 1
+            self.watchdog_count += 1
+            timestamp = datetime.datetime.now()
+            status = "Software error"
+            values = []
+
+        lap = self.timer.start()
+        self.writeLog(values, status, timestamp)
+        lap = self.timer.lap("updateInputs.log", lap)
+        self.test_count += 1
+        self.publish(self.result(status))
+        self.timer.lap("updateInputs.publish", lap)
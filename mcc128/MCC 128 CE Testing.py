@@ -8,22 +8,31 @@
     Description:
         This app reads and displays the input voltages.
 """
-from daqhats import mcc128, SourceType, AnalogInputMode, AnalogInputRange, TriggerModes, OptionFlags
 from tkinter import *
-import datetime
 from tkinter import messagebox
-from time import sleep
-from math import sqrt
 import os
+import queue
+import signal
+import sys
+import time
 #from tkinter import ttk
 from tkinter.ttk import *
 #import tkinter.font
 
-DEFAULT_V_LIMIT = 3.5     # mV
-SCAN_SAMPLE_COUNT = 5000  # keep it < 1/2s 
-SCAN_RATE = 12500         # Hz
-TEST_MODE = AnalogInputMode.SE
-TEST_RANGE = AnalogInputRange.BIP_1V
+# the shared test modules are in the top level of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from ce_common.hats import mcc128, HatIDs
+from mcc128_worker import Mcc128Worker, DEFAULT_V_LIMIT, SCAN_RATE, TEST_MODE
+from ce_common.acquisition import find_boards
+from ce_common.binlog import BinaryLog
+from ce_common.metrics import serverFromEnvironment
+from ce_common.phasetimer import PhaseTimer, timingEnabled, timingLines
+from ce_common.sessionstats import writeSummary, summaryFilename
+from ce_common.view import DisplayCache
+
+POLL_INTERVAL = 100       # ms between checks for new results
+DISPLAY_INTERVAL = 250    # ms between display refreshes
 
 class LED(Frame):
     def __init__(self, parent, size=10, **options):
@@ -51,6 +60,9 @@ class LED(Frame):
         self.c.itemconfig(self.led, fill=color)
     
     def set(self, state):
+        if state == self.state:
+            # the colour is already right
+            return
         self.state = state
         self._change_color()
         
@@ -64,25 +76,31 @@ class ControlApp:
         master.title("MCC 128 CE Test")
     
         # Initialize variables
-        self.device_open = False
-        self.board = None
+        self.workers = []
+        self.log = None
+        # only pass changed label texts to Tk
+        self.view = DisplayCache()
+        self.display_pending = False
+        self.next_display = 0.0
+        # serve the counters to a lab monitor if DAQHATS_CE_METRICS_PORT is set
+        self.metrics = serverFromEnvironment("MCC 128", lambda: self.workers,
+                                             lambda: self.log)
+        # time the cycle phases if DAQHATS_CE_TIMING is set; SIGUSR1 prints
+        # the histograms
+        self.timer = PhaseTimer(timingEnabled())
+        if self.timer.enabled and hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1,
+                          lambda _signum, _frame: self.printTiming())
+        # test every board of this type that is installed
+        self.addresses = find_boards(HatIDs.MCC_128)
+        self.results = [None]*len(self.addresses)
+        self.board_failed = [False]*len(self.addresses)
+        self.selected = 0
         self.voltage_limit = DEFAULT_V_LIMIT
         self.max_channels = mcc128.info().NUM_AI_CHANNELS[TEST_MODE]
-        self.voltages = [0.0]*self.max_channels
-        self.failures = [0]*self.max_channels
-        self.current_failures = 0
-        self.test_count = 0
-        self.trigger_errors = 0
-        self.last_trigger_error = False
-        self.software_errors = 0
-        self.baseline_set = False
-        self.watchdog_count = 0
-        self.csvfile = None
         self.id = None
         self.activity_id = None
         self.num_channels = self.max_channels
-        self.scan_rate = SCAN_RATE
-        self.scan_count = SCAN_SAMPLE_COUNT
 
         # GUI Setup
 
@@ -148,7 +166,7 @@ class ControlApp:
         
         label = Label(self.test_frame, text="Sample rate:")
         label.grid(row=1, column=0, padx=3, pady=3, sticky="E")
-        self.sample_rate = IntVar(value=12500)
+        self.sample_rate = IntVar(value=SCAN_RATE)
         self.sample_rate_widget = Spinbox(
             self.test_frame, from_=1, to=12500, width=8,
             textvariable=self.sample_rate, justify="right")
@@ -207,9 +225,15 @@ class ControlApp:
         label.grid(row=1, column=1, padx=3, pady=3)
         label = Label(self.volt_frame, text="Failures")
         label.grid(row=1, column=2, padx=3, pady=3)
+        # session statistics
+        for column, text in enumerate(["Mean", "Min", "Max", "Margin",
+                                       "P-P"]):
+            label = Label(self.volt_frame, text=text)
+            label.grid(row=1, column=column+3, padx=3, pady=3)
         
         self.voltage_labels = []
         self.failure_labels = []
+        self.stats_labels = []
         
         for index in range(self.max_channels):
             # Labels
@@ -228,6 +252,14 @@ class ControlApp:
                                              relief=SUNKEN, text="0"))
             self.failure_labels[index].grid(row=index+2, column=2, padx=3,
                                             pady=3, ipadx=2, ipady=2)
+
+            labels = []
+            for column in range(5):
+                labels.append(Label(self.volt_frame, width=8, anchor=E,
+                                    relief=SUNKEN, text=""))
+                labels[column].grid(row=index+2, column=column+3, padx=3,
+                                    pady=3, ipadx=2, ipady=2)
+            self.stats_labels.append(labels)
             
             
         # Trigger Frame
@@ -241,6 +273,66 @@ class ControlApp:
         self.trigger_error_label.grid(row=0, column=1, padx=3, pady=3,
                                       ipadx=2, ipady=2)
 
+        # Boards Frame
+        self.boards_frame = LabelFrame(master, text="Boards")
+        self.boards_frame.grid(row=3, column=0, columnspan=2, sticky="NSEW",
+                               padx=3, pady=3)
+
+        # Board widgets
+        label = Label(self.boards_frame, text="Show board:")
+        label.grid(row=0, column=0, columnspan=2, padx=3, pady=3, sticky="E")
+        self.board_combo = Combobox(self.boards_frame, values=self.addresses,
+                                    width=4, justify="right", state="readonly")
+        self.board_combo.current(0)
+        self.board_combo.bind("<<ComboboxSelected>>", self.boardChanged)
+        self.board_combo.grid(row=0, column=2, padx=3, pady=3, sticky="W")
+
+        for column, text in enumerate(["Address", "Serial number", "Ready",
+                                       "Test count", "Software errors",
+                                       "Failures", "Pass/fail"]):
+            label = Label(self.boards_frame, text=text)
+            label.grid(row=1, column=column, padx=3, pady=3)
+
+        self.board_serial_labels = []
+        self.board_ready_leds = []
+        self.board_count_labels = []
+        self.board_error_labels = []
+        self.board_failure_labels = []
+        self.board_pass_leds = []
+
+        for index, address in enumerate(self.addresses):
+            label = Label(self.boards_frame, text="{}".format(address))
+            label.grid(row=index+2, column=0, padx=3, pady=3)
+
+            self.board_serial_labels.append(Label(self.boards_frame, width=8,
+                                                  text="00000000", relief=SUNKEN))
+            self.board_serial_labels[index].grid(row=index+2, column=1, padx=3,
+                                                 pady=3, ipadx=2, ipady=2)
+
+            self.board_ready_leds.append(LED(self.boards_frame, size=20))
+            self.board_ready_leds[index].grid(row=index+2, column=2, padx=3,
+                                              pady=3)
+
+            self.board_count_labels.append(Label(self.boards_frame, width=8,
+                                                 anchor=E, text="0", relief=SUNKEN))
+            self.board_count_labels[index].grid(row=index+2, column=3, padx=3,
+                                                pady=3, ipadx=2, ipady=2)
+
+            self.board_error_labels.append(Label(self.boards_frame, width=8,
+                                                 anchor=E, text="0", relief=SUNKEN))
+            self.board_error_labels[index].grid(row=index+2, column=4, padx=3,
+                                                pady=3, ipadx=2, ipady=2)
+
+            self.board_failure_labels.append(Label(self.boards_frame, width=8,
+                                                   anchor=E, text="0", relief=SUNKEN))
+            self.board_failure_labels[index].grid(row=index+2, column=5, padx=3,
+                                                  pady=3, ipadx=2, ipady=2)
+
+            self.board_pass_leds.append(LED(self.boards_frame, size=20))
+            self.board_pass_leds[index].grid(row=index+2, column=6, padx=3,
+                                             pady=3)
+            self.board_pass_leds[index].set(1)
+
         master.protocol('WM_DELETE_WINDOW', self.close) # exit cleanup
 
         icon = PhotoImage(file='/usr/share/mcc/daqhats/icon.png')
@@ -250,35 +342,19 @@ class ControlApp:
 
         #self.master.after(500, self.establishBaseline)
 
-    def initBoard(self):
-        # Try to initialize the device
-        try:
-            self.board = mcc128(0)
-            
-            serial = self.board.serial()
-            self.serial_number.set(serial)
-            
-            # set mode and range
-            self.board.a_in_mode_write(TEST_MODE)
-            self.board.a_in_range_write(TEST_RANGE)
-            
-            self.board.trigger_mode(TriggerModes.RISING_EDGE)
-            
-            self.ready_led.set(1)
-            self.device_open = True
-        except:
-            self.software_errors += 1
-            self.current_failures += 1
-   
     def channelsChanged(self, _event):
         self.num_channels = int(self.chan_combo.get())
         # enable/disable controls
         for index in range(0, self.num_channels):
             self.voltage_labels[index].configure(state=NORMAL)
             self.failure_labels[index].configure(state=NORMAL)
+            for label in self.stats_labels[index]:
+                label.configure(state=NORMAL)
         for index in range(self.num_channels, self.max_channels):
             self.voltage_labels[index].configure(state=DISABLED)
             self.failure_labels[index].configure(state=DISABLED)
+            for label in self.stats_labels[index]:
+                label.configure(state=DISABLED)
             
         # set new sample rate max
         rate_max = int(100000/self.num_channels)
@@ -288,13 +364,32 @@ class ControlApp:
         
     def startTest(self):
         self.resetTest()
-        # get control values
-        self.scan_rate = self.sample_rate.get()
-        self.scan_count = int(self.scan_rate / 2.2)
-        if self.scan_count == 0:
-            self.scan_count = 1
+        # Create the session log with current date/time in file name
+        try:
+            groups = None
+            if len(self.addresses) > 1:
+                groups = ["Bd {}".format(address) for address in self.addresses]
+            info = {"rate": self.sample_rate.get(),
+                    "channels": self.num_channels,
+                    "voltage_limit_mV": DEFAULT_V_LIMIT}
+            self.log = BinaryLog(
+                "mcc128", ["Ch {}".format(channel) for channel in
+                           range(self.num_channels)], groups, info=info)
+        except FileNotFoundError:
+            messagebox.showerror("Error", "Cannot create log file")
+            return
+
+        # get control values and start one acquisition thread per board
+        for index, address in enumerate(self.addresses):
+            worker = Mcc128Worker(
+                self.num_channels, self.sample_rate.get(),
+                watchdog=(self.watchdog_check.var.get() == 1),
+                address=address, log=self.log, log_group=index,
+                capture=True, timing=self.timer.enabled)
+            worker.start()
+            self.workers.append(worker)
         
-        self.master.after(500, self.establishBaseline)
+        self.id = self.master.after(POLL_INTERVAL, self.pollResults)
         # disable controls
         self.start_button.configure(state=DISABLED)
         self.reset_button.configure(state=DISABLED)
@@ -307,10 +402,11 @@ class ControlApp:
         # Stop the test loop
         if self.id:
             self.master.after_cancel(self.id)
-        if self.csvfile:
-            self.csvfile.close()
-            self.csvfile = None
+            self.id = None
+        self.stopWorkers()
         self.ready_led.set(0)
+        for led in self.board_ready_leds:
+            led.set(0)
         # enable controls
         self.start_button.configure(state=NORMAL)
         self.reset_button.configure(state=NORMAL)
@@ -319,240 +415,155 @@ class ControlApp:
         self.sample_rate_widget.configure(state=NORMAL)
         self.watchdog_check.configure(state=NORMAL)
     
+    def stopWorkers(self):
+        # The workers stop the scans, then the log file can be closed
+        for worker in self.workers:
+            worker.stop()
+        if self.log:
+            try:
+                writeSummary(summaryFilename(self.log.filename), "MCC 128",
+                             self.workers, "mV", self.timer)
+            except OSError:
+                pass
+        self.workers = []
+        if self.log:
+            self.log.close()
+            self.log = None
+
     def resetTest(self):
         # Reset the error counters and restart
         if self.id:
             self.master.after_cancel(self.id)
+            self.id = None
         if self.activity_id:
             self.master.after_cancel(self.activity_id)
+            self.activity_id = None
         #if self.pass_id:
         #    self.master.after_cancel(self.pass_id)
 
-        if self.csvfile:
-            self.csvfile.close()
-            self.csfvile = None
+        self.stopWorkers()
+        self.results = [None]*len(self.addresses)
+        self.board_failed = [False]*len(self.addresses)
             
-        self.board = None
-        self.device_open = False
-        self.voltages = [0.0]*self.max_channels
-        self.failures = [0]*self.max_channels
-        self.test_count = 0
-        self.software_errors = 0
-        self.trigger_errors = 0
-        self.last_trigger_error = False
-        self.baseline_set = False
-        self.watchdog_count = 0
         self.pass_led.set(1)
         self.inst_pass_led.set(0)
 
         self.ready_led.set(0)
-        
-        self.updateDisplay()
-        #self.master.after(500, self.establishBaseline)
-            
-    def establishBaseline(self):
-        self.id = None
-        self.current_failures = 0
-        
-        if self.device_open:
-            self.activity_led.set(1)
-            self.master.update()
-            self.activity_id = self.master.after(100, self.activityBlink)
-            
-            self.current_failures = 0
-            try:
-                # Start the first scan
-                chan_mask = 2**self.num_channels - 1
-                self.board.a_in_scan_start(
-                    chan_mask, self.scan_count, self.scan_rate, 0)
-                
-                self.baseline_set = True
-                self.watchdog_count = 0
-                
-                # Create csv file with current date/time in file name
-                self.openCsvFile()
-
-                # go to the test loop
-                self.id = self.master.after(500, self.updateInputs)
-            except FileNotFoundError:
-                messagebox.showerror("Error", "Cannot create CSV file")
-            except:
-                raise
-                self.software_errors += 1
-                self.current_failures += 1
-                self.watchdog_count += 1
-                
-                # try again
-                self.id = self.master.after(500, self.establishBaseline)
-                
-            self.updateDisplay()
-        else:
-            # Open the device
-            self.initBoard()
-            # schedule another attempt
-            self.id = self.master.after(500, self.establishBaseline)
-        
-    def openCsvFile(self):
-        if not os.path.isdir('./data'):
-            # create the data directory
-            os.mkdir('./data')
-        filename = "./data/mcc128_test_" + datetime.datetime.now().strftime(
-            "%d-%m-%Y_%H-%M-%S") + ".csv"
-        self.csvfile = open(filename, 'w')
-        
-        mystr = ("Time," + ",".join("Ch {}".format(channel) for channel in
-                                   range(self.num_channels)) +
-                 ",Status\n")
-        self.csvfile.write(mystr)
+        self.updateDisplay(None)
+        self.updateBoardTable()
     
-    def checkTrigger(self):
-        self.id = None
-        if self.device_open:
-            try:
-                # Read the last scan result
-                read_result = self.board.a_in_scan_read(0, 0)
-                if read_result.triggered:
-                    self.trigger_errors += 1
-                    self.current_failures += 1
-                    self.last_trigger_error = True
-                self.board.a_in_scan_cleanup()
-
-                # Start the next scan
-                chan_mask = 2**self.num_channels - 1
-                self.board.a_in_scan_start(
-                    chan_mask, self.scan_count, self.scan_rate, 0)
-            except:
-                #raise
-                self.board.a_in_scan_stop()
-                self.board.a_in_scan_cleanup()
-
-                self.software_errors += 1
-                self.current_failures += 1
-                self.watchdog_count += 1
-
-            self.id = self.master.after(500, self.updateInputs)
-        else:
-            # Open the device
-            self.initBoard()
+    def boardChanged(self, _event):
+        # show the channels of the selected board
+        self.selected = self.board_combo.current()
+        self.updateDisplay(self.results[self.selected])
 
-            # start a trigger test
-            chan_mask = 2**self.num_channels - 1
-            self.board.a_in_scan_start(
-                chan_mask, self.scan_count, self.scan_rate, OptionFlags.EXTTRIGGER)
-
-            self.id = self.master.after(500, self.checkTrigger)
-       
-    def updateInputs(self):
+    def pollResults(self):
+        # Render the results the acquisition threads have produced
         self.id = None
-        if self.device_open:
+        new_results = False
+        failed = False
+        for index, worker in enumerate(self.workers):
+            results = []
+            while True:
+                try:
+                    results.append(worker.results.get_nowait())
+                except queue.Empty:
+                    break
+
+            if results:
+                new_results = True
+                self.results[index] = results[-1]
+                # latch a failure from any of the cycles, not just the last one
+                if any(result.current_failures > 0 for result in results):
+                    self.board_failed[index] = True
+                    failed = True
+
+        if new_results:
             self.activity_led.set(1)
-            self.master.update()
+            if self.activity_id:
+                self.master.after_cancel(self.activity_id)
             self.activity_id = self.master.after(100, self.activityBlink)
-            
-            logstr = datetime.datetime.now().strftime("%H:%M:%S") + ","
-            
-            try:
-                # Read the last scan data
-                read_result = self.board.a_in_scan_read(self.scan_count, -1)
-                
-                # Calculate averages
-                averages = [0.0]*self.num_channels
-                for index in range(self.scan_count):
-                    for channel in range(self.num_channels):
-                        averages[channel] += read_result.data[
-                            index*self.num_channels + channel]
-                        
-                for channel in range(self.num_channels):
-                    averages[channel] /= self.scan_count
-                    self.voltages[channel] = averages[channel]*1e3
-                    if self.baseline_set == True:
-                        # compare to limits
-                        if ((self.voltages[channel] > self.voltage_limit) or
-                                (self.voltages[channel] < -self.voltage_limit)):
-                            self.current_failures += 1
-                            self.failures[channel] += 1
-
-                self.board.a_in_scan_cleanup()
-
-                # Start the next scan
-                #chan_mask = 2**self.num_channels - 1
-                #self.board.a_in_scan_start(
-                #    chan_mask, SCAN_SAMPLE_COUNT, 0)
-
-                # start a trigger test
-                chan_mask = 2**self.num_channels - 1
-                self.board.a_in_scan_start(
-                    chan_mask, self.scan_count, self.scan_rate, OptionFlags.EXTTRIGGER)
-                
-                self.watchdog_count = 0
-                            
-                logstr += (",".join(
-                               "{:.1f}".format(value) for value in self.voltages[:self.num_channels]))
-                if self.last_trigger_error:
-                    logstr += ",Trigger error\n"
-                else:
-                    logstr += ",\n"
-
-                self.last_trigger_error = False
-            except:
-                #raise
-                self.board.a_in_scan_stop()
-                self.board.a_in_scan_cleanup()
-
-                self.software_errors += 1
-                self.current_failures += 1
-                self.watchdog_count += 1
-                logstr += ",,Software error\n"
-
-            self.csvfile.write(logstr)
-            self.test_count += 1
-            self.updateDisplay()
-
-            if (self.watchdog_check.var.get() == 1 and
-                self.watchdog_count >= 5):
-                self.board = None
-                self.device_open = False
-                self.watchdog_count = 0
-                self.ready_led.set(0)
-                self.master.after(500, self.updateInputs)
-            else:
-                # schedule another update
-                #self.id = self.master.after(1000, self.updateInputs)
-                # start the trigger test
-                self.id = self.master.after(500, self.checkTrigger)
-        else:
-            # Open the device
-            self.initBoard()
-            # schedule another attempt
-            #self.id = self.master.after(500, self.updateInputs)
-
-            # start a trigger test
-            chan_mask = 2**self.num_channels - 1
-            self.board.a_in_scan_start(
-                chan_mask, self.scan_count, self.scan_rate, OptionFlags.EXTTRIGGER)
 
-            self.id = self.master.after(500, self.checkTrigger)
+            if failed:
+                self.inst_pass_led.set(2)
+                self.pass_led.set(2)
+            else:
+                self.inst_pass_led.set(1)
+            self.display_pending = True
+
+        # redraw at most once per DISPLAY_INTERVAL however many boards report
+        now = time.monotonic()
+        if self.display_pending and now >= self.next_display:
+            self.display_pending = False
+            self.next_display = now + DISPLAY_INTERVAL / 1000.0
+            lap = self.timer.start()
+            self.updateDisplay(self.results[self.selected])
+            self.updateBoardTable()
+            self.timer.lap("display", lap)
+
+        self.id = self.master.after(POLL_INTERVAL, self.pollResults)
         
-    def updateDisplay(self):
+    def updateBoardTable(self):
+        for index in range(len(self.addresses)):
+            result = self.results[index]
+            if result is None:
+                self.view.setText(self.board_serial_labels[index], "00000000")
+                self.board_ready_leds[index].set(0)
+                self.view.setText(self.board_count_labels[index], "0")
+                self.view.setText(self.board_error_labels[index], "0")
+                self.view.setText(self.board_failure_labels[index], "0")
+            else:
+                self.view.setText(self.board_serial_labels[index],
+                                  result.serial)
+                self.board_ready_leds[index].set(1 if result.ready else 0)
+                self.view.setText(self.board_count_labels[index],
+                                  "{}".format(result.test_count))
+                self.view.setText(self.board_error_labels[index],
+                                  "{}".format(result.software_errors))
+                self.view.setText(self.board_failure_labels[index],
+                                  "{}".format(sum(result.failures) +
+                                              result.trigger_errors))
+            self.board_pass_leds[index].set(
+                2 if self.board_failed[index] else 1)
+
+    def updateDisplay(self, result):
+        if result is None:
+            # nothing measured yet
+            self.view.setVar(self.serial_number, "00000000")
+            for channel in range(self.max_channels):
+                self.view.setText(self.voltage_labels[channel], "0.0")
+                self.view.setText(self.failure_labels[channel], "0")
+                for label in self.stats_labels[channel]:
+                    self.view.setText(label, "")
+            self.view.setText(self.trigger_error_label, "0")
+            self.view.setText(self.software_error_label, "0")
+            self.view.setText(self.test_count_label, "0")
+            return
+
+        self.view.setVar(self.serial_number, result.serial)
+        self.ready_led.set(1 if result.ready else 0)
+
         for channel in range(self.max_channels):
-            self.voltage_labels[channel].config(
-                text="{:.1f}".format(self.voltages[channel]))
-            self.failure_labels[channel].config(
-                text="{}".format(self.failures[channel]))
+            self.view.setText(self.voltage_labels[channel],
+                              "{:.1f}".format(result.values[channel]))
+            self.view.setText(self.failure_labels[channel],
+                              "{}".format(result.failures[channel]))
+
+            texts = [""]*5
+            if channel < len(result.stats) and result.stats[channel].count:
+                summary = result.stats[channel]
+                texts = ["{:.2f}".format(value) for value in
+                         (summary.mean, summary.minimum, summary.maximum,
+                          summary.margin, result.peak_to_peak[channel])]
+            for label, text in zip(self.stats_labels[channel], texts):
+                self.view.setText(label, text)
             
-        if self.current_failures > 0:
-            self.inst_pass_led.set(2)
-            self.pass_led.set(2)
-        else:
-            self.inst_pass_led.set(1)
-        #self.pass_id = self.master.after(500, self.passBlink)
-        self.current_failures = 0
-            
-        self.trigger_error_label.config(
-            text="{}".format(self.trigger_errors))
-        self.software_error_label.config(
-            text="{}".format(self.software_errors))
-        self.test_count_label.config(text="{}".format(self.test_count))
+        self.view.setText(self.trigger_error_label,
+                          "{}".format(result.trigger_errors))
+        self.view.setText(self.software_error_label,
+                          "{}".format(result.software_errors))
+        self.view.setText(self.test_count_label,
+                          "{}".format(result.test_count))
 
     #def passBlink(self):
     #    self.pass_id = None
@@ -562,11 +573,19 @@ class ControlApp:
         self.activity_id = None
         self.activity_led.set(0)
         
+    def printTiming(self):
+        for worker in self.workers:
+            print("Board {} phase timing".format(worker.address))
+            for line in timingLines(worker.timer):
+                print(line)
+        print("Display timing")
+        for line in timingLines(self.timer):
+            print(line)
+        sys.stdout.flush()
+
     # Event handlers
     def close(self):
-        if self.board:
-            self.board.a_in_scan_stop()
-            self.board.a_in_scan_cleanup()
+        self.stopWorkers()
         
         if self.id:
             self.master.after_cancel(self.id)
@@ -574,10 +593,8 @@ class ControlApp:
             self.master.after_cancel(self.activity_id)
         #if self.pass_id:
         #    self.master.after_cancel(self.pass_id)
-        self.device_open = False
-        if self.csvfile:
-            self.csvfile.close()
-            self.csvfile = None
+        if self.metrics:
+            self.metrics.close()
         self.master.destroy()
 
 
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+    MCC 128 CE Test command line application
+
+    Purpose:
+        Run the MCC 128 CE test without a display
+
+    Description:
+        This app runs the same test as the MCC 128 CE Testing app on every
+        MCC 128 found, printing a status line for each board periodically and
+        logging to the same files. Stop it with Ctrl+C.
+"""
+import os
+import sys
+
+# the shared test modules are in the top level of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from ce_common.hats import mcc128, HatIDs
+from ce_common.acquisition import find_boards
+from ce_common import headless
+from mcc128_worker import Mcc128Worker, DEFAULT_V_LIMIT, SCAN_RATE, TEST_MODE
+
+
+def main():
+    max_channels = mcc128.info().NUM_AI_CHANNELS[TEST_MODE]
+    parser = headless.argumentParser("MCC 128")
+    parser.add_argument("--channels", type=int, default=max_channels,
+                        choices=range(1, max_channels + 1),
+                        help="number of channels (default {})".format(
+                            max_channels))
+    parser.add_argument("--rate", type=int, default=SCAN_RATE,
+                        help="sample rate per channel (default {})".format(
+                            SCAN_RATE))
+    parser.add_argument("--no-capture", action="store_true",
+                        help="do not save the raw samples around failures")
+    args = parser.parse_args()
+    if args.rate < 1 or args.rate > int(100000 / args.channels):
+        parser.error("the rate must be 1 to {}".format(
+            int(100000 / args.channels)))
+
+    addresses = args.address or find_boards(HatIDs.MCC_128)
+    return headless.run(
+        "mcc128", addresses, ["Ch {}".format(channel) for channel in
+                              range(args.channels)],
+        lambda address, log, log_group: Mcc128Worker(
+            args.channels, args.rate, watchdog=args.watchdog,
+            address=address, log=log, log_group=log_group,
+            capture=not args.no_capture, timing=args.timing),
+        headless.analogFailures, args,
+        info={"rate": args.rate, "channels": args.channels,
+              "voltage_limit_mV": DEFAULT_V_LIMIT},
+        units="mV")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""
+    MCC 128 CE Test acquisition
+
+    Purpose:
+        Acquire and check the MCC 128 inputs for the CE test
+
+    Description:
+        The worker alternates between a scan of the inputs, which is averaged
+        and compared to the limits, and an external trigger scan that must
+        not be triggered, on its own thread.
+"""
+from ce_common.hats import mcc128, AnalogInputMode, AnalogInputRange, TriggerModes, OptionFlags
+from ce_common.acquisition import AcquisitionWorker, CycleResult
+from ce_common.blockstats import BlockStats, HAVE_NUMPY
+from ce_common.capture import CaptureBuffer
+from ce_common.metrics import Metric
+from ce_common.sessionstats import SessionStats
+from ce_common.scheduler import DeadlineScheduler
+import datetime
+
+DEFAULT_V_LIMIT = 3.5     # mV
+SCAN_SAMPLE_COUNT = 5000  # keep it < 1/2s
+SCAN_RATE = 12500         # Hz
+TEST_MODE = AnalogInputMode.SE
+TEST_RANGE = AnalogInputRange.BIP_1V
+PHASE_TIME = 0.5          # s for each of the input and trigger scans
+INPUT_PHASE = 0           # scheduler phase that reads the input scan
+TRIGGER_PHASE = 1         # scheduler phase that checks the trigger scan
+
+
+class Mcc128Worker(AcquisitionWorker):
+    def __init__(self, num_channels, scan_rate, watchdog=False, address=0,
+                 log=None, log_group=0, use_numpy=HAVE_NUMPY, capture=False,
+                 timing=False):
+        AcquisitionWorker.__init__(self, "mcc128", address, watchdog, log,
+                                   log_group, timing)
+        self.voltage_limit = DEFAULT_V_LIMIT
+        self.max_channels = mcc128.info().NUM_AI_CHANNELS[TEST_MODE]
+        self.num_channels = num_channels
+        self.scan_rate = scan_rate
+        self.scan_count = int(scan_rate / 2.2)
+        if self.scan_count == 0:
+            self.scan_count = 1
+        self.scan_running = False
+        self.voltages = [0.0]*self.max_channels
+        self.failures = [0]*self.max_channels
+        # spread of the samples in the last block and the largest one, mV
+        self.peak_to_peak = [0.0]*self.max_channels
+        self.max_peak_to_peak = [0.0]*self.max_channels
+        self.block_stats = BlockStats(num_channels, use_numpy)
+        self.stats = SessionStats(
+            ["Ch {}".format(channel) for channel in range(num_channels)],
+            [self.voltage_limit]*num_channels)
+        if capture:
+            # keep the raw samples to save when a test fails
+            self.capture = CaptureBuffer("mcc128", address, num_channels,
+                                         scan_rate)
+        # the input and trigger scans alternate at fixed times in each cycle
+        self.scheduler = DeadlineScheduler(2*PHASE_TIME,
+                                           (PHASE_TIME, 2*PHASE_TIME))
+        self.trigger_errors = 0
+        self.last_trigger_error = False
+
+    def initBoard(self):
+        # Try to initialize the device
+        try:
+            self.board = mcc128(self.address)
+            self.serial = self.board.serial()
+
+            # set mode and range
+            self.board.a_in_mode_write(TEST_MODE)
+            self.board.a_in_range_write(TEST_RANGE)
+
+            self.board.trigger_mode(TriggerModes.RISING_EDGE)
+
+            self.device_open = True
+        except:
+            self.board = None
+            self.software_errors += 1
+            self.current_failures += 1
+
+    def closeBoard(self):
+        if self.board:
+            self.stopScan()
+        self.board = None
+        self.device_open = False
+
+    def result(self, status=""):
+        return CycleResult(
+            self.address, datetime.datetime.now(), self.device_open,
+            self.serial, list(self.voltages), list(self.failures),
+            self.current_failures, self.test_count, self.software_errors,
+            self.trigger_errors, status, self.stats.summary(), None,
+            list(self.peak_to_peak))
+
+    def startScan(self, options):
+        chan_mask = 2**self.num_channels - 1
+        self.board.a_in_scan_start(
+            chan_mask, self.scan_count, self.scan_rate, options)
+        self.scan_running = True
+
+    def stopScan(self):
+        self.scan_running = False
+        try:
+            self.board.a_in_scan_stop()
+            self.board.a_in_scan_cleanup()
+        except:
+            pass
+
+    def establishBaseline(self):
+        self.current_failures = 0
+        lap = self.timer.start()
+        try:
+            # Start the first scan
+            self.startScan(0)
+            self.timer.lap("establishBaseline.start_scan", lap)
+
+            self.baseline_set = True
+            self.scheduler.start()
+            self.watchdog_count = 0
+        except:
+            self.software_errors += 1
+            self.current_failures += 1
+            self.watchdog_count += 1
+            self.publish(self.result())
+
+            # try again
+            self.sleep(PHASE_TIME)
+            return
+
+        self.publish(self.result())
+
+    def scanRead(self, samples_per_channel, timeout):
+        """ Read scan data, into a NumPy array when NumPy is available. """
+        if self.block_stats.use_numpy:
+            return self.board.a_in_scan_read_numpy(samples_per_channel, timeout)
+        return self.board.a_in_scan_read(samples_per_channel, timeout)
+
+    def updatePeakToPeak(self):
+        """ Keep the spread of each channel that the average hides. """
+        for channel in range(self.num_channels):
+            value = float(self.block_stats.peak_to_peak[channel])*1e3
+            self.peak_to_peak[channel] = value
+            if value > self.max_peak_to_peak[channel]:
+                self.max_peak_to_peak[channel] = value
+
+    def reportLines(self, summary=False):
+        return ["Largest block peak-to-peak mV: " + " ".join(
+            "Ch {} {:.3f}".format(channel, value) for channel, value in
+            enumerate(self.max_peak_to_peak[:self.num_channels]))]
+
+    def metrics(self):
+        return [Metric("peak_to_peak_volts_max", "gauge",
+                       "Largest spread of the samples in a block",
+                       [("channel", channel)], value / 1000.0)
+                for channel, value in
+                enumerate(self.max_peak_to_peak[:self.num_channels])]
+
+    def checkLimits(self, averages):
+        """ Update the voltages and compare them to the limits. """
+        error = False
+        for channel in range(self.num_channels):
+            self.voltages[channel] = float(averages[channel])*1e3
+            if self.baseline_set == True:
+                # compare to limits
+                if ((self.voltages[channel] > self.voltage_limit) or
+                        (self.voltages[channel] < -self.voltage_limit)):
+                    self.current_failures += 1
+                    self.failures[channel] += 1
+                    error = True
+        return error
+
+    def checkTrigger(self):
+        """
+        Wait out the trigger test scan, count an error if it was triggered,
+        then start the next input scan.
+        """
+        lap = self.timer.start()
+        self.scheduler.wait(self.sleep, TRIGGER_PHASE)
+        if self.stopped():
+            return
+        lap = self.timer.lap("checkTrigger.wait", lap)
+
+        try:
+            # Read the last scan result
+            read_result = self.board.a_in_scan_read(0, 0)
+            if read_result.triggered:
+                self.trigger_errors += 1
+                self.current_failures += 1
+                self.last_trigger_error = True
+            self.board.a_in_scan_cleanup()
+            self.scan_running = False
+            lap = self.timer.lap("checkTrigger.read", lap)
+
+            # Start the next scan
+            self.startScan(0)
+            self.timer.lap("checkTrigger.start_scan", lap)
+        except:
+            self.stopScan()
+
+            self.software_errors += 1
+            self.current_failures += 1
+            self.watchdog_count += 1
+
+    def updateInputs(self):
+        self.current_failures = 0
+
+        # wait for the input scan
+        lap = self.timer.start()
+        self.scheduler.wait(self.sleep, INPUT_PHASE)
+        if self.stopped():
+            return
+        lap = self.timer.lap("updateInputs.wait", lap)
+
+        timestamp = datetime.datetime.now()
+        status = ""
+        values = []
+        try:
+            if not self.scan_running:
+                # the board was reopened or the last scan failed
+                raise RuntimeError("scan not running")
+
+            # Read the last scan data
+            read_result = self.scanRead(self.scan_count, -1)
+            lap = self.timer.lap("updateInputs.read", lap)
+            averages = self.block_stats.calculate(read_result.data,
+                                                  self.scan_count)
+            self.updatePeakToPeak()
+            lap = self.timer.lap("updateInputs.compute", lap)
+            error = self.checkLimits(averages)
+            self.stats.update(self.voltages[:self.num_channels], timestamp)
+            lap = self.timer.lap("updateInputs.limits", lap)
+            if self.capture:
+                self.capture.add(read_result.data, self.scan_count, timestamp)
+                if error:
+                    self.capture.trigger("Limit failure")
+                lap = self.timer.lap("updateInputs.capture", lap)
+
+            self.board.a_in_scan_cleanup()
+            self.scan_running = False
+
+            # start a trigger test
+            self.startScan(OptionFlags.EXTTRIGGER)
+            self.timer.lap("updateInputs.start_scan", lap)
+
+            self.watchdog_count = 0
+
+            values = self.voltages[:self.num_channels]
+        except:
+            self.stopScan()
+
+            self.software_errors += 1
+            self.current_failures += 1
+            self.watchdog_count += 1
+            status = "Software error"
+
+        if self.scan_running:
+            self.checkTrigger()
+            if self.stopped():
+                return
+        else:
+            # restart the input scan for the next cycle
+            try:
+                self.startScan(0)
+            except:
+                pass
+
+        if not status and self.last_trigger_error:
+            status = "Trigger error"
+        if self.capture and self.last_trigger_error:
+            self.capture.trigger("Trigger error")
+
+        self.last_trigger_error = False
+
+        lap = self.timer.start()
+        self.writeLog(values, status, timestamp)
+        lap = self.timer.lap("updateInputs.log", lap)
+        self.test_count += 1
+        self.publish(self.result(status))
+        self.timer.lap("updateInputs.publish", lap)
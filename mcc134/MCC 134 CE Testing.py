@@ -8,15 +8,31 @@
     Description:
         This app reads and displays the input voltages.
 """
-from daqhats import mcc134, TcTypes
 from tkinter import *
-import datetime
 from tkinter import messagebox
+from tkinter.ttk import Combobox
 import os
+import queue
+import signal
+import sys
+import time
 #import tkinter.font
 
-DEFAULT_TC_LIMIT = 20.0    # uV
-DEFAULT_CJC_LIMIT = 2.0    # C
+# the shared test modules are in the top level of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from ce_common.hats import mcc134, HatIDs, TcTypes
+from mcc134_worker import (Mcc134Worker, DEFAULT_TC_LIMIT, DEFAULT_CJC_LIMIT,
+                           DEFAULT_TC_TYPE, tcTypeName, parseTcType)
+from ce_common.acquisition import find_boards
+from ce_common.binlog import BinaryLog
+from ce_common.metrics import serverFromEnvironment
+from ce_common.phasetimer import PhaseTimer, timingEnabled, timingLines
+from ce_common.sessionstats import writeSummary, summaryFilename
+from ce_common.view import DisplayCache
+
+POLL_INTERVAL = 100       # ms between checks for new results
+DISPLAY_INTERVAL = 250    # ms between display refreshes
 
 class LED(Frame):
     def __init__(self, parent, size=10, **options):
@@ -44,6 +60,9 @@ class LED(Frame):
         self.c.itemconfig(self.led, fill=color)
     
     def set(self, state):
+        if state == self.state:
+            # the colour is already right
+            return
         self.state = state
         self._change_color()
         
@@ -57,21 +76,30 @@ class ControlApp:
         master.title("MCC 134 CE Test")
     
         # Initialize variables
-        self.device_open = False
-        self.board = None
+        self.workers = []
+        self.log = None
+        # only pass changed label texts to Tk
+        self.view = DisplayCache()
+        self.display_pending = False
+        self.next_display = 0.0
+        # serve the counters to a lab monitor if DAQHATS_CE_METRICS_PORT is set
+        self.metrics = serverFromEnvironment("MCC 134", lambda: self.workers,
+                                             lambda: self.log)
+        # time the cycle phases if DAQHATS_CE_TIMING is set; SIGUSR1 prints
+        # the histograms
+        self.timer = PhaseTimer(timingEnabled())
+        if self.timer.enabled and hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1,
+                          lambda _signum, _frame: self.printTiming())
         self.tc_limit = DEFAULT_TC_LIMIT
         self.cjc_limit = DEFAULT_CJC_LIMIT
-        self.tc_voltages = [0.0]*mcc134.info().NUM_AI_CHANNELS
-        self.tc_failures = [0]*mcc134.info().NUM_AI_CHANNELS
-        self.cjc_temps = [0.0]*mcc134.info().NUM_AI_CHANNELS
-        self.cjc_errors = [0.0]*mcc134.info().NUM_AI_CHANNELS
-        self.baseline_temps = [0.0]*mcc134.info().NUM_AI_CHANNELS
-        self.cjc_failures = [0]*mcc134.info().NUM_AI_CHANNELS
-        self.test_count = 0
-        self.software_errors = 0
-        self.baseline_set = False
-        self.watchdog_count = 0
-        self.csvfile = None
+        self.id = None
+        self.activity_id = None
+        # test every MCC 134 that is installed
+        self.addresses = find_boards(HatIDs.MCC_134)
+        self.results = [None]*len(self.addresses)
+        self.board_failed = [False]*len(self.addresses)
+        self.selected = 0
 
         # GUI Setup
 
@@ -131,6 +159,12 @@ class ControlApp:
         self.test_count_label = Label(self.test_frame, width=8,
                                       text="0", relief=SUNKEN)
         self.test_count_label.grid(row=0, column=3, padx=3, pady=3)
+
+        label = Label(self.test_frame, text="Sample age (s):")
+        label.grid(row=1, column=2, padx=3, pady=3, sticky="E")
+        self.sample_age_label = Label(self.test_frame, width=8,
+                                      text="0.0", relief=SUNKEN)
+        self.sample_age_label.grid(row=1, column=3, padx=3, pady=3)
         
         self.stop_button = Button(self.test_frame, text="Stop", fg="red",
                                   command=self.stopTest)
@@ -164,9 +198,22 @@ class ControlApp:
         label.grid(row=1, column=1, padx=3, pady=3)
         label = Label(self.tc_frame, text="Failures")
         label.grid(row=1, column=2, padx=3, pady=3)
+        # session statistics
+        for column, text in enumerate(["Mean", "Min", "Max", "Margin"]):
+            label = Label(self.tc_frame, text=text)
+            label.grid(row=1, column=column+3, padx=3, pady=3)
+        # thermocouple type and faults
+        for column, text in enumerate(["Type", "Open", "Common mode"]):
+            label = Label(self.tc_frame, text=text)
+            label.grid(row=1, column=column+7, padx=3, pady=3)
         
         self.tc_voltage_labels = []
         self.tc_failure_labels = []
+        self.tc_stats_labels = []
+        self.tc_type_combos = []
+        self.open_tc_labels = []
+        self.common_mode_labels = []
+        tc_type_names = [tcTypeName(tc_type) for tc_type in TcTypes]
         
         for index in range(mcc134.info().NUM_AI_CHANNELS):
             # Labels
@@ -185,6 +232,30 @@ class ControlApp:
                                                 relief=SUNKEN, text="0"))
             self.tc_failure_labels[index].grid(row=index+2, column=2, padx=3,
                                                pady=3, ipadx=2, ipady=2)
+
+            labels = []
+            for column in range(4):
+                labels.append(Label(self.tc_frame, width=8, anchor=E,
+                                    relief=SUNKEN, text=""))
+                labels[column].grid(row=index+2, column=column+3, padx=3,
+                                    pady=3, ipadx=2, ipady=2)
+            self.tc_stats_labels.append(labels)
+
+            # the type is used when the test is started
+            combo = Combobox(self.tc_frame, values=tc_type_names, width=4,
+                             state="readonly")
+            combo.set(tcTypeName(DEFAULT_TC_TYPE))
+            combo.grid(row=index+2, column=7, padx=3, pady=3)
+            self.tc_type_combos.append(combo)
+
+            self.open_tc_labels.append(Label(self.tc_frame, width=8, anchor=E,
+                                             relief=SUNKEN, text="0"))
+            self.open_tc_labels[index].grid(row=index+2, column=8, padx=3,
+                                            pady=3, ipadx=2, ipady=2)
+            self.common_mode_labels.append(Label(
+                self.tc_frame, width=8, anchor=E, relief=SUNKEN, text="0"))
+            self.common_mode_labels[index].grid(row=index+2, column=9, padx=3,
+                                                pady=3, ipadx=2, ipady=2)
             
             #self.tc_frame.grid_rowconfigure(index, weight=1)
             
@@ -214,11 +285,16 @@ class ControlApp:
         label.grid(row=1, column=3, padx=3, pady=3)
         label = Label(self.cjc_frame, text="Failures")
         label.grid(row=1, column=4, padx=3, pady=3)
+        # session statistics
+        for column, text in enumerate(["Min", "Max", "Margin"]):
+            label = Label(self.cjc_frame, text=text)
+            label.grid(row=1, column=column+5, padx=3, pady=3)
 
         self.baseline_temp_labels = []
         self.cjc_temp_labels = []
         self.cjc_error_labels = []
         self.cjc_failure_labels = []
+        self.cjc_stats_labels = []
         
         for index in range(mcc134.info().NUM_AI_CHANNELS):
             label = Label(self.cjc_frame, text="{}".format(index))
@@ -248,7 +324,75 @@ class ControlApp:
                                                  relief=SUNKEN, text="0"))
             self.cjc_failure_labels[index].grid(row=index+2, column=4, padx=3,
                                                 pady=3, ipadx=2, ipady=2, sticky="NSEW")
+
+            labels = []
+            for column in range(3):
+                labels.append(Label(self.cjc_frame, width=6, anchor=E,
+                                    relief=SUNKEN, text=""))
+                labels[column].grid(row=index+2, column=column+5, padx=3,
+                                    pady=3, ipadx=2, ipady=2, sticky="NSEW")
+            self.cjc_stats_labels.append(labels)
             
+        # Boards Frame
+        self.boards_frame = LabelFrame(master, text="Boards")
+        self.boards_frame.grid(row=2, column=0, columnspan=2, sticky="NSEW",
+                               padx=3, pady=3)
+
+        # Board widgets
+        label = Label(self.boards_frame, text="Show board:")
+        label.grid(row=0, column=0, columnspan=2, padx=3, pady=3, sticky="E")
+        self.board_combo = Combobox(self.boards_frame, values=self.addresses,
+                                    width=4, justify="right", state="readonly")
+        self.board_combo.current(0)
+        self.board_combo.bind("<<ComboboxSelected>>", self.boardChanged)
+        self.board_combo.grid(row=0, column=2, padx=3, pady=3, sticky="W")
+
+        for column, text in enumerate(["Address", "Serial number", "Ready",
+                                       "Test count", "Software errors",
+                                       "Failures", "Pass/fail"]):
+            label = Label(self.boards_frame, text=text)
+            label.grid(row=1, column=column, padx=3, pady=3)
+
+        self.board_serial_labels = []
+        self.board_ready_leds = []
+        self.board_count_labels = []
+        self.board_error_labels = []
+        self.board_failure_labels = []
+        self.board_pass_leds = []
+
+        for index, address in enumerate(self.addresses):
+            label = Label(self.boards_frame, text="{}".format(address))
+            label.grid(row=index+2, column=0, padx=3, pady=3)
+
+            self.board_serial_labels.append(Label(self.boards_frame, width=8,
+                                                  text="00000000", relief=SUNKEN))
+            self.board_serial_labels[index].grid(row=index+2, column=1, padx=3,
+                                                 pady=3, ipadx=2, ipady=2)
+
+            self.board_ready_leds.append(LED(self.boards_frame, size=20))
+            self.board_ready_leds[index].grid(row=index+2, column=2, padx=3,
+                                              pady=3)
+
+            self.board_count_labels.append(Label(self.boards_frame, width=8,
+                                                 anchor=E, text="0", relief=SUNKEN))
+            self.board_count_labels[index].grid(row=index+2, column=3, padx=3,
+                                                pady=3, ipadx=2, ipady=2)
+
+            self.board_error_labels.append(Label(self.boards_frame, width=8,
+                                                 anchor=E, text="0", relief=SUNKEN))
+            self.board_error_labels[index].grid(row=index+2, column=4, padx=3,
+                                                pady=3, ipadx=2, ipady=2)
+
+            self.board_failure_labels.append(Label(self.boards_frame, width=8,
+                                                   anchor=E, text="0", relief=SUNKEN))
+            self.board_failure_labels[index].grid(row=index+2, column=5, padx=3,
+                                                  pady=3, ipadx=2, ipady=2)
+
+            self.board_pass_leds.append(LED(self.boards_frame, size=20))
+            self.board_pass_leds[index].grid(row=index+2, column=6, padx=3,
+                                             pady=3)
+            self.board_pass_leds[index].set(1)
+
         master.protocol('WM_DELETE_WINDOW', self.close) # exit cleanup
 
         icon = PhotoImage(file='/usr/share/mcc/daqhats/icon.png')
@@ -256,206 +400,234 @@ class ControlApp:
 
         self.pass_led.set(1)
 
-        self.master.after(500, self.establishBaseline)
+        self.id = self.master.after(500, self.startTest)
 
-    def initBoard(self):
-        # Try to initialize the device
+    def startTest(self):
+        self.id = None
+        # Create the session log with current date/time in file name
         try:
-            self.board = mcc134(0)
-            
-            serial = self.board.serial()
-            self.serial_number.set(serial)
-            
-            for channel in range(mcc134.info().NUM_AI_CHANNELS):
-                self.board.tc_type_write(channel, TcTypes.TYPE_T)
-                
-            self.ready_led.set(1)
-            self.device_open = True
-        except:
-            self.software_errors += 1
-            self.current_failures += 1
-   
+            groups = None
+            if len(self.addresses) > 1:
+                groups = ["Bd {}".format(address) for address in self.addresses]
+            tc_types = [parseTcType(combo.get())
+                        for combo in self.tc_type_combos]
+            info = {"tc_limit_uV": DEFAULT_TC_LIMIT,
+                    "cjc_limit_C": DEFAULT_CJC_LIMIT,
+                    "tc_types": [tcTypeName(tc_type) for tc_type in tc_types]}
+            self.log = BinaryLog(
+                "mcc134",
+                ["TC {}".format(channel) for channel in
+                 range(mcc134.info().NUM_AI_CHANNELS)] +
+                ["CJC {}".format(channel) for channel in
+                 range(mcc134.info().NUM_AI_CHANNELS)], groups, info=info)
+        except FileNotFoundError:
+            messagebox.showerror("Error", "Cannot create log file")
+            return
+
+        # start one acquisition thread per board
+        for index, address in enumerate(self.addresses):
+            worker = Mcc134Worker(
+                watchdog=(self.watchdog_check.var.get() == 1),
+                address=address, log=self.log, log_group=index,
+                timing=self.timer.enabled, tc_types=tc_types)
+            worker.start()
+            self.workers.append(worker)
+        for combo in self.tc_type_combos:
+            combo.config(state="disabled")
+
+        self.id = self.master.after(POLL_INTERVAL, self.pollResults)
+
     def stopTest(self):
         # Stop the test loop
         if self.id:
             self.master.after_cancel(self.id)
-        if self.csvfile:
-            self.csvfile.close()
-            self.csvfile = None
-    
+            self.id = None
+        self.stopWorkers()
+        self.ready_led.set(0)
+        for led in self.board_ready_leds:
+            led.set(0)
+        for combo in self.tc_type_combos:
+            combo.config(state="readonly")
+
+    def stopWorkers(self):
+        # The workers release the boards, then the log file can be closed
+        for worker in self.workers:
+            worker.stop()
+        if self.log:
+            try:
+                writeSummary(summaryFilename(self.log.filename), "MCC 134",
+                             self.workers, "TC uV, CJC C", self.timer)
+            except OSError:
+                pass
+        self.workers = []
+        if self.log:
+            self.log.close()
+            self.log = None
+
     def resetTest(self):
         # Reset the error counters and restart
         if self.id:
             self.master.after_cancel(self.id)
+            self.id = None
         if self.activity_id:
             self.master.after_cancel(self.activity_id)
+            self.activity_id = None
         #if self.pass_id:
         #    self.master.after_cancel(self.pass_id)
 
-        if self.csvfile:
-            self.csvfile.close()
-            self.csfvile = None
-            
-        self.board = None
-        self.device_open = False
-        self.tc_voltages = [0.0]*mcc134.info().NUM_AI_CHANNELS
-        self.tc_failures = [0]*mcc134.info().NUM_AI_CHANNELS
-        self.cjc_temps = [0.0]*mcc134.info().NUM_AI_CHANNELS
-        self.cjc_errors = [0.0]*mcc134.info().NUM_AI_CHANNELS
-        self.baseline_temps = [0.0]*mcc134.info().NUM_AI_CHANNELS
-        self.cjc_failures = [0]*mcc134.info().NUM_AI_CHANNELS
-        self.test_count = 0
-        self.software_errors = 0
-        self.baseline_set = False
-        self.watchdog_count = 0
+        self.stopWorkers()
+        self.results = [None]*len(self.addresses)
+        self.board_failed = [False]*len(self.addresses)
+
         self.pass_led.set(1)
         self.inst_pass_led.set(0)
 
         self.ready_led.set(0)
-        self.master.after(500, self.establishBaseline)
-    
-    def establishBaseline(self):
-        self.id = None
-        self.current_failures = 0
-        
-        if self.device_open:
-            self.activity_led.set(1)
-            self.activity_id = self.master.after(100, self.activityBlink)
-            
-            self.current_failures = 0
-            try:
-                for channel in range(mcc134.info().NUM_AI_CHANNELS):
-                    # read the cjc value
-                    self.cjc_temps[channel] = self.board.cjc_read(channel)
-                    self.baseline_temps[channel] = self.cjc_temps[channel]
-                self.baseline_set = True
-                self.watchdog_count = 0
-                
-                # Create csv file with current date/time in file name
-                self.openCsvFile()
-
-                # go to the test loop
-                self.id = self.master.after(1000, self.updateInputs)
-            except FileNotFoundError:
-                messagebox.showerror("Error", "Cannot create CSV file")
-            except:
-                self.software_errors += 1
-                self.current_failures += 1
-                self.watchdog_count += 1
-                
-                # try again
-                self.id = self.master.after(1000, self.establishBaseline)
-                
-            self.updateDisplay()
-        else:
-            # Open the device
-            self.initBoard()
-            # schedule another attempt
-            self.id = self.master.after(500, self.establishBaseline)
-        
-    def openCsvFile(self):
-        if not os.path.isdir('./data'):
-            # create the data directory
-            os.mkdir('./data')
-        filename = "./data/mcc134_test_" + datetime.datetime.now().strftime(
-            "%d-%m-%Y_%H-%M-%S") + ".csv"
-        self.csvfile = open(filename, 'w')
-        
-        mystr = ("Time," + ",".join("TC {}".format(channel) for channel in
-                                   range(mcc134.info().NUM_AI_CHANNELS)) +
-                 "," + ",".join("CJC {}".format(channel) for channel in
-                                range(mcc134.info().NUM_AI_CHANNELS)) +
-                 ",Status\n")
-        self.csvfile.write(mystr)
-        
-    def updateInputs(self):
+        self.updateDisplay(None)
+        self.updateBoardTable()
+        self.id = self.master.after(500, self.startTest)
+
+    def boardChanged(self, _event):
+        # show the channels of the selected board
+        self.selected = self.board_combo.current()
+        self.updateDisplay(self.results[self.selected])
+
+    def pollResults(self):
+        # Render the results the acquisition threads have produced
         self.id = None
-        if self.device_open:
+        new_results = False
+        failed = False
+        for index, worker in enumerate(self.workers):
+            results = []
+            while True:
+                try:
+                    results.append(worker.results.get_nowait())
+                except queue.Empty:
+                    break
+
+            if results:
+                new_results = True
+                self.results[index] = results[-1]
+                # latch a failure from any of the cycles, not just the last one
+                if any(result.current_failures > 0 for result in results):
+                    self.board_failed[index] = True
+                    failed = True
+
+        if new_results:
             self.activity_led.set(1)
+            if self.activity_id:
+                self.master.after_cancel(self.activity_id)
             self.activity_id = self.master.after(100, self.activityBlink)
-            
-            self.current_failures = 0
-            logstr = datetime.datetime.now().strftime("%H:%M:%S") + ","
-            try:
-                for channel in range(mcc134.info().NUM_AI_CHANNELS):
-                    # read the tc value
-                    self.tc_voltages[channel] = self.board.a_in_read(channel) * 1e6
-                    # read the cjc value
-                    self.cjc_temps[channel] = self.board.cjc_read(channel)
-                    
-                    self.watchdog_count = 0
-                    
-                    if self.baseline_set == True:
-                        # compare to limits
-                        tc_voltage = self.tc_voltages[channel]
-                        if (tc_voltage > self.tc_limit) or (tc_voltage < -self.tc_limit):
-                            self.current_failures += 1
-                            self.tc_failures[channel] += 1
-                            
-                        self.cjc_errors[channel] = (self.cjc_temps[channel] -
-                            self.baseline_temps[channel])
-                        cjc_error = self.cjc_errors[channel]
-                        if (cjc_error > self.cjc_limit) or (cjc_error < -self.cjc_limit):
-                            self.current_failures += 1
-                            self.cjc_failures[channel] += 1
-                            
-                logstr += (",".join(
-                               "{:.1f}".format(value) for value in self.tc_voltages) +
-                           "," + ",".join(
-                               "{:.1f}".format(value) for value in self.cjc_temps) +
-                           ",\n")
-                
-            except:
-                self.software_errors += 1
-                self.current_failures += 1
-                self.watchdog_count += 1
-                logstr += ",,,,,,,,Software error\n"
-
-            self.csvfile.write(logstr)
-            self.test_count += 1
-            self.updateDisplay()
-
-            if (self.watchdog_check.var.get() == 1 and
-                self.watchdog_count >= 5):
-                self.board = None
-                self.device_open = False
-                self.watchdog_count = 0
-                self.ready_led.set(0)
-                self.master.after(500, self.updateInputs)
+
+            if failed:
+                self.inst_pass_led.set(2)
+                self.pass_led.set(2)
             else:
-                # schedule another update in 1 s
-                self.id = self.master.after(1000, self.updateInputs)
-        else:
-            # Open the device
-            self.initBoard()
-            # schedule another attempt
-            self.id = self.master.after(500, self.updateInputs)
-       
-    def updateDisplay(self):
+                self.inst_pass_led.set(1)
+            self.display_pending = True
+
+        # redraw at most once per DISPLAY_INTERVAL however many boards report
+        now = time.monotonic()
+        if self.display_pending and now >= self.next_display:
+            self.display_pending = False
+            self.next_display = now + DISPLAY_INTERVAL / 1000.0
+            lap = self.timer.start()
+            self.updateDisplay(self.results[self.selected])
+            self.updateBoardTable()
+            self.timer.lap("display", lap)
+
+        self.id = self.master.after(POLL_INTERVAL, self.pollResults)
+
+    def updateBoardTable(self):
+        for index in range(len(self.addresses)):
+            result = self.results[index]
+            if result is None:
+                self.view.setText(self.board_serial_labels[index], "00000000")
+                self.board_ready_leds[index].set(0)
+                self.view.setText(self.board_count_labels[index], "0")
+                self.view.setText(self.board_error_labels[index], "0")
+                self.view.setText(self.board_failure_labels[index], "0")
+            else:
+                self.view.setText(self.board_serial_labels[index],
+                                  result.serial)
+                self.board_ready_leds[index].set(1 if result.ready else 0)
+                self.view.setText(self.board_count_labels[index],
+                                  "{}".format(result.test_count))
+                self.view.setText(self.board_error_labels[index],
+                                  "{}".format(result.software_errors))
+                self.view.setText(self.board_failure_labels[index],
+                                  "{}".format(
+                                      sum(result.tc_failures) +
+                                      sum(result.cjc_failures) +
+                                      sum(result.open_tc_failures) +
+                                      sum(result.common_mode_failures)))
+            self.board_pass_leds[index].set(
+                2 if self.board_failed[index] else 1)
+
+    def updateDisplay(self, result):
+        if result is None:
+            # nothing measured yet
+            self.view.setVar(self.serial_number, "00000000")
+            for channel in range(mcc134.info().NUM_AI_CHANNELS):
+                self.view.setText(self.tc_voltage_labels[channel], "0.0")
+                self.view.setText(self.tc_failure_labels[channel], "0")
+                self.view.setText(self.open_tc_labels[channel], "0")
+                self.view.setText(self.common_mode_labels[channel], "0")
+                self.view.setText(self.cjc_temp_labels[channel], "0.0")
+                self.view.setText(self.cjc_failure_labels[channel], "0")
+                self.view.setText(self.cjc_error_labels[channel], "0.0")
+                self.view.setText(self.baseline_temp_labels[channel], "0.0")
+                for label in (self.tc_stats_labels[channel] +
+                              self.cjc_stats_labels[channel]):
+                    self.view.setText(label, "")
+            self.view.setText(self.software_error_label, "0")
+            self.view.setText(self.test_count_label, "0")
+            self.view.setText(self.sample_age_label, "0.0")
+            return
+
+        self.view.setVar(self.serial_number, result.serial)
+        self.ready_led.set(1 if result.ready else 0)
+
         for channel in range(mcc134.info().NUM_AI_CHANNELS):
-            self.tc_voltage_labels[channel].config(
-                text="{:.1f}".format(self.tc_voltages[channel]))
-            self.tc_failure_labels[channel].config(
-                text="{}".format(self.tc_failures[channel]))
-            self.cjc_temp_labels[channel].config(
-                text="{:.1f}".format(self.cjc_temps[channel]))
-            self.cjc_failure_labels[channel].config(
-                text="{}".format(self.cjc_failures[channel]))
-            self.cjc_error_labels[channel].config(
-                text="{:.1f}".format(self.cjc_errors[channel]))
-            self.baseline_temp_labels[channel].config(
-                text="{:.1f}".format(self.baseline_temps[channel]))
-            
-        if self.current_failures > 0:
-            self.inst_pass_led.set(2)
-            self.pass_led.set(2)
-        else:
-            self.inst_pass_led.set(1)
-        #self.pass_id = self.master.after(500, self.passBlink)
-            
-        self.software_error_label.config(
-            text="{}".format(self.software_errors))
-        self.test_count_label.config(text="{}".format(self.test_count))
+            self.view.setText(self.tc_voltage_labels[channel],
+                              "{:.1f}".format(result.tc_values[channel]))
+            self.view.setText(self.tc_failure_labels[channel],
+                              "{}".format(result.tc_failures[channel]))
+            self.view.setText(self.open_tc_labels[channel],
+                              "{}".format(result.open_tc_failures[channel]))
+            self.view.setText(self.common_mode_labels[channel],
+                              "{}".format(result.common_mode_failures[channel]))
+            self.view.setText(self.cjc_temp_labels[channel],
+                              "{:.1f}".format(result.cjc_temps[channel]))
+            self.view.setText(self.cjc_failure_labels[channel],
+                              "{}".format(result.cjc_failures[channel]))
+            self.view.setText(self.cjc_error_labels[channel],
+                              "{:.1f}".format(result.cjc_errors[channel]))
+            self.view.setText(self.baseline_temp_labels[channel],
+                              "{:.1f}".format(result.baseline_temps[channel]))
+
+            texts = [""]*4
+            summary = result.stats[channel]
+            if summary.count:
+                texts = ["{:.1f}".format(value) for value in
+                         (summary.mean, summary.minimum, summary.maximum,
+                          summary.margin)]
+            for label, text in zip(self.tc_stats_labels[channel], texts):
+                self.view.setText(label, text)
+            texts = [""]*3
+            summary = result.stats[mcc134.info().NUM_AI_CHANNELS + channel]
+            if summary.count:
+                texts = ["{:.1f}".format(value) for value in
+                         (summary.minimum, summary.maximum, summary.margin)]
+            for label, text in zip(self.cjc_stats_labels[channel], texts):
+                self.view.setText(label, text)
+
+        self.view.setText(self.software_error_label,
+                          "{}".format(result.software_errors))
+        self.view.setText(self.test_count_label,
+                          "{}".format(result.test_count))
+        self.view.setText(self.sample_age_label,
+                          "{:.1f}".format(max(result.sample_ages)))
 
     #def passBlink(self):
     #    self.pass_id = None
@@ -465,6 +637,16 @@ class ControlApp:
         self.activity_id = None
         self.activity_led.set(0)
         
+    def printTiming(self):
+        for worker in self.workers:
+            print("Board {} phase timing".format(worker.address))
+            for line in timingLines(worker.timer):
+                print(line)
+        print("Display timing")
+        for line in timingLines(self.timer):
+            print(line)
+        sys.stdout.flush()
+
     # Event handlers
     def close(self):
         if self.id:
@@ -473,10 +655,9 @@ class ControlApp:
             self.master.after_cancel(self.activity_id)
         #if self.pass_id:
         #    self.master.after_cancel(self.pass_id)
-        self.device_open = False
-        if self.csvfile:
-            self.csvfile.close()
-            self.csvfile = None
+        self.stopWorkers()
+        if self.metrics:
+            self.metrics.close()
         self.master.destroy()
 
 
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+    MCC 134 CE Test command line application
+
+    Purpose:
+        Run the MCC 134 CE test without a display
+
+    Description:
+        This app runs the same test as the MCC 134 CE Testing app on every
+        MCC 134 found, printing a status line for each board periodically and
+        logging to the same files. Stop it with Ctrl+C.
+"""
+import os
+import sys
+
+# the shared test modules are in the top level of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from ce_common.hats import mcc134, HatIDs
+from ce_common.acquisition import find_boards
+from ce_common import headless
+from mcc134_worker import (Mcc134Worker, DEFAULT_TC_LIMIT, DEFAULT_CJC_LIMIT,
+                           UPDATE_INTERVAL, CYCLE_INTERVAL, DEFAULT_TC_TYPE,
+                           tcTypeName, parseTcType)
+
+
+def countFailures(result):
+    return (sum(result.tc_failures) + sum(result.cjc_failures) +
+            sum(result.open_tc_failures) + sum(result.common_mode_failures))
+
+
+def main():
+    parser = headless.argumentParser("MCC 134")
+    parser.add_argument("--update-interval", type=int,
+                        choices=range(1, 256), metavar="{1-255}",
+                        default=UPDATE_INTERVAL,
+                        help="board update interval in s (default {})"
+                        .format(UPDATE_INTERVAL))
+    parser.add_argument("--cycle-interval", type=float,
+                        default=CYCLE_INTERVAL,
+                        help="s between test cycles (default {:g})"
+                        .format(CYCLE_INTERVAL))
+    parser.add_argument("--tc-types", type=parseTcType, nargs="+",
+                        metavar="TYPE",
+                        help="thermocouple type of each channel, J K T E R S "
+                        "B N or off; the last one is used for the rest "
+                        "(default {})".format(tcTypeName(DEFAULT_TC_TYPE)))
+    args = parser.parse_args()
+
+    num_channels = mcc134.info().NUM_AI_CHANNELS
+    tc_types = [DEFAULT_TC_TYPE]*num_channels
+    if args.tc_types:
+        tc_types = (args.tc_types +
+                    args.tc_types[-1:]*num_channels)[:num_channels]
+
+    addresses = args.address or find_boards(HatIDs.MCC_134)
+    return headless.run(
+        "mcc134", addresses,
+        ["TC {}".format(channel) for channel in
+         range(mcc134.info().NUM_AI_CHANNELS)] +
+        ["CJC {}".format(channel) for channel in
+         range(mcc134.info().NUM_AI_CHANNELS)],
+        lambda address, log, log_group: Mcc134Worker(
+            watchdog=args.watchdog, address=address, log=log,
+            log_group=log_group, timing=args.timing,
+            update_interval=args.update_interval,
+            cycle_interval=args.cycle_interval, tc_types=tc_types),
+        countFailures, args,
+        info={"tc_limit_uV": DEFAULT_TC_LIMIT,
+              "cjc_limit_C": DEFAULT_CJC_LIMIT,
+              "update_interval_s": args.update_interval,
+              "tc_types": [tcTypeName(tc_type) for tc_type in tc_types]},
+        units="TC uV, CJC C")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
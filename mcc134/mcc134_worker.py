@@ -0,0 +1,404 @@
+"""
+    MCC 134 CE Test acquisition
+
+    Purpose:
+        Acquire and check the MCC 134 inputs for the CE test
+
+    Description:
+        The board converts the inputs once per update interval. A poller
+        thread sets that interval and reads the thermocouple voltages and
+        CJC temperatures of every channel once per interval into a
+        timestamped cache. The worker checks the freshest cached readings
+        against the limits once per cycle without waiting for the board and
+        reports how old they are. The CJC temperatures are compared to the
+        baseline read at the start of the test.
+
+        Each poll also sorts out the thermocouple faults: an open
+        thermocouple saturates the ADC at the top code and a common mode
+        error at the bottom one. The calibration moves a saturated reading
+        away from the ends of the voltage range, so the poller reads the
+        raw ADC codes, checks them, and applies the board's calibration
+        coefficients and the LSB size itself. Faults are counted per
+        channel at the poll rate and are not limit failures. Disabled
+        channels are not read.
+"""
+from collections import namedtuple
+from ce_common.hats import mcc134, TcTypes, OptionFlags
+from ce_common.acquisition import AcquisitionWorker
+from ce_common.phasetimer import PhaseTimer
+from ce_common.sessionstats import SessionStats
+from ce_common.scheduler import DeadlineScheduler
+import datetime
+import threading
+import time
+
+DEFAULT_TC_LIMIT = 20.0    # uV
+DEFAULT_CJC_LIMIT = 2.0    # C
+UPDATE_INTERVAL = 1        # s between board updates, 1-255
+CYCLE_INTERVAL = 1.0       # s between test cycles
+STALE_INTERVALS = 3        # update intervals before a reading is stale
+DEFAULT_TC_TYPE = TcTypes.TYPE_T
+
+# Thermocouple faults found by the poller
+OPEN_TC = "Open TC"
+COMMON_MODE = "Common mode"
+RAW_OPTIONS = OptionFlags.NOSCALEDATA | OptionFlags.NOCALIBRATEDATA
+
+# The last readings of the channels. times are the monotonic times each
+# channel was read, faults the fault found on each channel or None and
+# sequence counts the polls.
+TcReadings = namedtuple(
+    'TcReadings', ['tc_voltages', 'cjc_temps', 'times', 'faults',
+                   'timestamp', 'sequence'])
+
+# Result record for the MCC 134. The counters are running totals so the GUI
+# only needs the most recent record.
+Mcc134Result = namedtuple(
+    'Mcc134Result', ['address', 'timestamp', 'ready', 'serial', 'tc_values',
+                     'tc_failures', 'cjc_temps', 'baseline_temps',
+                     'cjc_errors', 'cjc_failures', 'current_failures',
+                     'test_count', 'software_errors', 'status', 'stats',
+                     'sample_ages', 'tc_types', 'open_tc_failures',
+                     'common_mode_failures'])
+
+
+def tcTypeName(tc_type):
+    """ Return the short name of a thermocouple type, such as "T". """
+    if tc_type == TcTypes.DISABLED:
+        return "Off"
+    return TcTypes(tc_type).name[len("TYPE_"):]
+
+
+def parseTcType(text):
+    """ Return the TcTypes value for a name such as "T", "type_k" or "off". """
+    name = text.strip().upper()
+    if name in ("OFF", "DISABLED"):
+        return TcTypes.DISABLED
+    if not name.startswith("TYPE_"):
+        name = "TYPE_" + name
+    try:
+        return TcTypes[name]
+    except KeyError:
+        raise ValueError("Unknown thermocouple type " + text)
+
+
+def classifyFault(code):
+    """ Return the fault shown by a raw, uncalibrated ADC code, or None. """
+    if code >= mcc134.info().AI_MAX_CODE:
+        return OPEN_TC
+    if code <= mcc134.info().AI_MIN_CODE:
+        return COMMON_MODE
+    return None
+
+
+def lsbSize():
+    """ Return the voltage of one ADC code. """
+    info = mcc134.info()
+    return ((info.AI_MAX_RANGE - info.AI_MIN_RANGE) /
+            (info.AI_MAX_CODE - info.AI_MIN_CODE + 1))
+
+
+def faultStatus(faults):
+    """ Return the log status for the faults of a poll, such as "Open TC 1". """
+    status = []
+    for fault in (OPEN_TC, COMMON_MODE):
+        channels = [str(channel) for channel, found in enumerate(faults)
+                    if found == fault]
+        if channels:
+            status.append("{} {}".format(fault, ",".join(channels)))
+    return "; ".join(status)
+
+
+class Mcc134Poller(threading.Thread):
+    """
+    Reads every channel of an MCC 134 once per board update interval. The
+    worker takes the last readings with latest(), which does not wait for
+    the board. A failed poll leaves the cache as it was and is counted in
+    errors. The faults of each poll are added to the open_tc_failures and
+    common_mode_failures lists, which the worker owns so the counts carry
+    over when the board is reopened.
+    """
+    def __init__(self, board, address, update_interval=UPDATE_INTERVAL,
+                 timer=None, tc_types=None, open_tc_failures=None,
+                 common_mode_failures=None):
+        threading.Thread.__init__(
+            self, name="mcc134 poller {}".format(address), daemon=True)
+        self.board = board
+        self.update_interval = update_interval
+        self.timer = timer if timer else PhaseTimer()
+        num_channels = mcc134.info().NUM_AI_CHANNELS
+        self.tc_types = (list(tc_types) if tc_types else
+                         [DEFAULT_TC_TYPE]*num_channels)
+        self.open_tc_failures = (open_tc_failures if open_tc_failures
+                                 is not None else [0]*num_channels)
+        self.common_mode_failures = (common_mode_failures if
+                                     common_mode_failures is not None
+                                     else [0]*num_channels)
+        self.scheduler = DeadlineScheduler(update_interval)
+        self.coefficients = None
+        self.polls = 0
+        self.errors = 0
+        self._readings = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def configure(self):
+        """
+        Set the thermocouple types and the board update interval, read the
+        calibration coefficients and read the first values.
+        """
+        for channel, tc_type in enumerate(self.tc_types):
+            self.board.tc_type_write(channel, tc_type)
+        self.coefficients = [self.board.calibration_coefficient_read(channel)
+                             for channel in range(len(self.tc_types))]
+        self.board.update_interval_write(self.update_interval)
+        self.poll()
+
+    def poll(self):
+        num_channels = mcc134.info().NUM_AI_CHANNELS
+        tc_voltages = [0.0]*num_channels
+        cjc_temps = [0.0]*num_channels
+        times = [0.0]*num_channels
+        faults = [None]*num_channels
+        lsb = lsbSize()
+        lap = self.timer.start()
+        for channel in range(num_channels):
+            if self.tc_types[channel] != TcTypes.DISABLED:
+                code = self.board.a_in_read(channel, RAW_OPTIONS)
+                lap = self.timer.lap("poll.read_tc", lap)
+                faults[channel] = classifyFault(code)
+                slope, offset = self.coefficients[channel]
+                tc_voltages[channel] = (code * slope + offset) * lsb * 1e6
+            cjc_temps[channel] = self.board.cjc_read(channel)
+            lap = self.timer.lap("poll.read_cjc", lap)
+            times[channel] = time.monotonic()
+        with self._lock:
+            self.polls += 1
+            self._readings = TcReadings(tc_voltages, cjc_temps, times, faults,
+                                        datetime.datetime.now(), self.polls)
+        for channel, fault in enumerate(faults):
+            if fault == OPEN_TC:
+                self.open_tc_failures[channel] += 1
+            elif fault == COMMON_MODE:
+                self.common_mode_failures[channel] += 1
+
+    def latest(self):
+        """ Return the last TcReadings, or None before the first poll. """
+        with self._lock:
+            return self._readings
+
+    def run(self):
+        # poll half an interval out of step with the start of the test, so
+        # a cycle of the same period does not race the poll for its sample
+        self.scheduler.start(time.monotonic() - self.update_interval / 2.0)
+        while not self._stop_event.is_set():
+            self.scheduler.wait(self._stop_event.wait)
+            if self._stop_event.is_set():
+                break
+            try:
+                self.poll()
+            except:
+                self.errors += 1
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+
+class Mcc134Worker(AcquisitionWorker):
+    def __init__(self, watchdog=False, address=0, log=None, log_group=0,
+                 timing=False, update_interval=UPDATE_INTERVAL,
+                 cycle_interval=CYCLE_INTERVAL, tc_types=None):
+        AcquisitionWorker.__init__(self, "mcc134", address, watchdog, log,
+                                   log_group, timing)
+        num_channels = mcc134.info().NUM_AI_CHANNELS
+        self.update_interval = update_interval
+        self.tc_types = (list(tc_types) if tc_types else
+                         [DEFAULT_TC_TYPE]*num_channels)
+        self.open_tc_failures = [0]*num_channels
+        self.common_mode_failures = [0]*num_channels
+        self.fault_count = 0
+        self.poller = None
+        self.poll_errors = 0
+        self.sequence = None
+        self.sample_ages = [0.0]*num_channels
+        self.sample_age = 0.0
+        self.max_sample_age = 0.0
+        self.tc_limit = DEFAULT_TC_LIMIT
+        self.cjc_limit = DEFAULT_CJC_LIMIT
+        self.tc_voltages = [0.0]*num_channels
+        self.tc_failures = [0]*num_channels
+        self.cjc_temps = [0.0]*num_channels
+        self.cjc_errors = [0.0]*num_channels
+        self.baseline_temps = [0.0]*num_channels
+        self.cjc_failures = [0]*num_channels
+        self.scheduler = DeadlineScheduler(cycle_interval)
+        # the CJC temperatures are compared to their baseline
+        self.stats = SessionStats(
+            ["TC {}".format(channel) for channel in range(num_channels)] +
+            ["CJC {}".format(channel) for channel in range(num_channels)],
+            [self.tc_limit]*num_channels + [self.cjc_limit]*num_channels)
+
+    def initBoard(self):
+        # Try to initialize the device
+        try:
+            self.board = mcc134(self.address)
+            self.serial = self.board.serial()
+
+            poller = Mcc134Poller(self.board, self.address,
+                                  self.update_interval, self.timer,
+                                  self.tc_types, self.open_tc_failures,
+                                  self.common_mode_failures)
+            poller.configure()
+            poller.start()
+            self.poller = poller
+            self.poll_errors = 0
+            self.sequence = None
+
+            self.device_open = True
+        except:
+            self.board = None
+            self.software_errors += 1
+            self.current_failures += 1
+
+    def closeBoard(self):
+        if self.poller:
+            self.poller.stop()
+            self.poller = None
+        self.board = None
+        self.device_open = False
+
+    def latestReadings(self):
+        """
+        Return the poller's last readings and update the sample ages. Raises
+        an exception if the poller has failed or the readings are stale.
+        """
+        errors = self.poller.errors
+        if errors != self.poll_errors:
+            self.poll_errors = errors
+            raise RuntimeError("Poll failed")
+        readings = self.poller.latest()
+        now = time.monotonic()
+        self.sample_ages = [now - read_time for read_time in readings.times]
+        self.sample_age = max(self.sample_ages)
+        if self.sample_age > self.max_sample_age:
+            self.max_sample_age = self.sample_age
+        if self.sample_age > STALE_INTERVALS * self.update_interval:
+            raise RuntimeError("Stale readings")
+        return readings
+
+    def result(self, status=""):
+        return Mcc134Result(
+            self.address, datetime.datetime.now(), self.device_open,
+            self.serial, list(self.tc_voltages), list(self.tc_failures),
+            list(self.cjc_temps), list(self.baseline_temps),
+            list(self.cjc_errors), list(self.cjc_failures),
+            self.current_failures, self.test_count, self.software_errors,
+            status, self.stats.summary(), list(self.sample_ages),
+            list(self.tc_types), list(self.open_tc_failures),
+            list(self.common_mode_failures))
+
+    def establishBaseline(self):
+        self.current_failures = 0
+        lap = self.timer.start()
+        try:
+            readings = self.latestReadings()
+            for channel in range(mcc134.info().NUM_AI_CHANNELS):
+                # use the polled cjc value
+                self.cjc_temps[channel] = readings.cjc_temps[channel]
+                self.baseline_temps[channel] = self.cjc_temps[channel]
+                self.stats.setReference(
+                    mcc134.info().NUM_AI_CHANNELS + channel,
+                    self.baseline_temps[channel])
+            self.sequence = readings.sequence
+            self.timer.lap("establishBaseline.read", lap)
+            self.baseline_set = True
+            self.scheduler.start()
+            self.watchdog_count = 0
+        except:
+            self.software_errors += 1
+            self.current_failures += 1
+            self.watchdog_count += 1
+            self.publish(self.result())
+
+            # try again
+            self.sleep(self.update_interval)
+            return
+
+        self.publish(self.result())
+
+    def updateInputs(self):
+        self.current_failures = 0
+
+        lap = self.timer.start()
+        self.scheduler.wait(self.sleep)
+        if self.stopped():
+            return
+        lap = self.timer.lap("updateInputs.wait", lap)
+
+        status = ""
+        values = []
+        try:
+            readings = self.latestReadings()
+            lap = self.timer.lap("updateInputs.read", lap)
+            self.watchdog_count = 0
+            if readings.sequence == self.sequence:
+                # the board has not updated since the last cycle
+                self.publish(self.result())
+                return
+            self.sequence = readings.sequence
+            timestamp = readings.timestamp
+
+            # the faults found by the polls since the last cycle
+            fault_count = (sum(self.open_tc_failures) +
+                           sum(self.common_mode_failures))
+            self.current_failures += fault_count - self.fault_count
+            self.fault_count = fault_count
+            status = faultStatus(readings.faults)
+
+            for channel in range(mcc134.info().NUM_AI_CHANNELS):
+                self.tc_voltages[channel] = readings.tc_voltages[channel]
+                self.cjc_temps[channel] = readings.cjc_temps[channel]
+
+                if self.baseline_set == True:
+                    # compare to limits
+                    tc_voltage = self.tc_voltages[channel]
+                    if (self.tc_types[channel] == TcTypes.DISABLED or
+                            readings.faults[channel] is not None):
+                        # not a limit failure
+                        pass
+                    elif (tc_voltage > self.tc_limit) or (tc_voltage < -self.tc_limit):
+                        self.current_failures += 1
+                        self.tc_failures[channel] += 1
+
+                    self.cjc_errors[channel] = (self.cjc_temps[channel] -
+                        self.baseline_temps[channel])
+                    cjc_error = self.cjc_errors[channel]
+                    if (cjc_error > self.cjc_limit) or (cjc_error < -self.cjc_limit):
+                        self.current_failures += 1
+                        self.cjc_failures[channel] += 1
+            lap = self.timer.lap("updateInputs.limits", lap)
+
+            values = self.tc_voltages + self.cjc_temps
+            for channel, value in enumerate(values):
+                # the faults and disabled channels have no statistics
+                if (channel < len(self.tc_types) and
+                        (self.tc_types[channel] == TcTypes.DISABLED or
+                         readings.faults[channel] is not None)):
+                    continue
+                self.stats.update([value], timestamp, channel)
+            self.timer.lap("updateInputs.stats", lap)
+        except:
+            timestamp = datetime.datetime.now()
+            self.software_errors += 1
+            self.current_failures += 1
+            self.watchdog_count += 1
+            status = "Software error"
+
+        lap = self.timer.start()
+        self.writeLog(values, status, timestamp)
+        lap = self.timer.lap("updateInputs.log", lap)
+        self.test_count += 1
+        self.publish(self.result(status))
+        self.timer.lap("updateInputs.publish", lap)
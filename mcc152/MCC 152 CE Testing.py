@@ -8,60 +8,35 @@
     Description:
         This app reads and displays the input voltages.
 """
-from daqhats import mcc152, DIOConfigItem
 from tkinter import *
-import datetime
 from tkinter import messagebox
 import os
-import Gpib
-import random
+import queue
+import signal
+import sys
+import time
 #from tkinter import ttk
 from tkinter.ttk import *
 #import tkinter.font
 
-DEFAULT_V_LIMIT = 50   # mV
-
-#******************************************************************************
-# HP 34401A DMM
-class DMM:
-    def __init__(self):
-        self.device = Gpib.Gpib(0, 5)
-        # first write after reboot fails so add a retry mechanism
-        self.device.timeout(9)  # 100 ms
-        written = False
-        while not written:
-            try:
-                self.device.write("*CLS")
-            except:
-                pass
-            else:
-                written = True
-                self.device.timeout(13)
-        
-        self.device.write("INP:IMP:AUTO ON")
-        self.device.write("CONF:VOLT:DC")
-        return
-    
-    def __del__(self):
-        self.device.ibloc()
-        
-    def read_voltage(self, resolution, range=0):
-        if resolution == 0:
-            self.device.write(":MEAS:VOLT:DC? DEF,DEF")
-        else:
-            if range == 0:
-                self.device.write(":MEAS:VOLT:DC? DEF,MIN")
-            else:
-                self.device.write(":MEAS:VOLT:DC? MIN,MIN")
-        
-        result = self.device.read()
-        
-        value = float(result)
-        return value
-    
-    def display(self, string):
-        self.device.write("DISP:TEXT \"{0:s}\"".format(string))
-        return
+# the shared test modules are in the top level of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from ce_common.hats import HatIDs
+from dmm import DMM, dmmResource
+from ce_common.instrument import InstrumentError
+from ce_common.diostress import PATTERNS
+from ce_common.aosweep import DEFAULT_CODES, DEFAULT_SAMPLES
+from mcc152_worker import Mcc152Worker, DEFAULT_V_LIMIT
+from ce_common.acquisition import find_boards
+from ce_common.binlog import BinaryLog
+from ce_common.metrics import serverFromEnvironment
+from ce_common.phasetimer import PhaseTimer, timingEnabled, timingLines
+from ce_common.sessionstats import writeSummary, summaryFilename
+from ce_common.view import DisplayCache
+
+POLL_INTERVAL = 100       # ms between checks for new results
+DISPLAY_INTERVAL = 250    # ms between display refreshes
 
 class LED(Frame):
     def __init__(self, parent, size=10, **options):
@@ -89,6 +64,9 @@ class LED(Frame):
         self.c.itemconfig(self.led, fill=color)
     
     def set(self, state):
+        if state == self.state:
+            # the colour is already right
+            return
         self.state = state
         self._change_color()
         
@@ -102,21 +80,38 @@ class ControlApp:
         master.title("MCC 152 CE Test")
     
         # Initialize variables
-        self.device_open = False
-        self.board = None
+        self.workers = []
+        self.log = None
+        # only pass changed label texts to Tk
+        self.view = DisplayCache()
+        self.display_pending = False
+        self.next_display = 0.0
+        # serve the counters to a lab monitor if DAQHATS_CE_METRICS_PORT is set
+        self.metrics = serverFromEnvironment("MCC 152", lambda: self.workers,
+                                             lambda: self.log)
+        # time the cycle phases if DAQHATS_CE_TIMING is set; SIGUSR1 prints
+        # the histograms
+        self.timer = PhaseTimer(timingEnabled())
+        if self.timer.enabled and hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1,
+                          lambda _signum, _frame: self.printTiming())
         self.voltage_limit = DEFAULT_V_LIMIT
-        self.ao_voltage = mcc152.info().AO_MAX_VOLTAGE
-        self.test_count = 0
-        self.software_errors = 0
-        self.baseline_set = False
-        self.watchdog_count = 0
-        self.csvfile = None
         self.id = None
         self.activity_id = None
-        self.d_out_values = [0]*4
-        self.d_in_values = [0]*4
+        # test every MCC 152 that is installed
+        self.addresses = find_boards(HatIDs.MCC_152)
+        self.results = [None]*len(self.addresses)
+        self.board_failed = [False]*len(self.addresses)
+        self.selected = 0
         
-        self.dmm = DMM()
+        # the DMM measures the analog output of the first board
+        try:
+            self.dmm = DMM(dmmResource())
+        except (InstrumentError, ImportError, OSError, ValueError) as error:
+            messagebox.showerror(
+                "Error", "Cannot open the DMM, the analog output is not "
+                "checked: {}".format(error))
+            self.dmm = None
 
         # GUI Setup
 
@@ -199,6 +194,22 @@ class ControlApp:
         self.watchdog_check.grid(row=3, column=0, columnspan=2, padx=3, pady=3,
                                  sticky="W")
 
+        # the stress pattern is used when the test is started
+        label = Label(self.test_frame, text="DIO pattern:")
+        label.grid(row=4, column=0, padx=3, pady=3, sticky="W")
+        self.pattern_combo = Combobox(self.test_frame,
+                                      values=["off"] + list(PATTERNS),
+                                      width=6, state="readonly")
+        self.pattern_combo.set("off")
+        self.pattern_combo.grid(row=4, column=1, padx=3, pady=3)
+
+        v = IntVar()
+        self.sweep_check = Checkbutton(
+            self.test_frame, text="Sweep analog output", variable=v)
+        self.sweep_check.var = v
+        self.sweep_check.grid(row=5, column=0, columnspan=2, padx=3, pady=3,
+                              sticky="W")
+
         # Digital I/O Frame
         self.dio_frame = LabelFrame(master, text="Digital I/O Loopback")
         self.dio_frame.grid(row=1, rowspan=2, column=0, sticky="NSEW", padx=3, pady=3)
@@ -221,8 +232,11 @@ class ControlApp:
         label.grid(row=1, column=5, padx=3, pady=3)
         label = Label(self.dio_frame, text="Failures")
         label.grid(row=1, column=6, padx=3, pady=3)
+        label = Label(self.dio_frame, text="Error rate")
+        label.grid(row=1, column=7, padx=3, pady=3)
 
         self.dio_failure_labels = []
+        self.error_rate_labels = []
         self.d_out_labels = []
         self.d_in_labels = []
         
@@ -253,6 +267,18 @@ class ControlApp:
             self.dio_failure_labels[channel].grid(row=2+channel, column=6, padx=3,
                                             pady=3, ipadx=2, ipady=2)
 
+            self.error_rate_labels.append(Label(self.dio_frame, width=8, anchor=E,
+                                                relief=SUNKEN, text=""))
+            self.error_rate_labels[channel].grid(row=2+channel, column=7, padx=3,
+                                                 pady=3, ipadx=2, ipady=2)
+
+        label = Label(self.dio_frame, text="Stress transitions/s:")
+        label.grid(row=6, column=0, columnspan=5, padx=3, pady=3, sticky="E")
+        self.transition_rate_label = Label(self.dio_frame, width=10, anchor=E,
+                                           relief=SUNKEN, text="")
+        self.transition_rate_label.grid(row=6, column=5, columnspan=2, padx=3,
+                                        pady=3, ipadx=2, ipady=2, sticky="E")
+
 
         # Output Voltage Frame
         self.volt_frame = LabelFrame(master, text="Voltage Output")
@@ -292,11 +318,81 @@ class ControlApp:
                                       relief=SUNKEN, text="0")
         self.ao_failure_label.grid(row=2, column=2, padx=3,
                                 pady=3, ipadx=2, ipady=2)
+
+        # linearity of the last sweep pass
+        label = Label(self.volt_frame, text="Sweep INL/DNL, LSB")
+        label.grid(row=3, column=0, padx=3, pady=3, sticky="W")
+        self.inl_label = Label(self.volt_frame, anchor=E, width=10,
+                               text="", relief=SUNKEN)
+        self.inl_label.grid(row=3, column=1, padx=3, pady=3, ipadx=2, ipady=2)
+        self.dnl_label = Label(self.volt_frame, anchor=E, width=10,
+                               text="", relief=SUNKEN)
+        self.dnl_label.grid(row=3, column=2, padx=3, pady=3, ipadx=2, ipady=2)
             
         self.volt_frame.grid_columnconfigure(0, weight=1)
         self.volt_frame.grid_columnconfigure(1, weight=1)
         self.volt_frame.grid_columnconfigure(2, weight=1)
             
+        # Boards Frame
+        self.boards_frame = LabelFrame(master, text="Boards")
+        self.boards_frame.grid(row=3, column=0, columnspan=2, sticky="NSEW",
+                               padx=3, pady=3)
+
+        # Board widgets
+        label = Label(self.boards_frame, text="Show board:")
+        label.grid(row=0, column=0, columnspan=2, padx=3, pady=3, sticky="E")
+        self.board_combo = Combobox(self.boards_frame, values=self.addresses,
+                                    width=4, justify="right", state="readonly")
+        self.board_combo.current(0)
+        self.board_combo.bind("<<ComboboxSelected>>", self.boardChanged)
+        self.board_combo.grid(row=0, column=2, padx=3, pady=3, sticky="W")
+
+        for column, text in enumerate(["Address", "Serial number", "Ready",
+                                       "Test count", "Software errors",
+                                       "Failures", "Pass/fail"]):
+            label = Label(self.boards_frame, text=text)
+            label.grid(row=1, column=column, padx=3, pady=3)
+
+        self.board_serial_labels = []
+        self.board_ready_leds = []
+        self.board_count_labels = []
+        self.board_error_labels = []
+        self.board_failure_labels = []
+        self.board_pass_leds = []
+
+        for index, address in enumerate(self.addresses):
+            label = Label(self.boards_frame, text="{}".format(address))
+            label.grid(row=index+2, column=0, padx=3, pady=3)
+
+            self.board_serial_labels.append(Label(self.boards_frame, width=8,
+                                                  text="00000000", relief=SUNKEN))
+            self.board_serial_labels[index].grid(row=index+2, column=1, padx=3,
+                                                 pady=3, ipadx=2, ipady=2)
+
+            self.board_ready_leds.append(LED(self.boards_frame, size=20))
+            self.board_ready_leds[index].grid(row=index+2, column=2, padx=3,
+                                              pady=3)
+
+            self.board_count_labels.append(Label(self.boards_frame, width=8,
+                                                 anchor=E, text="0", relief=SUNKEN))
+            self.board_count_labels[index].grid(row=index+2, column=3, padx=3,
+                                                pady=3, ipadx=2, ipady=2)
+
+            self.board_error_labels.append(Label(self.boards_frame, width=8,
+                                                 anchor=E, text="0", relief=SUNKEN))
+            self.board_error_labels[index].grid(row=index+2, column=4, padx=3,
+                                                pady=3, ipadx=2, ipady=2)
+
+            self.board_failure_labels.append(Label(self.boards_frame, width=8,
+                                                   anchor=E, text="0", relief=SUNKEN))
+            self.board_failure_labels[index].grid(row=index+2, column=5, padx=3,
+                                                  pady=3, ipadx=2, ipady=2)
+
+            self.board_pass_leds.append(LED(self.boards_frame, size=20))
+            self.board_pass_leds[index].grid(row=index+2, column=6, padx=3,
+                                             pady=3)
+            self.board_pass_leds[index].set(1)
+
         master.protocol('WM_DELETE_WINDOW', self.close) # exit cleanup
 
         icon = PhotoImage(file='/usr/share/mcc/daqhats/icon.png')
@@ -306,226 +402,239 @@ class ControlApp:
 
         #self.master.after(500, self.establishBaseline)
 
-    def initBoard(self):
-        # Try to initialize the device
-        try:
-            self.board = mcc152(0)
-            
-            serial = self.board.serial()
-            self.serial_number.set(serial)
-            
-            # set DIO states and values
-            self.board.dio_reset()
-            self.board.dio_config_write_port(DIOConfigItem.DIRECTION, 0xF0)
-            self.board.dio_output_write_port(0x00)
-            self.d_out_values = [0]*4
-
-            self.d_in_values = [0]*4
-            for index in range(4):
-                self.d_in_values[index] = self.board.dio_input_read_bit(index+4)
-        
-            # set analog output values
-            self.board.a_out_write_all([self.ao_voltage, self.ao_voltage])
-            
-            self.ready_led.set(1)
-            self.device_open = True
-        except:
-            self.software_errors += 1
-            self.current_failures += 1
-   
     def startTest(self):
         self.resetTest()
-        # get control values
-
-        self.master.after(500, self.establishBaseline)
+        # Create the session log with current date/time in file name
+        try:
+            groups = None
+            if len(self.addresses) > 1:
+                groups = ["Bd {}".format(address) for address in self.addresses]
+            pattern = self.pattern_combo.get()
+            if pattern == "off":
+                pattern = None
+            sweep_codes = None
+            if self.dmm and self.sweep_check.var.get() == 1:
+                sweep_codes = DEFAULT_CODES
+            info = {"voltage_limit_mV": DEFAULT_V_LIMIT,
+                    "dmm": self.dmm is not None,
+                    "dio_pattern": pattern or "",
+                    "sweep_codes": ",".join(str(code)
+                                            for code in sweep_codes or []),
+                    "sweep_samples": DEFAULT_SAMPLES if sweep_codes else 0}
+            self.log = BinaryLog(
+                "mcc152",
+                ["DOut {}".format(value) for value in range(4)] +
+                ["DIn {}".format(value) for value in range(4, 8)] + ["AO 0"] +
+                (["AO 0 set"] if sweep_codes else []),
+                groups, info=info)
+        except FileNotFoundError:
+            messagebox.showerror("Error", "Cannot create log file")
+            return
+
+        # get control values and start one test thread per board
+        for index, address in enumerate(self.addresses):
+            worker = Mcc152Worker(
+                watchdog=(self.watchdog_check.var.get() == 1),
+                address=address, log=self.log, log_group=index,
+                dmm=self.dmm if index == 0 else None,
+                timing=self.timer.enabled, pattern=pattern,
+                sweep_codes=sweep_codes)
+            worker.start()
+            self.workers.append(worker)
+
+        self.id = self.master.after(POLL_INTERVAL, self.pollResults)
         # disable controls
         self.start_button.configure(state=DISABLED)
         self.reset_button.configure(state=DISABLED)
         self.stop_button.configure(state=NORMAL)
         self.watchdog_check.configure(state=DISABLED)
+        self.pattern_combo.configure(state="disabled")
+        self.sweep_check.configure(state=DISABLED)
     
     def stopTest(self):
         # Stop the test loop
         if self.id:
             self.master.after_cancel(self.id)
-        if self.csvfile:
-            self.csvfile.close()
-            self.csvfile = None
+            self.id = None
+        self.stopWorkers()
         self.ready_led.set(0)
+        for led in self.board_ready_leds:
+            led.set(0)
         # enable controls
         self.start_button.configure(state=NORMAL)
         self.reset_button.configure(state=NORMAL)
         self.stop_button.configure(state=DISABLED)
         self.watchdog_check.configure(state=NORMAL)
+        self.pattern_combo.configure(state="readonly")
+        self.sweep_check.configure(state=NORMAL)
     
+    def stopWorkers(self):
+        # The workers release the boards, then the log file can be closed
+        for worker in self.workers:
+            worker.stop()
+        if self.log:
+            try:
+                writeSummary(summaryFilename(self.log.filename), "MCC 152",
+                             self.workers, timer=self.timer)
+            except OSError:
+                pass
+        self.workers = []
+        if self.log:
+            self.log.close()
+            self.log = None
+
     def resetTest(self):
         # Reset the error counters and restart
         if self.id:
             self.master.after_cancel(self.id)
+            self.id = None
         if self.activity_id:
             self.master.after_cancel(self.activity_id)
+            self.activity_id = None
         #if self.pass_id:
         #    self.master.after_cancel(self.pass_id)
 
-        if self.csvfile:
-            self.csvfile.close()
-            self.csfvile = None
-            
-        self.board = None
-        self.device_open = False
-        self.test_count = 0
-        self.software_errors = 0
-        self.baseline_set = False
-        self.watchdog_count = 0
-        self.dio_errors = [0]*4
-        self.ao_errors = 0
-        self.ao_error_voltage = 0.0
-        self.current_failures = 0
+        self.stopWorkers()
+        self.results = [None]*len(self.addresses)
+        self.board_failed = [False]*len(self.addresses)
         
         self.pass_led.set(1)
         self.inst_pass_led.set(0)
 
         self.ready_led.set(0)
         
-        self.updateDisplay()
-        #self.master.after(500, self.establishBaseline)
+        self.updateDisplay(None)
+        self.updateBoardTable()
     
-    def establishBaseline(self):
-        self.id = None
-        self.current_failures = 0
-        
-        if self.device_open:
-            self.activity_led.set(1)
-            self.master.update()
-            self.activity_id = self.master.after(100, self.activityBlink)
-            
-            self.current_failures = 0
-            try:
-                
-                self.baseline_set = True
-                self.watchdog_count = 0
-                
-                # Create csv file with current date/time in file name
-                self.openCsvFile()
-
-                # go to the test loop
-                self.id = self.master.after(1000, self.updateInputs)
-            except FileNotFoundError:
-                messagebox.showerror("Error", "Cannot create CSV file")
-            except:
-                self.software_errors += 1
-                self.current_failures += 1
-                self.watchdog_count += 1
-                
-                # try again
-                self.id = self.master.after(1000, self.establishBaseline)
-                
-            self.updateDisplay()
-        else:
-            # Open the device
-            self.initBoard()
-            # schedule another attempt
-            self.id = self.master.after(500, self.establishBaseline)
-        
-    def openCsvFile(self):
-        if not os.path.isdir('./data'):
-            # create the data directory
-            os.mkdir('./data')
-        filename = "./data/mcc152_test_" + datetime.datetime.now().strftime(
-            "%d-%m-%Y_%H-%M-%S") + ".csv"
-        self.csvfile = open(filename, 'w')
-        
-        mystr = ("Time," + ",".join("DOut {}".format(value) for value in range(4)) +
-                 "," + ",".join("DIn {}".format(value) for value in range(4, 8)) +
-                 ",AO 0,Status\n")
-        self.csvfile.write(mystr)
-        
-    def updateInputs(self):
+    def boardChanged(self, _event):
+        # show the I/O of the selected board
+        self.selected = self.board_combo.current()
+        self.updateDisplay(self.results[self.selected])
+
+    def pollResults(self):
+        # Render the results the test threads have produced
         self.id = None
-        if self.device_open:
+        new_results = False
+        failed = False
+        for index, worker in enumerate(self.workers):
+            results = []
+            while True:
+                try:
+                    results.append(worker.results.get_nowait())
+                except queue.Empty:
+                    break
+
+            if results:
+                new_results = True
+                self.results[index] = results[-1]
+                # latch a failure from any of the cycles, not just the last one
+                if any(result.current_failures > 0 for result in results):
+                    self.board_failed[index] = True
+                    failed = True
+
+        if new_results:
             self.activity_led.set(1)
-            self.master.update()
+            if self.activity_id:
+                self.master.after_cancel(self.activity_id)
             self.activity_id = self.master.after(100, self.activityBlink)
-            
-            self.current_failures = 0
-            logstr = datetime.datetime.now().strftime("%H:%M:%S") + ","
-            
-            try:
-                # read the digital inputs and outputs
-                for index in range(4):
-                    self.d_out_values[index] = self.board.dio_output_read_bit(index)
-                    self.d_in_values[index] = self.board.dio_input_read_bit(index+4)
-                    if self.d_in_values[index] != self.d_out_values[index]:
-                        self.dio_errors[index] += 1
-                        self.current_failures += 1
-                        
-                    # set a new output value for next time
-                    self.board.dio_output_write_bit(index, random.getrandbits(1))
-                    
-                # read the DMM
-                dmm_voltage = self.dmm.read_voltage(0)
-                self.ao_error_voltage = dmm_voltage - self.ao_voltage
-                if abs(self.ao_error_voltage * 1000.0) > self.voltage_limit:
-                    self.ao_errors += 1
-                    self.current_failures += 1
-                    
-                self.watchdog_count = 0
-                            
-                logstr += (",".join(
-                               "{}".format(value) for value in self.d_out_values) + "," +
-                           ",".join(
-                               "{}".format(value) for value in self.d_in_values) +
-                           ",{:.6f},\n".format(dmm_voltage))
-                
-            except:
-                self.software_errors += 1
-                self.current_failures += 1
-                self.watchdog_count += 1
-                logstr += ",,,,,,,,,Software error\n"
-
-            self.csvfile.write(logstr)
-            self.test_count += 1
-            self.updateDisplay()
-
-            if (self.watchdog_check.var.get() == 1 and
-                self.watchdog_count >= 5):
-                self.board = None
-                self.device_open = False
-                self.watchdog_count = 0
-                self.ready_led.set(0)
-                self.master.after(500, self.updateInputs)
+
+            if failed:
+                self.inst_pass_led.set(2)
+                self.pass_led.set(2)
             else:
-                # schedule another update in 1 s
-                self.id = self.master.after(1000, self.updateInputs)
-        else:
-            # Open the device
-            self.initBoard()
-            # schedule another attempt
-            self.id = self.master.after(500, self.updateInputs)
-       
-    def updateDisplay(self):
+                self.inst_pass_led.set(1)
+            self.display_pending = True
+
+        # redraw at most once per DISPLAY_INTERVAL however many boards report
+        now = time.monotonic()
+        if self.display_pending and now >= self.next_display:
+            self.display_pending = False
+            self.next_display = now + DISPLAY_INTERVAL / 1000.0
+            lap = self.timer.start()
+            self.updateDisplay(self.results[self.selected])
+            self.updateBoardTable()
+            self.timer.lap("display", lap)
+
+        self.id = self.master.after(POLL_INTERVAL, self.pollResults)
+
+    def updateBoardTable(self):
+        for index in range(len(self.addresses)):
+            result = self.results[index]
+            if result is None:
+                self.view.setText(self.board_serial_labels[index], "00000000")
+                self.board_ready_leds[index].set(0)
+                self.view.setText(self.board_count_labels[index], "0")
+                self.view.setText(self.board_error_labels[index], "0")
+                self.view.setText(self.board_failure_labels[index], "0")
+            else:
+                self.view.setText(self.board_serial_labels[index],
+                                  result.serial)
+                self.board_ready_leds[index].set(1 if result.ready else 0)
+                self.view.setText(self.board_count_labels[index],
+                                  "{}".format(result.test_count))
+                self.view.setText(self.board_error_labels[index],
+                                  "{}".format(result.software_errors))
+                self.view.setText(self.board_failure_labels[index],
+                                  "{}".format(sum(result.dio_errors) +
+                                              result.ao_errors))
+            self.board_pass_leds[index].set(
+                2 if self.board_failed[index] else 1)
+
+    def updateDisplay(self, result):
+        if result is None:
+            # nothing measured yet
+            self.view.setVar(self.serial_number, "00000000")
+            for index in range(4):
+                self.view.setText(self.d_out_labels[index], "")
+                self.view.setText(self.d_in_labels[index], "")
+                self.view.setText(self.dio_failure_labels[index], "0")
+                self.view.setText(self.error_rate_labels[index], "")
+            self.view.setText(self.transition_rate_label, "")
+            self.view.setText(self.voltage_label, "")
+            self.view.setText(self.error_voltage_label, "")
+            self.view.setText(self.ao_failure_label, "0")
+            self.view.setText(self.inl_label, "")
+            self.view.setText(self.dnl_label, "")
+            self.view.setText(self.software_error_label, "0")
+            self.view.setText(self.test_count_label, "0")
+            return
+
+        self.view.setVar(self.serial_number, result.serial)
+        self.ready_led.set(1 if result.ready else 0)
+
         for index in range(4):
-            self.d_out_labels[index].config(
-                text="{}".format(self.d_out_values[index]))
-            self.d_in_labels[index].config(
-                text="{}".format(self.d_in_values[index]))
-            self.dio_failure_labels[index].config(
-                text="{}".format(self.dio_errors[index]))
-
-        self.voltage_label.config(text="{:.3f}".format(self.ao_voltage))
-        self.error_voltage_label.config(text="{:.3f}".format(self.ao_error_voltage * 1000.0))
-        self.ao_failure_label.config(text="{}".format(self.ao_errors))
-        
-        if self.current_failures > 0:
-            self.inst_pass_led.set(2)
-            self.pass_led.set(2)
+            self.view.setText(self.d_out_labels[index],
+                              "{}".format(result.d_out_values[index]))
+            self.view.setText(self.d_in_labels[index],
+                              "{}".format(result.d_in_values[index]))
+            self.view.setText(self.dio_failure_labels[index],
+                              "{}".format(result.dio_errors[index]))
+            if result.stress:
+                self.view.setText(self.error_rate_labels[index], "{:.1e}".format(
+                    result.stress.error_rates[index]))
+        if result.stress:
+            self.view.setText(self.transition_rate_label, "{:.0f}".format(
+                result.stress.transition_rate))
+
+        self.view.setText(self.voltage_label,
+                          "{:.3f}".format(result.ao_voltage))
+        if result.ao_error_voltage is None:
+            # only the first board is measured
+            self.view.setText(self.error_voltage_label, "")
         else:
-            self.inst_pass_led.set(1)
-        #self.pass_id = self.master.after(500, self.passBlink)
+            self.view.setText(self.error_voltage_label, "{:.3f}".format(
+                result.ao_error_voltage * 1000.0))
+        self.view.setText(self.ao_failure_label, "{}".format(result.ao_errors))
+        if result.sweep:
+            self.view.setText(self.inl_label,
+                              "{:.2f}".format(result.sweep.max_inl))
+            self.view.setText(self.dnl_label,
+                              "{:.2f}".format(result.sweep.max_dnl))
             
-        self.software_error_label.config(
-            text="{}".format(self.software_errors))
-        self.test_count_label.config(text="{}".format(self.test_count))
+        self.view.setText(self.software_error_label,
+                          "{}".format(result.software_errors))
+        self.view.setText(self.test_count_label,
+                          "{}".format(result.test_count))
 
     #def passBlink(self):
     #    self.pass_id = None
@@ -535,21 +644,27 @@ class ControlApp:
         self.activity_id = None
         self.activity_led.set(0)
         
+    def printTiming(self):
+        for worker in self.workers:
+            print("Board {} phase timing".format(worker.address))
+            for line in timingLines(worker.timer):
+                print(line)
+        print("Display timing")
+        for line in timingLines(self.timer):
+            print(line)
+        sys.stdout.flush()
+
     # Event handlers
     def close(self):
-        if self.board:
-            pass
-        
         if self.id:
             self.master.after_cancel(self.id)
         if self.activity_id:
             self.master.after_cancel(self.activity_id)
         #if self.pass_id:
         #    self.master.after_cancel(self.pass_id)
-        self.device_open = False
-        if self.csvfile:
-            self.csvfile.close()
-            self.csvfile = None
+        self.stopWorkers()
+        if self.metrics:
+            self.metrics.close()
         self.master.destroy()
 
 
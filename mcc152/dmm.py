@@ -0,0 +1,119 @@
+"""
+    HP 34401A DMM for the MCC 152 CE Test
+
+    Purpose:
+        Measure the MCC 152 analog output voltage
+
+    Description:
+        The DMM is reached through ce_common.instrument, by default over
+        GPIB with the linux-gpib Python bindings at address 5. Another
+        resource, such as the emulated DMM in ce_common.simdmm on
+        tcp:localhost:5025, is named by --dmm in the command line runner or
+        the DAQHATS_CE_DMM environment variable. The DMM may also be on
+        USBTMC or a LAN socket; the connection is kept open for the test and
+        reopened with backoff if the link is lost.
+
+        read_voltage() configures the DMM and waits for a reading. The test
+        cycle instead configures it once, starts a measurement with
+        initiate() and collects it with fetch() once the DIO check is done,
+        so the DMM integrates while the board is being read. For the analog
+        output sweep configure_voltage() sets a sample and trigger count, and
+        fetch_all() returns the whole reading buffer in one transaction.
+"""
+from ce_common.hats import SIMULATED
+from ce_common.instrument import (Instrument, InstrumentTimeout, ATTEMPTS,
+                                  BACKOFF_START, BACKOFF_MAX)
+import os
+
+DEFAULT_RESOURCE = "gpib:0:5"
+SIMULATED_RESOURCE = "sim:"
+RESOURCE_VARIABLE = "DAQHATS_CE_DMM"
+DEFAULT_TIMEOUT = 10.0     # s to wait for a reading
+FIRST_TIMEOUT = 0.1        # s to wait for the first write to fail
+MAX_READINGS = 512         # the size of the reading memory
+
+
+def dmmResource():
+    """
+    Return the DMM resource in DAQHATS_CE_DMM, or the GPIB default. With
+    simulated boards the default is the emulated DMM measuring them.
+    """
+    if SIMULATED:
+        return os.environ.get(RESOURCE_VARIABLE, "") or SIMULATED_RESOURCE
+    return os.environ.get(RESOURCE_VARIABLE, "") or DEFAULT_RESOURCE
+
+
+# HP 34401A DMM
+class DMM:
+    def __init__(self, resource=DEFAULT_RESOURCE, timeout=DEFAULT_TIMEOUT):
+        self.device = Instrument(resource, FIRST_TIMEOUT)
+        # first write after reboot times out, and the instrument does not
+        # retry timeouts, so retry it here with backoff; the last timeout
+        # is raised if the DMM still does not answer
+        delay = BACKOFF_START
+        for attempt in range(ATTEMPTS):
+            try:
+                self.device.write("*CLS")
+                break
+            except InstrumentTimeout:
+                if attempt == ATTEMPTS - 1:
+                    raise
+                self.device.sleep(delay)
+                delay = min(delay * 2, BACKOFF_MAX)
+        self.device.setTimeout(timeout)
+        
+        self.device.write("INP:IMP:AUTO ON")
+        self.device.write("CONF:VOLT:DC")
+        return
+
+    @staticmethod
+    def _settings(resolution, range):
+        # the SCPI range and resolution parameters
+        if resolution == 0:
+            return "DEF,DEF"
+        if range == 0:
+            return "DEF,MIN"
+        return "MIN,MIN"
+    
+    def __del__(self):
+        self.device.close()
+        
+    def read_voltage(self, resolution, range=0):
+        result = self.device.query(
+            ":MEAS:VOLT:DC? " + self._settings(resolution, range))
+        
+        value = float(result)
+        return value
+
+    def configure_voltage(self, resolution=0, range=0, samples=1,
+                          triggers=1):
+        """
+        Set up DC voltage readings for initiate() and fetch(). Each
+        initiate() takes samples readings for each of triggers triggers,
+        at most MAX_READINGS in all.
+        """
+        if samples * triggers > MAX_READINGS:
+            raise ValueError("The DMM holds at most {} readings".format(
+                MAX_READINGS))
+        self.device.write(":CONF:VOLT:DC " + self._settings(resolution, range))
+        self.device.write(":TRIG:SOUR IMM")
+        if samples * triggers > 1:
+            self.device.write(":SAMP:COUN {:d}".format(samples))
+            self.device.write(":TRIG:COUN {:d}".format(triggers))
+
+    def initiate(self):
+        """ Start a measurement and return without waiting for it. """
+        self.device.write(":INIT")
+
+    def fetch(self):
+        """ Wait for the measurement started by initiate() and return it. """
+        return float(self.device.query(":FETCH?"))
+
+    def fetch_all(self):
+        """ Wait for all the readings started by initiate(), as a list. """
+        return [float(value)
+                for value in self.device.query(":FETCH?").split(",")]
+    
+    def display(self, string):
+        self.device.write("DISP:TEXT \"{0:s}\"".format(string))
+        return
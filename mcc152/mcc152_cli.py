@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+    MCC 152 CE Test command line application
+
+    Purpose:
+        Run the MCC 152 CE test without a display
+
+    Description:
+        This app runs the same test as the MCC 152 CE Testing app on every
+        MCC 152 found, printing a status line for each board periodically and
+        logging to the same files. Stop it with Ctrl+C.
+"""
+import os
+import sys
+
+# the shared test modules are in the top level of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from ce_common.hats import HatIDs
+from ce_common.acquisition import find_boards
+from ce_common import headless
+from ce_common.instrument import InstrumentError
+from ce_common.diostress import PATTERNS
+from ce_common.aosweep import parseCodes, DEFAULT_CODES, DEFAULT_SAMPLES
+from ce_common.hats import mcc152
+from mcc152_worker import Mcc152Worker, DEFAULT_V_LIMIT, UPDATE_INTERVAL
+from dmm import (DMM, dmmResource, DEFAULT_TIMEOUT as DMM_TIMEOUT,
+                 MAX_READINGS)
+
+
+def countFailures(result):
+    return sum(result.dio_errors) + result.ao_errors
+
+
+def main():
+    parser = headless.argumentParser("MCC 152")
+    parser.add_argument("--no-dmm", action="store_true",
+                        help="skip the analog output check when no DMM is "
+                        "connected")
+    parser.add_argument("--dmm", metavar="RESOURCE",
+                        help="DMM resource, such as gpib:0:5 or "
+                        "usbtmc:/dev/usbtmc0 or tcp:localhost:5025 (default "
+                        "$DAQHATS_CE_DMM, or gpib:0:5 or sim: with simulated "
+                        "boards)")
+    parser.add_argument("--dmm-timeout", type=float, default=DMM_TIMEOUT,
+                        help="s to wait for a DMM reading (default {:g})"
+                        .format(DMM_TIMEOUT))
+    parser.add_argument("--update-interval", type=float,
+                        default=UPDATE_INTERVAL,
+                        help="s between checks (default {:g})"
+                        .format(UPDATE_INTERVAL))
+    parser.add_argument("--dio-pattern", choices=list(PATTERNS),
+                        help="run a DIO stress pattern between the checks: "
+                        "walking ones, PRBS7 or all pins toggling")
+    parser.add_argument("--sweep", nargs="?", metavar="CODES",
+                        const=",".join(str(code) for code in DEFAULT_CODES),
+                        help="step the analog outputs through the rising "
+                        "comma separated DAC codes, one per cycle (default "
+                        "{})".format(",".join(str(code)
+                                              for code in DEFAULT_CODES)))
+    parser.add_argument("--sweep-samples", type=int, default=DEFAULT_SAMPLES,
+                        help="DMM readings at each sweep step (default {})"
+                        .format(DEFAULT_SAMPLES))
+    args = parser.parse_args()
+    if args.update_interval <= 0:
+        parser.error("--update-interval must be more than 0")
+    if args.dmm_timeout <= 0:
+        parser.error("--dmm-timeout must be more than 0")
+
+    sweep_codes = None
+    if args.sweep:
+        try:
+            sweep_codes = parseCodes(args.sweep, mcc152.info().AO_MAX_CODE)
+        except ValueError as error:
+            parser.error(str(error))
+        if args.no_dmm:
+            parser.error("--sweep needs the DMM")
+        if args.sweep_samples < 1 or args.sweep_samples > MAX_READINGS:
+            parser.error("--sweep-samples must be 1 to {}".format(
+                MAX_READINGS))
+
+    dmm = None
+    if not args.no_dmm:
+        # the DMM measures the analog output of the first board
+        try:
+            dmm = DMM(args.dmm or dmmResource(), args.dmm_timeout)
+        except (InstrumentError, ImportError, OSError, ValueError) as error:
+            print("Cannot open the DMM: {}".format(error))
+            return 2
+
+    addresses = args.address or find_boards(HatIDs.MCC_152)
+    return headless.run(
+        "mcc152", addresses,
+        ["DOut {}".format(value) for value in range(4)] +
+        ["DIn {}".format(value) for value in range(4, 8)] + ["AO 0"] +
+        (["AO 0 set"] if sweep_codes else []),
+        lambda address, log, log_group: Mcc152Worker(
+            watchdog=args.watchdog, address=address, log=log,
+            log_group=log_group, dmm=dmm if log_group == 0 else None,
+            timing=args.timing, interval=args.update_interval,
+            pattern=args.dio_pattern, sweep_codes=sweep_codes,
+            sweep_samples=args.sweep_samples),
+        countFailures, args,
+        info={"voltage_limit_mV": DEFAULT_V_LIMIT, "dmm": dmm is not None,
+              "update_interval_s": args.update_interval,
+              "dio_pattern": args.dio_pattern or "",
+              "sweep_codes": args.sweep or "",
+              "sweep_samples": args.sweep_samples if sweep_codes else 0},
+        formats=["{}"]*8 + ["{:.6f}"]*(2 if sweep_codes else 1))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
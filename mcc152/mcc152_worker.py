@@ -0,0 +1,262 @@
+"""
+    MCC 152 CE Test acquisition
+
+    Purpose:
+        Check the MCC 152 digital I/O and analog outputs for the CE test
+
+    Description:
+        The worker checks the digital I/O loopback and, when it has a DMM,
+        the analog output voltage once a second on its own thread. Bits 0-3
+        are outputs wired to inputs 4-7 and get new random values every
+        cycle.
+
+        When there is a DMM its measurement is started at the beginning of
+        the cycle and fetched after the DIO check, so the DMM integrates
+        while the board is read.
+
+        The loopback check works on whole ports: one read of the output
+        port, one of the input port and one write of the next outputs. The
+        XOR of the outputs and the inputs shifted down to them gives the
+        bits that failed.
+
+        With a stress pattern the worker spends the wait between checks
+        running a ce_common.diostress pattern through the loopback pins as
+        fast as the bus allows, so short upsets are caught. Its errors are
+        added to the bit failures of the cycle.
+
+        With a sweep the worker with the DMM steps the analog outputs
+        through a ce_common.aosweep table of codes, one code per cycle. The
+        DMM takes a buffer of readings at each step, fetched in one
+        transaction, and the mean is checked against the limit. Each pass
+        through the table is evaluated for linearity.
+"""
+from collections import namedtuple
+from ce_common.hats import mcc152, DIOConfigItem
+from ce_common.acquisition import AcquisitionWorker
+from ce_common.aosweep import (AoSweep, DEFAULT_SAMPLES, sweepLines,
+                               sweepMetrics)
+from ce_common.diostress import DioStress, stressLines, stressMetrics
+from ce_common.instrument import instrumentLine, instrumentMetrics
+from ce_common.scheduler import DeadlineScheduler
+import datetime
+import random
+import time
+
+DEFAULT_V_LIMIT = 50       # mV
+UPDATE_INTERVAL = 1.0      # s between checks
+OUTPUT_MASK = 0x0F         # the output bits
+INPUT_SHIFT = 4            # input bit n+4 is wired to output bit n
+
+# Result record for the MCC 152. The counters are running totals so the GUI
+# only needs the most recent record. ao_error_voltage is None when the board
+# has no DMM, stress is None without a stress pattern and sweep is None until
+# a sweep pass is complete.
+Mcc152Result = namedtuple(
+    'Mcc152Result', ['address', 'timestamp', 'ready', 'serial',
+                     'd_out_values', 'd_in_values', 'dio_errors',
+                     'ao_voltage', 'ao_error_voltage', 'ao_errors',
+                     'current_failures', 'test_count', 'software_errors',
+                     'status', 'stress', 'sweep'])
+
+
+def portBits(value):
+    """ Return the four low bits of a port value as a list, bit 0 first. """
+    return [(value >> index) & 1 for index in range(4)]
+
+
+class Mcc152Worker(AcquisitionWorker):
+    def __init__(self, watchdog=False, address=0, log=None, log_group=0,
+                 dmm=None, timing=False, interval=UPDATE_INTERVAL,
+                 pattern=None, sweep_codes=None,
+                 sweep_samples=DEFAULT_SAMPLES):
+        AcquisitionWorker.__init__(self, "mcc152", address, watchdog, log,
+                                   log_group, timing)
+        self.dmm = dmm
+        self.voltage_limit = DEFAULT_V_LIMIT
+        self.ao_voltage = mcc152.info().AO_MAX_VOLTAGE
+        self.d_out_values = [0]*4
+        self.d_in_values = [0]*4
+        self.dio_errors = [0]*4
+        self.ao_errors = 0
+        self.ao_error_voltage = None if dmm is None else 0.0
+        self.scheduler = DeadlineScheduler(interval)
+        self.stress = DioStress(pattern) if pattern else None
+        self.sweep = None
+        if dmm is not None and sweep_codes:
+            info = mcc152.info()
+            self.sweep = AoSweep(sweep_codes, sweep_samples, info.AO_MAX_CODE,
+                                 info.AO_MAX_RANGE,
+                                 self.voltage_limit / 1000.0)
+            self.ao_voltage = self.sweep.voltage()
+
+    def initBoard(self):
+        # Try to initialize the device
+        try:
+            self.board = mcc152(self.address)
+            self.serial = self.board.serial()
+
+            # set DIO states and values
+            self.board.dio_reset()
+            self.board.dio_config_write_port(DIOConfigItem.DIRECTION,
+                                             OUTPUT_MASK ^ 0xFF)
+            self.board.dio_output_write_port(0x00)
+            self.d_out_values = [0]*4
+
+            self.d_in_values = portBits(
+                self.board.dio_input_read_port() >> INPUT_SHIFT)
+
+            # set analog output values
+            self.board.a_out_write_all([self.ao_voltage, self.ao_voltage])
+
+            if self.dmm:
+                self.dmm.configure_voltage(
+                    samples=self.sweep.samples if self.sweep else 1)
+
+            self.device_open = True
+        except:
+            self.board = None
+            self.software_errors += 1
+            self.current_failures += 1
+
+    def closeBoard(self):
+        self.board = None
+        self.device_open = False
+
+    def result(self, status=""):
+        return Mcc152Result(
+            self.address, datetime.datetime.now(), self.device_open,
+            self.serial, list(self.d_out_values), list(self.d_in_values),
+            list(self.dio_errors), self.ao_voltage, self.ao_error_voltage,
+            self.ao_errors, self.current_failures, self.test_count,
+            self.software_errors, status,
+            self.stress.stats() if self.stress else None,
+            self.sweep.result if self.sweep else None)
+
+    def establishBaseline(self):
+        self.current_failures = 0
+        self.baseline_set = True
+        self.scheduler.start()
+        self.watchdog_count = 0
+        self.publish(self.result())
+
+    def updateInputs(self):
+        self.current_failures = 0
+
+        lap = self.timer.start()
+        self.scheduler.wait(self.runStress if self.stress else self.sleep)
+        if self.stopped():
+            return
+        lap = self.timer.lap("updateInputs.wait", lap)
+
+        timestamp = datetime.datetime.now()
+        status = ""
+        values = []
+        if self.stress:
+            stress_errors = self.stress.takeErrors()
+            if any(stress_errors):
+                for index in range(4):
+                    self.dio_errors[index] += stress_errors[index]
+                self.current_failures += sum(stress_errors)
+                status = "DIO stress errors " + ",".join(
+                    str(index) for index in range(4) if stress_errors[index])
+        try:
+            if self.sweep:
+                # set the output of this step
+                self.ao_voltage = self.sweep.voltage()
+                self.board.a_out_write_all([self.ao_voltage, self.ao_voltage])
+            if self.dmm:
+                # the DMM measures during the DIO check
+                self.dmm.initiate()
+                lap = self.timer.lap("updateInputs.dmm_initiate", lap)
+
+            # read the digital outputs and inputs
+            out_port = self.board.dio_output_read_port() & OUTPUT_MASK
+            in_port = (self.board.dio_input_read_port() >>
+                       INPUT_SHIFT) & OUTPUT_MASK
+            errors = out_port ^ in_port
+            if errors:
+                for index in range(4):
+                    if (errors >> index) & 1:
+                        self.dio_errors[index] += 1
+                        self.current_failures += 1
+
+            # set new output values for next time
+            self.board.dio_output_write_port(random.getrandbits(4))
+
+            self.d_out_values = portBits(out_port)
+            self.d_in_values = portBits(in_port)
+
+            values = self.d_out_values + self.d_in_values
+            lap = self.timer.lap("updateInputs.dio", lap)
+
+            if self.dmm:
+                # read the DMM
+                if self.sweep:
+                    readings = self.dmm.fetch_all()
+                    self.timer.lap("updateInputs.dmm_fetch", lap)
+                    dmm_voltage, self.ao_error_voltage = self.sweep.add(
+                        readings)
+                else:
+                    dmm_voltage = self.dmm.fetch()
+                    self.timer.lap("updateInputs.dmm_fetch", lap)
+                    self.ao_error_voltage = dmm_voltage - self.ao_voltage
+                if abs(self.ao_error_voltage * 1000.0) > self.voltage_limit:
+                    self.ao_errors += 1
+                    self.current_failures += 1
+                values.append(dmm_voltage)
+                if self.sweep:
+                    values.append(self.ao_voltage)
+
+            self.watchdog_count = 0
+        except:
+            self.software_errors += 1
+            self.current_failures += 1
+            self.watchdog_count += 1
+            status = "; ".join(part for part in (status, "Software error")
+                               if part)
+            values = []
+
+        lap = self.timer.start()
+        self.writeLog(values, status, timestamp)
+        lap = self.timer.lap("updateInputs.log", lap)
+        self.test_count += 1
+        self.publish(self.result(status))
+        self.timer.lap("updateInputs.publish", lap)
+
+    def runStress(self, seconds):
+        # check the stress pattern until the next deadline
+        end = time.monotonic() + seconds
+        try:
+            self.stress.run(self.board.dio_output_write_port,
+                            self.readInputs, seconds, self.stopped)
+        except:
+            # the cycle's own check counts the board error
+            self.sleep(end - time.monotonic())
+
+    def readInputs(self):
+        return (self.board.dio_input_read_port() >> INPUT_SHIFT) & OUTPUT_MASK
+
+    def reportLines(self, summary=False):
+        # the DMM link, the stress results and the last sweep pass
+        lines = []
+        if self.dmm:
+            lines.append("DMM {} {}".format(
+                self.dmm.device.resource,
+                instrumentLine(self.dmm.device.stats())))
+        if self.stress:
+            stats = self.stress.stats()
+            lines.extend(stressLines(stats, max_bursts=None) if summary
+                         else stressLines(stats))
+        if self.sweep and self.sweep.result:
+            lines.extend(sweepLines(self.sweep.result, self.sweep.lsb))
+        return lines
+
+    def metrics(self):
+        metrics = []
+        if self.dmm:
+            metrics.extend(instrumentMetrics(self.dmm.device.stats()))
+        if self.stress:
+            metrics.extend(stressMetrics(self.stress.stats()))
+        if self.sweep:
+            metrics.extend(sweepMetrics(self.sweep))
+        return metrics
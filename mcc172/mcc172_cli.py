@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+    MCC 172 CE Test command line application
+
+    Purpose:
+        Run the MCC 172 CE test without a display
+
+    Description:
+        This app runs the same test as the MCC 172 CE Testing app on every
+        MCC 172 found, printing a status line for each board periodically and
+        logging to the same files. Stop it with Ctrl+C.
+"""
+import os
+import sys
+
+# the shared test modules are in the top level of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from ce_common.hats import mcc172, HatIDs
+from ce_common.acquisition import find_boards
+from ce_common import headless
+from ce_common.spectrum import DEFAULT_MASK
+from mcc172_worker import Mcc172Worker, DEFAULT_V_LIMIT, SCAN_RATE
+
+
+def main():
+    parser = headless.argumentParser("MCC 172")
+    parser.add_argument("--no-capture", action="store_true",
+                        help="do not save the raw samples around failures")
+    parser.add_argument("--no-spectrum", action="store_true",
+                        help="do not run the spectral mask test")
+    parser.add_argument("--mask", type=float, default=DEFAULT_MASK,
+                        help="spectral mask in mV rms per bin (default {:g})"
+                        .format(DEFAULT_MASK))
+    args = parser.parse_args()
+
+    addresses = args.address or find_boards(HatIDs.MCC_172)
+    return headless.run(
+        "mcc172", addresses, ["Ch {}".format(channel) for channel in
+                              range(mcc172.info().NUM_AI_CHANNELS)],
+        lambda address, log, log_group: Mcc172Worker(
+            watchdog=args.watchdog, address=address, log=log,
+            log_group=log_group, capture=not args.no_capture,
+            spectrum=not args.no_spectrum, mask=args.mask,
+            timing=args.timing),
+        headless.analogFailures, args,
+        info={"rate": SCAN_RATE, "voltage_limit_mV": DEFAULT_V_LIMIT,
+              "spectral_mask_mV": None if args.no_spectrum else args.mask},
+        units="mV")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""
+    MCC 172 CE Test acquisition
+
+    Purpose:
+        Acquire and check the MCC 172 inputs for the CE test
+
+    Description:
+        The worker alternates between a scan of the inputs, which is reduced
+        to an RMS value per channel and compared to the limits, and an
+        external trigger scan that must not be triggered, on its own thread.
+
+        Each scan has a phase of PHASE_TIME, or of the block length plus
+        PHASE_MARGIN for a block that does not fit, such as a whole second
+        of samples.
+"""
+from ce_common.hats import mcc172, SourceType, TriggerModes, OptionFlags
+from ce_common.acquisition import AcquisitionWorker, CycleResult
+from ce_common.blockstats import HAVE_NUMPY
+from ce_common.rms import RmsEngine
+from ce_common.capture import CaptureBuffer
+from ce_common.sessionstats import SessionStats
+from ce_common.spectrum import SpectrumMonitor
+from ce_common.scheduler import DeadlineScheduler
+import datetime
+
+DEFAULT_V_LIMIT = 4.985    # mV
+SCAN_SAMPLE_COUNT = 20000  # samples per channel, 0.39 s at SCAN_RATE
+SCAN_RATE = 51200          # Hz
+PHASE_TIME = 0.5           # s for each of the input and trigger scans
+PHASE_MARGIN = 0.1         # s a phase is longer than a longer scan block
+INPUT_PHASE = 0            # scheduler phase that reads the input scan
+TRIGGER_PHASE = 1          # scheduler phase that checks the trigger scan
+
+
+class Mcc172Worker(AcquisitionWorker):
+    def __init__(self, watchdog=False, address=0, log=None, log_group=0,
+                 samples_per_channel=SCAN_SAMPLE_COUNT, use_numpy=HAVE_NUMPY,
+                 capture=False, spectrum=False, mask=None, timing=False):
+        AcquisitionWorker.__init__(self, "mcc172", address, watchdog, log,
+                                   log_group, timing)
+        self.voltage_limit = DEFAULT_V_LIMIT
+        self.num_channels = mcc172.info().NUM_AI_CHANNELS
+        self.scan_count = samples_per_channel
+        self.scan_running = False
+        self.voltages = [0.0]*mcc172.info().NUM_AI_CHANNELS
+        self.failures = [0]*mcc172.info().NUM_AI_CHANNELS
+        self.rms_engine = RmsEngine(self.num_channels, use_numpy)
+        self.stats = SessionStats(
+            ["Ch {}".format(channel) for channel in range(self.num_channels)],
+            [self.voltage_limit]*self.num_channels)
+        if spectrum and HAVE_NUMPY:
+            # flag narrowband pickup that the RMS value hides
+            self.spectrum = SpectrumMonitor(self.num_channels, SCAN_RATE)
+            if mask is not None:
+                self.spectrum.setMask(mask)
+        if capture:
+            # keep the raw samples to save when a test fails
+            self.capture = CaptureBuffer("mcc172", address, self.num_channels,
+                                         SCAN_RATE)
+        # the input and trigger scans alternate at fixed times in each cycle,
+        # and each phase must be long enough for a scan block
+        self.phase_time = max(PHASE_TIME, float(samples_per_channel) /
+                              SCAN_RATE + PHASE_MARGIN)
+        self.scheduler = DeadlineScheduler(
+            2*self.phase_time, (self.phase_time, 2*self.phase_time))
+        self.trigger_errors = 0
+        self.last_trigger_error = False
+
+    def initBoard(self):
+        # Try to initialize the device
+        try:
+            self.board = mcc172(self.address)
+            self.serial = self.board.serial()
+
+            # turn off IEPE
+            self.board.iepe_config_write(0, 0)
+            self.board.iepe_config_write(1, 0)
+
+            # set ADC clock rate
+            self.board.a_in_clock_config_write(SourceType.LOCAL, SCAN_RATE)
+            sync = False
+            while not sync and not self.stopped():
+                stat = self.board.a_in_clock_config_read()
+                sync = stat.synchronized
+                self.sleep(0.1)
+
+            self.board.trigger_config(SourceType.LOCAL, TriggerModes.RISING_EDGE)
+
+            self.device_open = True
+        except:
+            self.board = None
+            self.software_errors += 1
+            self.current_failures += 1
+
+    def closeBoard(self):
+        if self.board:
+            self.stopScan()
+        self.board = None
+        self.device_open = False
+
+    def result(self, status=""):
+        return CycleResult(
+            self.address, datetime.datetime.now(), self.device_open,
+            self.serial, list(self.voltages), list(self.failures),
+            self.current_failures, self.test_count, self.software_errors,
+            self.trigger_errors, status, self.stats.summary(),
+            list(self.spectrum.flags) if self.spectrum else None, None)
+
+    def startScan(self, options):
+        chan_mask = 2**self.num_channels - 1
+        self.board.a_in_scan_start(chan_mask, self.scan_count, options)
+        self.scan_running = True
+
+    def stopScan(self):
+        self.scan_running = False
+        try:
+            self.board.a_in_scan_stop()
+            self.board.a_in_scan_cleanup()
+        except:
+            pass
+
+    def establishBaseline(self):
+        self.current_failures = 0
+        lap = self.timer.start()
+        try:
+            # Start the first scan
+            self.startScan(0)
+            self.timer.lap("establishBaseline.start_scan", lap)
+
+            self.baseline_set = True
+            self.scheduler.start()
+            self.watchdog_count = 0
+        except:
+            self.software_errors += 1
+            self.current_failures += 1
+            self.watchdog_count += 1
+            self.publish(self.result())
+
+            # try again
+            self.sleep(self.phase_time)
+            return
+
+        self.publish(self.result())
+
+    def scanRead(self, samples_per_channel, timeout):
+        """ Read scan data, into a NumPy array when NumPy is available. """
+        if self.rms_engine.use_numpy:
+            return self.board.a_in_scan_read_numpy(samples_per_channel, timeout)
+        return self.board.a_in_scan_read(samples_per_channel, timeout)
+
+    def checkLimits(self, rms):
+        """ Update the voltages and compare them to the limits. """
+        error = False
+        for channel in range(self.num_channels):
+            self.voltages[channel] = float(rms[channel]) * 1e3
+            if self.baseline_set == True:
+                # compare to limits
+                if ((self.voltages[channel] > self.voltage_limit) or
+                        (self.voltages[channel] < -self.voltage_limit)):
+                    self.current_failures += 1
+                    self.failures[channel] += 1
+                    error = True
+        return error
+
+    def checkTrigger(self):
+        """
+        Wait out the trigger test scan, count an error if it was triggered,
+        then start the next input scan.
+        """
+        lap = self.timer.start()
+        self.scheduler.wait(self.sleep, TRIGGER_PHASE)
+        if self.stopped():
+            return
+        lap = self.timer.lap("checkTrigger.wait", lap)
+
+        try:
+            # Read the last scan result
+            read_result = self.board.a_in_scan_read(0, 0)
+            if read_result.triggered:
+                self.trigger_errors += 1
+                self.current_failures += 1
+                self.last_trigger_error = True
+            self.board.a_in_scan_cleanup()
+            self.scan_running = False
+            lap = self.timer.lap("checkTrigger.read", lap)
+
+            # Start the next scan
+            self.startScan(0)
+            self.timer.lap("checkTrigger.start_scan", lap)
+        except:
+            self.stopScan()
+
+            self.software_errors += 1
+            self.current_failures += 1
+            self.watchdog_count += 1
+
+    def updateInputs(self):
+        self.current_failures = 0
+
+        # wait for the input scan
+        lap = self.timer.start()
+        self.scheduler.wait(self.sleep, INPUT_PHASE)
+        if self.stopped():
+            return
+        lap = self.timer.lap("updateInputs.wait", lap)
+
+        timestamp = datetime.datetime.now()
+        status = ""
+        values = []
+        try:
+            if not self.scan_running:
+                # the board was reopened or the last scan failed
+                raise RuntimeError("scan not running")
+
+            # Read the last scan data
+            read_result = self.scanRead(self.scan_count, -1)
+            lap = self.timer.lap("updateInputs.read", lap)
+
+            # Calculate RMS values for all channels in one pass
+            rms_values = self.rms_engine.calculate(read_result.data,
+                                                   self.scan_count)
+            lap = self.timer.lap("updateInputs.compute", lap)
+            error = self.checkLimits(rms_values)
+            self.stats.update(self.voltages[:self.num_channels], timestamp)
+            lap = self.timer.lap("updateInputs.limits", lap)
+            mask_flags = []
+            if self.spectrum:
+                mask_flags = self.spectrum.process(read_result.data,
+                                                   self.scan_count)
+                lap = self.timer.lap("updateInputs.spectrum", lap)
+            if self.capture:
+                self.capture.add(read_result.data, self.scan_count, timestamp)
+                if error:
+                    self.capture.trigger("Limit failure")
+                elif mask_flags:
+                    self.capture.trigger("Spectral mask")
+                lap = self.timer.lap("updateInputs.capture", lap)
+
+            self.board.a_in_scan_cleanup()
+            self.scan_running = False
+
+            # start a trigger test
+            self.startScan(OptionFlags.EXTTRIGGER)
+            self.timer.lap("updateInputs.start_scan", lap)
+
+            self.watchdog_count = 0
+
+            values = self.voltages[:self.num_channels]
+        except:
+            self.stopScan()
+
+            self.software_errors += 1
+            self.current_failures += 1
+            self.watchdog_count += 1
+            status = "Software error"
+
+        if self.scan_running:
+            self.checkTrigger()
+            if self.stopped():
+                return
+        else:
+            # restart the input scan for the next cycle
+            try:
+                self.startScan(0)
+            except:
+                pass
+
+        if not status and self.last_trigger_error:
+            status = "Trigger error"
+        if self.capture and self.last_trigger_error:
+            self.capture.trigger("Trigger error")
+
+        self.last_trigger_error = False
+
+        lap = self.timer.start()
+        self.writeLog(values, status, timestamp)
+        lap = self.timer.lap("updateInputs.log", lap)
+        self.test_count += 1
+        self.publish(self.result(status))
+        self.timer.lap("updateInputs.publish", lap)
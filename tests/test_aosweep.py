@@ -0,0 +1,124 @@
+"""
+    Tests of the analog output sweep
+
+    The sweep math is checked against known lines, and a sweep of a
+    simulated MCC 152 is measured with the emulated DMM.
+"""
+import os
+import sys
+import time
+import unittest
+
+os.environ["DAQHATS_SIM"] = "1"
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path[:0] = [ROOT, os.path.join(ROOT, "mcc152")]
+
+from ce_common import simhats
+from ce_common.aosweep import AoSweep, parseCodes, HAVE_NUMPY
+from ce_common.metrics import render
+from dmm import DMM
+from mcc152_worker import Mcc152Worker
+
+CODES = [0, 1024, 2048, 4095]
+LSB = 5.0 / 4096
+
+
+def sweepOnce(sweep, voltage):
+    # one pass with the readings voltage(code) at every step
+    for code in CODES:
+        sweep.add([voltage(code)]*sweep.samples)
+    return sweep.result
+
+
+class SweepMathTest(unittest.TestCase):
+    def sweeps(self):
+        sweeps = [AoSweep(CODES, 2, 4095, 5.0, 0.05, use_numpy=False)]
+        if HAVE_NUMPY:
+            sweeps.append(AoSweep(CODES, 2, 4095, 5.0, 0.05, use_numpy=True))
+        return sweeps
+
+    def testIdealLine(self):
+        for sweep in self.sweeps():
+            result = sweepOnce(sweep, lambda code: code * LSB)
+            self.assertEqual(result.passes, 1)
+            self.assertAlmostEqual(result.gain, LSB)
+            self.assertAlmostEqual(result.offset, 0.0)
+            self.assertAlmostEqual(result.max_inl, 0.0)
+            self.assertAlmostEqual(result.max_dnl, 0.0)
+            self.assertAlmostEqual(result.max_error, 0.0)
+
+    def testGainAndOffsetAreNotNonlinearity(self):
+        for sweep in self.sweeps():
+            result = sweepOnce(sweep,
+                               lambda code: 0.002 + code * LSB * 1.001)
+            self.assertAlmostEqual(result.gain, LSB * 1.001)
+            self.assertAlmostEqual(result.offset, 0.002)
+            self.assertAlmostEqual(result.max_inl, 0.0)
+            for dnl in result.dnl:
+                self.assertAlmostEqual(dnl, 0.001)
+
+    def testStepShowsInInlAndDnl(self):
+        # code 2048 reads 2 LSB high
+        for sweep in self.sweeps():
+            result = sweepOnce(sweep, lambda code: (code + 2 * (
+                code == 2048)) * LSB)
+            inl = [point.inl for point in result.points]
+            self.assertEqual(max(range(4), key=lambda i: inl[i]), 2)
+            self.assertAlmostEqual(result.dnl[1], 2.0 / 1024)
+            self.assertAlmostEqual(result.dnl[2], -2.0 / 2047)
+            self.assertAlmostEqual(result.points[2].error, 2 * LSB)
+
+    def testFailuresPerPoint(self):
+        sweep = AoSweep(CODES, 1, 4095, 5.0, 0.05)
+        for code in CODES:
+            mean, error = sweep.add([code * LSB + (0.1 if code == 1024
+                                                   else 0.0)])
+        self.assertEqual(sweep.failures, [0, 1, 0, 0])
+        self.assertAlmostEqual(error, 0.0)
+
+    def testParseCodes(self):
+        self.assertEqual(parseCodes("0,2048, 0xFFF", 4095), [0, 2048, 4095])
+        for text in ("0", "0,4096", "2048,1024", "0,0"):
+            self.assertRaises(ValueError, parseCodes, text, 4095)
+
+
+class SimulatedSweepTest(unittest.TestCase):
+    def testSweepPasses(self):
+        simhats.reset()
+        dmm = DMM("sim:3")
+        # readings in 1 ms so a pass takes a fraction of a second
+        dmm.device.transport.instrument.latency = 0.001
+        worker = Mcc152Worker(address=3, dmm=dmm, interval=0.02,
+                              sweep_codes=CODES, sweep_samples=4)
+        worker.start()
+        try:
+            deadline = time.monotonic() + 10.0
+            while (time.monotonic() < deadline and
+                   (worker.sweep.passes < 2 or worker.test_count < 8)):
+                time.sleep(0.02)
+        finally:
+            worker.stop()
+        self.assertGreaterEqual(worker.sweep.passes, 2)
+        self.assertEqual(worker.software_errors, 0)
+        self.assertEqual(worker.ao_errors, 0)
+        result = worker.sweep.result
+        self.assertLess(result.max_error, 0.001)
+        self.assertLess(result.max_inl, 0.5)
+        self.assertEqual([point.failures for point in result.points],
+                         [0]*len(CODES))
+
+        # the generic report and metrics get the sweep through the hooks
+        lines = worker.reportLines(summary=True)
+        self.assertTrue(lines[0].startswith("DMM sim:3 "))
+        self.assertTrue(any(line.startswith("AO sweep: ") for line in lines))
+        text = render("MCC 152", [worker])
+        self.assertIn('daqhats_ce_ao_sweep_passes_total{product="MCC 152",'
+                      'address="3"}', text)
+        self.assertEqual(text.count("# TYPE daqhats_ce_ao_sweep_error_volts "),
+                         1)
+        self.assertIn('daqhats_ce_instrument_seconds_count{product="MCC 152",'
+                      'address="3",resource="sim:3"}', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+    Tests of the binary session log
+
+    A log is written to a temporary directory, read back with readLog()
+    and converted to CSV with bin2csv.
+"""
+import csv
+import datetime
+import math
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from ce_common import bin2csv
+from ce_common.binlog import (BinaryLog, readLog, statusFlags, statusText,
+                              epochNs, MAGIC, CYCLE_FAILED, OPEN_TC,
+                              COMMON_MODE, SOFTWARE_ERROR, OTHER_STATUS)
+
+COLUMNS = ["Ch 0", "Ch 1", "Ch 2"]
+GROUPS = ["Bd 0", "Bd 1"]
+START = datetime.datetime(2026, 10, 17, 12, 0, 0, 123456)
+
+
+class StatusTest(unittest.TestCase):
+    def testFlags(self):
+        self.assertEqual(statusFlags(""), 0)
+        self.assertEqual(statusFlags("", failed=True), CYCLE_FAILED)
+        self.assertEqual(statusFlags("Open TC 1; Common mode 3"),
+                         OPEN_TC | COMMON_MODE)
+        self.assertEqual(statusFlags("Something else"), OTHER_STATUS)
+
+    def testText(self):
+        self.assertEqual(statusText(OPEN_TC | COMMON_MODE | CYCLE_FAILED),
+                         "Open TC; Common mode")
+        self.assertEqual(statusText(SOFTWARE_ERROR), "Software error")
+
+    def testEpochKeepsTheMicroseconds(self):
+        self.assertEqual(epochNs(START) % 1000000000, 123456000)
+
+
+class BinaryLogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def writeLog(self):
+        log = BinaryLog("mcc118", COLUMNS, GROUPS,
+                        directory=self.directory.name, info={"rate": 1000})
+        log.describe(0, address=0, serial="01234567")
+        log.describe(1, address=1, serial="89ABCDEF")
+        for cycle in range(3):
+            timestamp = START + datetime.timedelta(seconds=cycle)
+            log.write(0, cycle, timestamp, [0.1 * cycle, 1 / 3.0, -2.5e-7])
+            # board 1 misses a value and fails the last cycle
+            log.write(1, cycle, timestamp, [cycle, None],
+                      "Open TC 1" if cycle == 2 else "", failed=cycle == 2)
+        log.close()
+        return log.filename
+
+    def testRoundTrip(self):
+        header, infos, records = readLog(self.writeLog())
+        self.assertEqual(header["board"], "mcc118")
+        self.assertEqual(header["columns"], COLUMNS)
+        self.assertEqual(header["groups"], GROUPS)
+        self.assertEqual(header["rate"], 1000)
+        self.assertEqual([info["serial"] for info in infos],
+                         ["01234567", "89ABCDEF"])
+        self.assertEqual(len(records), 6)
+        timestamp, cycle, group, flags, values = records[4]
+        self.assertEqual((cycle, group, flags), (2, 0, 0))
+        self.assertEqual(timestamp, epochNs(START) + 2000000000)
+        # the values are kept at full precision
+        self.assertEqual(values[1], 1 / 3.0)
+        self.assertEqual(values[2], -2.5e-7)
+        _, cycle, group, flags, values = records[5]
+        self.assertEqual(flags, OPEN_TC | CYCLE_FAILED)
+        self.assertEqual(values[0], 2.0)
+        self.assertTrue(math.isnan(values[1]) and math.isnan(values[2]))
+
+    def testCutRecordIsIgnored(self):
+        filename = self.writeLog()
+        with open(filename, 'rb+') as logfile:
+            logfile.truncate(os.path.getsize(filename) - 5)
+        _, _, records = readLog(filename)
+        self.assertEqual(len(records), 5)
+
+    def testNotALog(self):
+        filename = os.path.join(self.directory.name, "other.bin")
+        with open(filename, 'wb') as logfile:
+            logfile.write(b"not a log" + MAGIC)
+        with self.assertRaises(ValueError):
+            readLog(filename)
+
+    def testConvertToCsv(self):
+        csv_filename = bin2csv.convert(self.writeLog())
+        with open(csv_filename) as csv_file:
+            rows = list(csv.reader(csv_file))
+        self.assertEqual(rows[0], ["Time"] + [
+            "{} {}".format(group, column) for group in GROUPS
+            for column in COLUMNS + ["Status"]])
+        self.assertEqual(len(rows), 4)
+        last = rows[3]
+        self.assertEqual(last[0], "2026-10-17 12:00:02.123456")
+        # nine significant digits by default
+        self.assertEqual(last[2], "0.333333333")
+        self.assertEqual(last[5:], ["2", "", "", "Open TC"])
+
+    def testConvertWithAFormat(self):
+        csv_filename = os.path.join(self.directory.name, "exact.csv")
+        bin2csv.convert(self.writeLog(), csv_filename, "{!r}")
+        with open(csv_filename) as csv_file:
+            rows = list(csv.reader(csv_file))
+        self.assertEqual(float(rows[1][2]), 1 / 3.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+    Tests of the block statistics
+
+    The list path is checked against known values and the NumPy path, when
+    NumPy is installed, against the list path.
+"""
+import os
+import random
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from ce_common.blockstats import BlockStats, numpy, HAVE_NUMPY
+
+NUM_CHANNELS = 3
+SAMPLES = 1000
+
+
+def scanData(samples=SAMPLES, extra=5):
+    """ Interleaved samples with an offset per channel and a stale tail. """
+    generator = random.Random(118)
+    data = [channel + generator.uniform(-0.5, 0.5)
+            for _ in range(samples) for channel in range(NUM_CHANNELS)]
+    # samples past the block are left from an earlier read
+    return data + [100.0] * extra
+
+
+class BlockStatsTest(unittest.TestCase):
+    def testListPath(self):
+        stats = BlockStats(2, use_numpy=False)
+        means = stats.calculate([1.0, -2.0, 3.0, 2.0, 5.0, 0.0, 9.0], 3)
+        self.assertEqual(means, [3.0, 0.0])
+        self.assertEqual(stats.minimum, [1.0, -2.0])
+        self.assertEqual(stats.maximum, [5.0, 2.0])
+        self.assertEqual(stats.peak_to_peak, [4.0, 4.0])
+
+    def testResultsAreReused(self):
+        stats = BlockStats(NUM_CHANNELS, use_numpy=False)
+        means = stats.calculate(scanData(), SAMPLES)
+        self.assertIs(stats.calculate(scanData(), SAMPLES), means)
+
+    @unittest.skipUnless(HAVE_NUMPY, "NumPy is not installed")
+    def testNumpyMatchesList(self):
+        data = scanData()
+        expected = BlockStats(NUM_CHANNELS, use_numpy=False)
+        expected.calculate(data, SAMPLES)
+        stats = BlockStats(NUM_CHANNELS)
+        self.assertTrue(stats.use_numpy)
+        stats.calculate(numpy.array(data), SAMPLES)
+        for name in ("mean", "minimum", "maximum", "peak_to_peak"):
+            for channel in range(NUM_CHANNELS):
+                self.assertAlmostEqual(getattr(stats, name)[channel],
+                                       getattr(expected, name)[channel],
+                                       places=12, msg=name)
+
+    @unittest.skipUnless(HAVE_NUMPY, "NumPy is not installed")
+    def testListDataOnTheNumpyPath(self):
+        # the hats return lists when the buffer is not a NumPy array
+        stats = BlockStats(NUM_CHANNELS)
+        stats.calculate(scanData(), SAMPLES)
+        self.assertLess(max(stats.maximum), 100.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+    Tests of the CSV session log
+
+    The rows of several boards are written out of order, with a board
+    that stops reporting, and read back from a temporary directory.
+"""
+import csv
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from ce_common.csvlog import CsvLog, LAG_CYCLES
+
+START = datetime.datetime(2026, 10, 17, 12, 0, 0)
+
+
+class CsvLogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def openLog(self, groups=None, formats="{:.1f}"):
+        return CsvLog("mcc128", ["Ch 0", "Ch 1"], groups,
+                      directory=self.directory.name, formats=formats,
+                      queue_size=0)
+
+    def rows(self, log):
+        log.close()
+        with open(log.filename) as csv_file:
+            return list(csv.reader(csv_file))
+
+    def time(self, cycle):
+        return START + datetime.timedelta(seconds=cycle)
+
+    def testSingleBoard(self):
+        log = self.openLog(formats=["{:.1f}", "{:.3f}"])
+        log.write(0, 0, self.time(0), [1.25, 2.0])
+        log.write(0, 1, self.time(1), [None], "Software error")
+        self.assertEqual(self.rows(log), [
+            ["Time", "Ch 0", "Ch 1", "Status"],
+            ["12:00:00", "1.2", "2.000", ""],
+            ["12:00:01", "", "", "Software error"]])
+
+    def testRowWaitsForEveryBoard(self):
+        log = self.openLog(["Bd 0", "Bd 1"])
+        log.write(1, 0, self.time(0), [3.0, 4.0])
+        log.write(0, 0, self.time(0), [1.0, 2.0])
+        # board 1 is ahead; its cycle 1 waits for board 0
+        log.write(1, 1, self.time(1), [7.0, 8.0])
+        log.write(0, 1, self.time(1), [5.0, 6.0])
+        rows = self.rows(log)
+        self.assertEqual(rows[0], ["Time", "Bd 0 Ch 0", "Bd 0 Ch 1",
+                                   "Bd 0 Status", "Bd 1 Ch 0", "Bd 1 Ch 1",
+                                   "Bd 1 Status"])
+        self.assertEqual(rows[1:], [
+            ["12:00:00", "1.0", "2.0", "", "3.0", "4.0", ""],
+            ["12:00:01", "5.0", "6.0", "", "7.0", "8.0", ""]])
+
+    def testBoardLeftBehind(self):
+        log = self.openLog(["Bd 0", "Bd 1"])
+        lines = []
+        log.writer.write = lines.append
+        for cycle in range(LAG_CYCLES):
+            log.write(0, cycle, self.time(cycle), [float(cycle), 0.0])
+        self.assertEqual(lines, [])
+        # board 1 has not reported, so cycle 0 is written without it once
+        # board 0 is LAG_CYCLES ahead
+        log.write(0, LAG_CYCLES, self.time(LAG_CYCLES), [9.0, 0.0])
+        self.assertEqual(lines, ["12:00:00,0.0,0.0,,,,\n"])
+        log.close()
+        self.assertEqual(len(lines), LAG_CYCLES + 1)
+
+    def testWriteAfterClose(self):
+        log = self.openLog()
+        log.close()
+        log.write(0, 0, self.time(0), [1.0, 2.0])
+        with open(log.filename) as csv_file:
+            self.assertEqual(len(list(csv.reader(csv_file))), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
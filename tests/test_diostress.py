@@ -0,0 +1,154 @@
+"""
+    Tests of the DIO stress patterns
+
+    The patterns are checked against their definitions and DioStress is run
+    on a loopback that is a list, with faults injected into chosen checks.
+"""
+import itertools
+import os
+import sys
+import time
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from ce_common.diostress import (DioStress, PATTERNS, NUM_PINS, walkingOnes,
+                                 prbs7, allToggle, stressLines, stressMetrics)
+
+
+def take(pattern, count):
+    return list(itertools.islice(pattern, count))
+
+
+def prbsBits(count):
+    # the values of the prbs pattern as a bit stream, first bit first
+    bits = []
+    for value in take(prbs7(), count):
+        bits.extend((value >> shift) & 1
+                    for shift in reversed(range(NUM_PINS)))
+    return bits
+
+
+class PatternTest(unittest.TestCase):
+    def testWalkingOnes(self):
+        self.assertEqual(take(walkingOnes(), 6), [1, 2, 4, 8, 1, 2])
+
+    def testToggle(self):
+        self.assertEqual(take(allToggle(), 4), [0, 15, 0, 15])
+
+    def testPrbs7IsMaximalLength(self):
+        bits = prbsBits(2 * 127)
+        # the bit stream repeats every 127 bits and no sooner
+        self.assertEqual(bits[:127], bits[127:254])
+        for period in range(1, 127):
+            if 127 % period == 0:
+                self.assertNotEqual(bits[:127 - period], bits[period:127])
+        # a maximal length sequence has one more one than zeros
+        self.assertEqual(sum(bits[:127]), 64)
+        # every nonzero 7 bit state appears once in a period
+        states = set(tuple((bits + bits)[index:index + 7])
+                     for index in range(127))
+        self.assertEqual(len(states), 127)
+        self.assertNotIn((0,)*7, states)
+
+    def testPrbs7Values(self):
+        # four bits a value and 127 bits a period, so 127 values a period
+        values = take(prbs7(), 2 * 127)
+        self.assertEqual(values[:127], values[127:])
+        self.assertTrue(all(0 <= value < 16 for value in values))
+
+    def testPatterns(self):
+        self.assertEqual(list(PATTERNS), ["walk", "prbs", "toggle"])
+
+
+class Loopback(object):
+    """ Output pins wired to the inputs, with faults at chosen checks. """
+    def __init__(self, checks, faults=None, pauses=()):
+        self.checks = checks
+        self.faults = faults or {}
+        self.pauses = pauses
+        self.written = []
+
+    def write(self, value):
+        self.written.append(value)
+
+    def read(self):
+        index = len(self.written) - 1
+        if index in self.pauses:
+            time.sleep(0.05)
+        return self.written[-1] ^ self.faults.get(index, 0)
+
+    def stopped(self):
+        return len(self.written) >= self.checks
+
+
+class DioStressTest(unittest.TestCase):
+    def runStress(self, stress, loopback):
+        return stress.run(loopback.write, loopback.read, 10.0,
+                          loopback.stopped)
+
+    def testCleanRun(self):
+        stress = DioStress("walk")
+        loopback = Loopback(8)
+        self.assertEqual(self.runStress(stress, loopback), [0]*NUM_PINS)
+        self.assertEqual(loopback.written, [1, 2, 4, 8]*2)
+        stats = stress.stats()
+        self.assertEqual(stats.checks, 8)
+        # from 0 to 1 is one transition, each later step is two
+        self.assertEqual(stats.transitions, 15)
+        self.assertEqual(stats.burst_count, 0)
+
+    def testPatternContinuesBetweenRuns(self):
+        stress = DioStress("toggle")
+        self.runStress(stress, Loopback(3))
+        loopback = Loopback(2)
+        self.runStress(stress, loopback)
+        self.assertEqual(loopback.written, [15, 0])
+        # 0 15 0 then 15 0: every step toggles all four pins
+        self.assertEqual(stress.stats().transitions, 4 * NUM_PINS)
+
+    def testErrorsAndBursts(self):
+        stress = DioStress("prbs")
+        # two errors close together, then one after a pause
+        loopback = Loopback(20, faults={3: 0x1, 4: 0x6, 15: 0x8},
+                            pauses=(10,))
+        errors = self.runStress(stress, loopback)
+        self.assertEqual(errors, [1, 1, 1, 1])
+        self.assertEqual(stress.takeErrors(), [1, 1, 1, 1])
+        self.assertEqual(stress.takeErrors(), [0]*NUM_PINS)
+        stats = stress.stats()
+        self.assertEqual(stats.bit_errors, [1, 1, 1, 1])
+        self.assertEqual(stats.error_rates, [1 / 20.0]*NUM_PINS)
+        self.assertEqual(stats.burst_count, 2)
+        self.assertEqual([(burst.errors, burst.bits)
+                          for burst in stats.bursts], [(3, 0x7), (1, 0x8)])
+
+    def testErrorsKeptWhenTheBoardFails(self):
+        stress = DioStress("walk")
+        loopback = Loopback(10, faults={1: 0x2})
+
+        def read():
+            if len(loopback.written) == 3:
+                raise OSError("board error")
+            return loopback.read()
+        with self.assertRaises(OSError):
+            stress.run(loopback.write, read, 10.0, loopback.stopped)
+        self.assertEqual(stress.takeErrors(), [0, 1, 0, 0])
+        self.assertEqual(stress.stats().checks, 2)
+
+    def testReport(self):
+        stress = DioStress("walk")
+        self.runStress(stress, Loopback(8, faults={2: 0x4}))
+        lines = stressLines(stress.stats())
+        self.assertTrue(lines[0].startswith("DIO stress walk: 8 checks"))
+        self.assertEqual(lines[1], "1 error bursts:")
+        self.assertTrue(lines[2].endswith("1 errors, pins 2"))
+        metrics = stressMetrics(stress.stats())
+        errors = [(metric.labels, metric.value) for metric in metrics
+                  if metric.name == "dio_stress_errors_total"]
+        self.assertEqual(errors[2], ([("pattern", "walk"), ("bit", 2)], 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+"""
+    Tests of the instrument connection
+
+    A scripted transport stands in for the bus so the retries, the backoff
+    between them and the reconnect counting can be checked without waiting,
+    and the MCC 152 DMM can be opened as if it had just rebooted.
+"""
+import functools
+import os
+import sys
+import unittest
+from unittest import mock
+
+os.environ["DAQHATS_SIM"] = "1"
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path[:0] = [ROOT, os.path.join(ROOT, "mcc152")]
+
+from ce_common import instrument
+from ce_common.instrument import (Instrument, InstrumentError,
+                                  InstrumentTimeout, instrumentMetrics)
+import dmm
+
+
+class ScriptedTransport(object):
+    """
+    Replies to queries from a shared script; exceptions are raised. A write
+    raises the exception at the head of the script, if there is one.
+    """
+    def __init__(self, script):
+        self.script = script
+        self.timeout = None
+        self.closed = False
+        self.written = []
+
+    def setTimeout(self, seconds):
+        self.timeout = seconds
+
+    def write(self, command):
+        if self.script and isinstance(self.script[0], Exception):
+            raise self.script.pop(0)
+        self.written.append(command)
+
+    def query(self, _command):
+        reply = self.script.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def local(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class ScriptedTest(unittest.TestCase):
+    def connect(self, script, attempts=5):
+        # every reopen gets a new transport reading the same script
+        self.transports = []
+
+        def openInstrument(_resource):
+            transport = ScriptedTransport(script)
+            self.transports.append(transport)
+            return transport
+        patcher = mock.patch.object(instrument, "openInstrument",
+                                    openInstrument)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.delays = []
+        return Instrument("tcp:dmm", timeout=2.0, attempts=attempts,
+                          sleep=self.delays.append)
+
+
+class InstrumentTest(ScriptedTest):
+    def testTransactionKeepsTheConnection(self):
+        device = self.connect(["1", "2"])
+        self.assertEqual(device.query("READ?"), "1")
+        self.assertEqual(device.query("READ?"), "2")
+        self.assertEqual(len(self.transports), 1)
+        self.assertEqual(self.transports[0].timeout, 2.0)
+        stats = device.stats()
+        self.assertEqual((stats.transactions, stats.errors, stats.reconnects),
+                         (2, 0, 0))
+        self.assertEqual(stats.latency.count, 2)
+        self.assertEqual(self.delays, [])
+
+    def testRetryBacksOffAndReconnects(self):
+        device = self.connect([OSError("reset"), OSError("reset"),
+                               OSError("reset"), "+1.0"])
+        self.assertEqual(device.query("READ?"), "+1.0")
+        self.assertEqual(self.delays, [0.1, 0.2, 0.4])
+        # each failure closes the transport and the next attempt reopens it
+        self.assertEqual(len(self.transports), 4)
+        self.assertTrue(all(transport.closed
+                            for transport in self.transports[:3]))
+        stats = device.stats()
+        self.assertEqual((stats.transactions, stats.errors, stats.reconnects),
+                         (1, 3, 3))
+        self.assertTrue(stats.connected)
+
+    def testBackoffIsCapped(self):
+        device = self.connect([OSError("reset")]*7 + ["+1.0"], attempts=8)
+        device.query("READ?")
+        self.assertEqual(self.delays, [0.1, 0.2, 0.4, 0.8, 1.6, 2.0, 2.0])
+
+    def testErrorAfterTheLastAttempt(self):
+        device = self.connect([OSError("reset")]*5)
+        with self.assertRaises(InstrumentError) as context:
+            device.query("READ?")
+        self.assertIn("tcp:dmm", str(context.exception))
+        self.assertIn("reset", str(context.exception))
+        self.assertEqual(self.delays, [0.1, 0.2, 0.4, 0.8])
+        stats = device.stats()
+        self.assertEqual((stats.transactions, stats.errors), (0, 5))
+        self.assertFalse(stats.connected)
+
+    def testTimeoutIsNotRetried(self):
+        # a transaction that timed out is left to the caller to retry
+        device = self.connect([InstrumentTimeout("no reply"), "+1.0"])
+        with self.assertRaises(InstrumentTimeout):
+            device.query("READ?")
+        self.assertEqual(self.delays, [])
+        self.assertEqual(device.errors, 1)
+        self.assertTrue(self.transports[0].closed)
+        self.assertIsNone(device.transport)
+        # the next transaction reopens the connection
+        self.assertEqual(device.query("READ?"), "+1.0")
+        self.assertEqual(device.reconnects, 1)
+
+    def testBadResourceIsNotRetried(self):
+        device = self.connect([])
+        with mock.patch.object(instrument, "openInstrument",
+                               side_effect=ValueError("bad resource")):
+            with self.assertRaises(ValueError):
+                device.query("READ?")
+        self.assertEqual(self.delays, [])
+        self.assertEqual(device.reconnects, 0)
+
+    def testReconnectCountsOnlyASuccessfulReopen(self):
+        device = self.connect(["+1.0", OSError("reset"), "+2.0"])
+        device.query("READ?")
+        with mock.patch.object(instrument, "openInstrument",
+                               side_effect=OSError("refused")):
+            with self.assertRaises(InstrumentError):
+                device.query("READ?")
+        self.assertEqual(device.reconnects, 0)
+        self.assertEqual(device.query("READ?"), "+2.0")
+        self.assertEqual(device.reconnects, 1)
+
+    def testMetrics(self):
+        device = self.connect(["+1.0"])
+        device.query("READ?")
+        metrics = {metric.name: metric
+                   for metric in instrumentMetrics(device.stats())}
+        self.assertEqual(metrics["instrument_transactions_total"].value, 1)
+        self.assertEqual(metrics["instrument_connected"].labels,
+                         [("resource", "tcp:dmm")])
+        self.assertEqual(metrics["instrument_seconds"].kind, "histogram")
+
+
+class DmmTest(ScriptedTest):
+    def connect(self, script, attempts=5):
+        ScriptedTest.connect(self, script, attempts)
+        # the DMM's instrument records its backoff instead of sleeping
+        patcher = mock.patch.object(
+            dmm, "Instrument",
+            functools.partial(Instrument, sleep=self.delays.append))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def testFirstWriteAfterRebootIsRetried(self):
+        # the first *CLS times out, the second is answered
+        self.connect([InstrumentTimeout("no reply")])
+        device = dmm.DMM("gpib:0:5", timeout=3.0).device
+        self.assertEqual(self.delays, [0.1])
+        self.assertEqual(self.transports[-1].written,
+                         ["*CLS", "INP:IMP:AUTO ON", "CONF:VOLT:DC"])
+        self.assertEqual(self.transports[-1].timeout, 3.0)
+        self.assertEqual((device.errors, device.reconnects), (1, 1))
+
+    def testDmmThatNeverAnswers(self):
+        self.connect([InstrumentTimeout("no reply")]*dmm.ATTEMPTS)
+        with self.assertRaises(InstrumentTimeout):
+            dmm.DMM("gpib:0:5")
+        self.assertEqual(self.delays, [0.1, 0.2, 0.4, 0.8])
+        self.assertEqual(len(self.transports), dmm.ATTEMPTS)
+
+
+if __name__ == "__main__":
+    unittest.main()
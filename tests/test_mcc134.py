@@ -0,0 +1,89 @@
+"""
+    Tests of the MCC 134 thermocouple fault classification
+
+    The raw ADC codes are classified directly and a poller reads a
+    simulated MCC 134 with an open and an out of range input.
+"""
+import os
+import sys
+import unittest
+
+os.environ["DAQHATS_SIM"] = "1"
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path[:0] = [ROOT, os.path.join(ROOT, "mcc134")]
+
+from ce_common import simhats
+from ce_common.hats import mcc134, TcTypes
+from mcc134_worker import (Mcc134Poller, classifyFault, faultStatus, lsbSize,
+                           parseTcType, tcTypeName, OPEN_TC, COMMON_MODE)
+
+ADDRESS = 2
+TC_OFFSET = 1000e-6      # V
+
+
+class ClassifyTest(unittest.TestCase):
+    def testCodes(self):
+        info = mcc134.info()
+        self.assertEqual(classifyFault(info.AI_MAX_CODE), OPEN_TC)
+        self.assertEqual(classifyFault(info.AI_MIN_CODE), COMMON_MODE)
+        self.assertIsNone(classifyFault(info.AI_MAX_CODE - 1))
+        self.assertIsNone(classifyFault(info.AI_MIN_CODE + 1))
+        self.assertIsNone(classifyFault(0))
+
+    def testLsbSize(self):
+        self.assertAlmostEqual(lsbSize() * 2**24, 0.15625)
+
+    def testFaultStatus(self):
+        self.assertEqual(faultStatus([None] * 4), "")
+        self.assertEqual(faultStatus([OPEN_TC, COMMON_MODE, None, OPEN_TC]),
+                         "Open TC 0,3; Common mode 1")
+
+    def testTcTypes(self):
+        self.assertEqual(parseTcType("k"), TcTypes.TYPE_K)
+        self.assertEqual(parseTcType("TYPE_T"), TcTypes.TYPE_T)
+        self.assertEqual(parseTcType("off"), TcTypes.DISABLED)
+        self.assertEqual(tcTypeName(TcTypes.TYPE_J), "J")
+        self.assertEqual(tcTypeName(TcTypes.DISABLED), "Off")
+        with self.assertRaises(ValueError):
+            parseTcType("Z")
+
+
+class PollerTest(unittest.TestCase):
+    def setUp(self):
+        settings = dict(open_tc=[1], common_mode_tc=[2], tc_offset=TC_OFFSET,
+                        tc_noise=0.0, cjc_noise=0.0)
+        self.addCleanup(simhats.configure, **{
+            name: getattr(simhats.config, name) for name in settings})
+        simhats.configure(**settings)
+        simhats.reset()
+
+    def testFaultsAreClassifiedAndCounted(self):
+        board = mcc134(ADDRESS)
+        types = [TcTypes.TYPE_T] * 3 + [TcTypes.DISABLED]
+        poller = Mcc134Poller(board, ADDRESS, tc_types=types)
+        poller.configure()
+        poller.poll()
+        readings = poller.latest()
+        self.assertEqual(readings.sequence, 2)
+        self.assertEqual(readings.faults, [None, OPEN_TC, COMMON_MODE, None])
+        self.assertEqual(poller.open_tc_failures, [0, 2, 0, 0])
+        self.assertEqual(poller.common_mode_failures, [0, 0, 2, 0])
+        # the calibration applied to the raw code gives the input back
+        self.assertAlmostEqual(readings.tc_voltages[0], TC_OFFSET * 1e6,
+                               delta=lsbSize() * 1e6)
+        # a disabled channel is not read
+        self.assertEqual(readings.tc_voltages[3], 0.0)
+        self.assertEqual(readings.cjc_temps[3], 25.0)
+
+    def testCountsCarryOver(self):
+        board = mcc134(ADDRESS)
+        open_tc_failures = [5, 5, 5, 5]
+        poller = Mcc134Poller(board, ADDRESS,
+                              open_tc_failures=open_tc_failures)
+        poller.configure()
+        self.assertIs(poller.open_tc_failures, open_tc_failures)
+        self.assertEqual(open_tc_failures, [5, 6, 5, 5])
+
+
+if __name__ == "__main__":
+    unittest.main()
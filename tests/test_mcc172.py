@@ -0,0 +1,54 @@
+"""
+    Tests of the MCC 172 cycle schedule
+
+    A simulated MCC 172 is scanned with the default block and with a whole
+    second of samples, which needs longer phases.
+"""
+import os
+import sys
+import time
+import unittest
+
+os.environ["DAQHATS_SIM"] = "1"
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path[:0] = [ROOT, os.path.join(ROOT, "mcc172")]
+
+from ce_common import simhats
+from mcc172_worker import Mcc172Worker, PHASE_TIME, PHASE_MARGIN, SCAN_RATE
+
+ADDRESS = 4
+
+
+class PhaseTest(unittest.TestCase):
+    def testDefaultBlockKeepsThePhase(self):
+        worker = Mcc172Worker(address=ADDRESS)
+        self.assertEqual(worker.phase_time, PHASE_TIME)
+        self.assertEqual(worker.scheduler.period, 2 * PHASE_TIME)
+
+    def testLongBlockLengthensThePhase(self):
+        worker = Mcc172Worker(address=ADDRESS, samples_per_channel=SCAN_RATE)
+        self.assertAlmostEqual(worker.phase_time, 1.0 + PHASE_MARGIN)
+        self.assertEqual(worker.scheduler.offsets,
+                         (worker.phase_time, 2 * worker.phase_time))
+
+    def testOneSecondBlocksMeetTheirDeadlines(self):
+        simhats.reset()
+        worker = Mcc172Worker(address=ADDRESS, samples_per_channel=51200)
+        worker.start()
+        try:
+            deadline = time.monotonic() + 15.0
+            while time.monotonic() < deadline and worker.test_count < 2:
+                time.sleep(0.05)
+        finally:
+            worker.stop()
+        self.assertGreaterEqual(worker.test_count, 2)
+        self.assertEqual(worker.software_errors, 0)
+        self.assertEqual(worker.trigger_errors, 0)
+        stats = worker.scheduler.stats()
+        # an input and a trigger deadline for each cycle
+        self.assertGreaterEqual(stats.deadlines, 2 * worker.test_count - 1)
+        self.assertEqual((stats.missed, stats.skipped), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+    Tests of the phase timing histograms
+"""
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from ce_common.phasetimer import (Histogram, PhaseTimer, BUCKETS, formatBound,
+                                  timingLines)
+
+
+class HistogramTest(unittest.TestCase):
+    def testBuckets(self):
+        histogram = Histogram((0.001, 0.01, 0.1))
+        for seconds in (0.0005, 0.001, 0.002, 0.05, 0.5):
+            histogram.add(seconds)
+        # a time on a bound is counted in that bound's bucket
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertAlmostEqual(histogram.mean(), 0.5535 / 5)
+        self.assertEqual(histogram.maximum, 0.5)
+
+    def testPercentiles(self):
+        histogram = Histogram((0.001, 0.01, 0.1))
+        for _ in range(90):
+            histogram.add(0.0005)
+        for _ in range(9):
+            histogram.add(0.005)
+        histogram.add(0.05)
+        self.assertEqual(histogram.percentile(0.5), 0.001)
+        self.assertEqual(histogram.percentile(0.9), 0.001)
+        self.assertEqual(histogram.percentile(0.99), 0.01)
+        # the bound is capped at the longest time seen
+        self.assertEqual(histogram.percentile(1.0), 0.05)
+
+    def testPercentileInTheLastBucket(self):
+        histogram = Histogram((0.001,))
+        histogram.add(0.0001)
+        histogram.add(2.5)
+        self.assertEqual(histogram.percentile(0.99), 2.5)
+
+    def testEmpty(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.mean(), 0.0)
+        self.assertEqual(histogram.percentile(0.99), 0.0)
+        self.assertEqual(len(histogram.counts), len(BUCKETS) + 1)
+
+
+class PhaseTimerTest(unittest.TestCase):
+    def testDisabledTimerRecordsNothing(self):
+        timer = PhaseTimer()
+        lap = timer.start()
+        self.assertEqual(timer.lap("read", lap), 0.0)
+        self.assertEqual(timer.histograms(), [])
+
+    def testPhasesInTheOrderFirstSeen(self):
+        timer = PhaseTimer(True)
+        lap = timer.start()
+        lap = timer.lap("read", lap)
+        lap = timer.lap("compute", lap)
+        timer.lap("read", lap)
+        timer.add("log", 0.002)
+        phases = timer.histograms()
+        self.assertEqual([phase for phase, _ in phases],
+                         ["read", "compute", "log"])
+        self.assertEqual([histogram.count for _, histogram in phases],
+                         [2, 1, 1])
+        timer.reset()
+        self.assertEqual(timer.histograms(), [])
+
+    def testTimingLines(self):
+        timer = PhaseTimer(True, bounds=(0.001, 1.0))
+        timer.add("updateInputs.read", 0.0005)
+        lines = timingLines(timer)
+        self.assertEqual(lines[0].split()[-3:], ["<=1ms", "<=1s", "more"])
+        self.assertEqual(lines[1].split(),
+                         ["updateInputs.read", "1", "0.500", "0.500",
+                          "0.500", "1", "0", "0"])
+        self.assertEqual(formatBound(0.00003), "30us")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+    Tests of the RMS engine
+
+    Sine waves with a DC offset are reduced with the list path and, when
+    NumPy is installed, with the NumPy path.
+"""
+import math
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from ce_common.blockstats import numpy, HAVE_NUMPY
+from ce_common.rms import RmsEngine
+
+SAMPLES = 1000
+# amplitude and DC offset of each channel
+SIGNALS = [(1.0, 0.0), (2.0, 0.5), (0.0, -1.5)]
+
+
+def scanData(samples=SAMPLES):
+    """ Interleaved samples of whole periods of a sine on each channel. """
+    data = []
+    for index in range(samples):
+        phase = 2 * math.pi * 10 * index / samples
+        data.extend(amplitude * math.sin(phase) + offset
+                    for amplitude, offset in SIGNALS)
+    return data
+
+
+class RmsTest(unittest.TestCase):
+    def checkValues(self, engine):
+        for channel, (amplitude, offset) in enumerate(SIGNALS):
+            ac_rms = amplitude / math.sqrt(2)
+            self.assertAlmostEqual(engine.dc[channel], offset)
+            self.assertAlmostEqual(engine.ac_rms[channel], ac_rms)
+            self.assertAlmostEqual(engine.rms[channel],
+                                   math.sqrt(ac_rms**2 + offset**2))
+
+    def testListPath(self):
+        engine = RmsEngine(len(SIGNALS), use_numpy=False)
+        rms = engine.calculate(scanData() + [50.0], SAMPLES)
+        self.assertIs(rms, engine.rms)
+        self.checkValues(engine)
+
+    def testConstantBlockHasNoAcRms(self):
+        engine = RmsEngine(1, use_numpy=False)
+        engine.calculate([0.1] * SAMPLES, SAMPLES)
+        # rounding must not leave a negative mean square to take the root of
+        self.assertLess(engine.ac_rms[0], 1e-6)
+        self.assertAlmostEqual(engine.rms[0], 0.1)
+
+    @unittest.skipUnless(HAVE_NUMPY, "NumPy is not installed")
+    def testNumpyPath(self):
+        engine = RmsEngine(len(SIGNALS))
+        self.assertTrue(engine.use_numpy)
+        engine.calculate(numpy.array(scanData() + [50.0]), SAMPLES)
+        self.checkValues(engine)
+
+    @unittest.skipUnless(HAVE_NUMPY, "NumPy is not installed")
+    def testNumpyConstantBlock(self):
+        engine = RmsEngine(1)
+        engine.calculate(numpy.full(SAMPLES, 0.1), SAMPLES)
+        self.assertLess(engine.ac_rms[0], 1e-6)
+        self.assertAlmostEqual(engine.rms[0], 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+    Tests of the deadline scheduler
+
+    A fake monotonic clock, advanced by the sleep the scheduler is given,
+    makes the deadlines and the jitter exact.
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from ce_common import scheduler
+from ce_common.scheduler import DeadlineScheduler, MISS_LIMIT, scheduleLine
+
+
+class Clock(object):
+    def __init__(self, now=100.0):
+        self.now = now
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def work(self, seconds):
+        # time spent processing between waits
+        self.now += seconds
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(scheduler.time, "monotonic",
+                                    self.clock.monotonic)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def testProcessingTimeDoesNotAddUp(self):
+        schedule = DeadlineScheduler(1.0)
+        schedule.start()
+        for cycle in range(1, 6):
+            self.assertEqual(schedule.wait(self.clock.sleep), 0.0)
+            self.assertAlmostEqual(self.clock.now, 100.0 + cycle)
+            self.clock.work(0.3)
+        self.assertEqual([round(sleep, 9) for sleep in self.clock.sleeps],
+                         [1.0] + [0.7]*4)
+        stats = schedule.stats()
+        self.assertEqual((stats.deadlines, stats.missed, stats.skipped),
+                         (5, 0, 0))
+
+    def testPhases(self):
+        schedule = DeadlineScheduler(1.0, (0.5, 1.0))
+        schedule.start()
+        times = []
+        for _ in range(2):
+            for phase in (0, 1):
+                schedule.wait(self.clock.sleep, phase)
+                times.append(round(self.clock.now - 100.0, 9))
+                self.clock.work(0.1)
+        self.assertEqual(times, [0.5, 1.0, 1.5, 2.0])
+
+    def testPhaseThatHasRunWaitsForTheNextPeriod(self):
+        schedule = DeadlineScheduler(1.0, (0.5, 1.0))
+        schedule.start()
+        schedule.wait(self.clock.sleep, 0)
+        # phase 0 again, without phase 1 in between
+        schedule.wait(self.clock.sleep, 0)
+        self.assertAlmostEqual(self.clock.now, 101.5)
+
+    def testLateDeadlineIsMissed(self):
+        schedule = DeadlineScheduler(1.0)
+        schedule.start()
+        self.clock.work(1.0 + MISS_LIMIT / 2)
+        schedule.wait(self.clock.sleep)
+        self.clock.work(1.0 + MISS_LIMIT * 2)
+        jitter = schedule.wait(self.clock.sleep)
+        self.assertAlmostEqual(jitter, MISS_LIMIT * 2.5)
+        stats = schedule.stats()
+        self.assertEqual((stats.deadlines, stats.missed, stats.skipped),
+                         (2, 1, 0))
+        self.assertAlmostEqual(stats.max_jitter, MISS_LIMIT * 2.5)
+        self.assertAlmostEqual(stats.mean_jitter, MISS_LIMIT * 1.5)
+
+    def testWholePeriodsAreSkipped(self):
+        schedule = DeadlineScheduler(1.0)
+        schedule.start()
+        self.clock.work(3.2)
+        # the deadlines at 1 and 2 s are skipped, 3 s is late
+        jitter = schedule.wait(self.clock.sleep)
+        self.assertAlmostEqual(jitter, 0.2)
+        schedule.wait(self.clock.sleep)
+        self.assertAlmostEqual(self.clock.now, 104.0)
+        stats = schedule.stats()
+        self.assertEqual((stats.deadlines, stats.missed, stats.skipped),
+                         (2, 1, 2))
+
+    def testStopCutsTheWaitShort(self):
+        schedule = DeadlineScheduler(1.0)
+        schedule.start()
+        jitter = schedule.wait(lambda seconds: self.clock.sleep(0.1))
+        self.assertLess(jitter, 0.0)
+        self.assertEqual(schedule.stats().deadlines, 0)
+
+    def testFirstWaitStartsTheSchedule(self):
+        schedule = DeadlineScheduler(1.0)
+        self.assertEqual(schedule.wait(self.clock.sleep), 0.0)
+        self.assertEqual(self.clock.sleeps, [])
+        schedule.wait(self.clock.sleep)
+        self.assertEqual(self.clock.sleeps, [1.0])
+
+    def testScheduleLine(self):
+        schedule = DeadlineScheduler(0.5)
+        self.assertEqual(scheduleLine(schedule.stats()),
+                         "period 0.500 s, 0 deadlines, 0 missed, 0 skipped, "
+                         "jitter 0.00 ms (mean 0.00 ms, max 0.00 ms)")
+
+
+if __name__ == "__main__":
+    unittest.main()
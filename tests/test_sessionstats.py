@@ -0,0 +1,139 @@
+"""
+    Tests of the session statistics
+
+    The running statistics are checked against the statistics module and
+    a summary is written for fake workers to a temporary directory.
+"""
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from ce_common.phasetimer import PhaseTimer
+from ce_common.sessionstats import (ChannelStats, SessionStats, summaryLines,
+                                    summaryFilename, writeSummary)
+
+START = datetime.datetime(2026, 10, 17, 12, 0, 0)
+VALUES = [1.5, 2.25, -0.75, 1e6 + 0.1, 1e6 + 0.2, 3.0, 2.0]
+
+
+class ChannelStatsTest(unittest.TestCase):
+    def time(self, cycle):
+        return START + datetime.timedelta(seconds=cycle)
+
+    def testMeanAndVariance(self):
+        channel = ChannelStats("Ch 0", 10.0)
+        for cycle, value in enumerate(VALUES):
+            channel.update(value, self.time(cycle))
+        self.assertEqual(channel.count, len(VALUES))
+        self.assertAlmostEqual(channel.mean, statistics.mean(VALUES))
+        self.assertAlmostEqual(channel.variance() / statistics.variance(VALUES),
+                               1.0, places=9)
+
+    def testExtremesAndTheirTimes(self):
+        channel = ChannelStats("Ch 0", 2.0, reference=1.0)
+        for cycle, value in enumerate([1.2, 0.4, 2.5, 1.0]):
+            channel.update(value, self.time(cycle))
+        summary = channel.summary()
+        self.assertEqual((summary.minimum, summary.min_time),
+                         (0.4, self.time(1)))
+        self.assertEqual((summary.maximum, summary.max_time),
+                         (2.5, self.time(2)))
+        # the worst deviation is from the reference, not from 0
+        self.assertEqual((summary.worst, summary.worst_time),
+                         (1.5, self.time(2)))
+        self.assertAlmostEqual(summary.margin, 0.5)
+
+    def testLimitExceeded(self):
+        channel = ChannelStats("Ch 0", 1.0)
+        channel.update(-1.25, START)
+        self.assertEqual(channel.summary().worst, -1.25)
+        self.assertAlmostEqual(channel.summary().margin, -0.25)
+
+    def testTooFewValues(self):
+        channel = ChannelStats("Ch 0", 1.0)
+        self.assertEqual(channel.variance(), 0.0)
+        self.assertIsNone(channel.summary().margin)
+        channel.update(0.5, START)
+        self.assertEqual(channel.variance(), 0.0)
+        channel.reset()
+        self.assertEqual(channel.count, 0)
+        self.assertIsNone(channel.maximum)
+
+
+class SessionStatsTest(unittest.TestCase):
+    def testUpdateFromAChannel(self):
+        stats = SessionStats(["Ch 0", "Ch 1", "Ch 2"], [1.0, 1.0, 1.0])
+        stats.update([0.1, 0.2, 0.3], START)
+        stats.update([0.5], START, first=2)
+        self.assertEqual([channel.count for channel in stats.channels],
+                         [1, 1, 2])
+        self.assertAlmostEqual(stats.channels[2].mean, 0.4)
+
+    def testSummaryLines(self):
+        stats = SessionStats(["Ch 0", "Ch 1"], [1.0, 1.0])
+        stats.setReference(0, 0.5)
+        stats.update([0.75], START)
+        lines = summaryLines(stats.summary())
+        self.assertEqual(lines[0].split()[:3], ["Channel", "Cycles", "Mean"])
+        self.assertEqual(lines[1].split(),
+                         ["Ch", "0", "1", "0.7500", "0.0000", "0.7500",
+                          "12:00:00", "0.7500", "12:00:00", "0.2500",
+                          "12:00:00", "0.7500"])
+        # a channel without values is shown with dashes
+        self.assertEqual(lines[2].split(),
+                         ["Ch", "1", "0"] + ["--"] * 9)
+
+
+class Scheduler(object):
+    deadlines = 0
+
+
+class Worker(object):
+    def __init__(self, address, stats=None, lines=()):
+        self.address = address
+        self.serial = None
+        self.test_count = 12
+        self.software_errors = 1
+        self.scheduler = Scheduler() if address else None
+        self.stats = stats
+        self.timer = PhaseTimer()
+        self.lines = list(lines)
+
+    def reportLines(self, summary=False):
+        return self.lines if summary else []
+
+
+class WriteSummaryTest(unittest.TestCase):
+    def testSummaryFile(self):
+        stats = SessionStats(["Ch 0"], [1.0])
+        stats.update([0.25], START)
+        workers = [Worker(0, stats), Worker(1, lines=["Relay faults: 0"])]
+        timer = PhaseTimer(True)
+        timer.add("display", 0.001)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = summaryFilename(os.path.join(directory, "log.csv"))
+            self.assertEqual(os.path.basename(filename), "log_summary.txt")
+            writeSummary(filename, "MCC 118", workers, "V", timer)
+            with open(filename) as summary_file:
+                lines = summary_file.read().splitlines()
+        self.assertTrue(lines[0].startswith("MCC 118 CE test summary, "))
+        self.assertEqual(lines[1], "Values in V")
+        self.assertEqual(lines[3], "Board 0 serial --------: 12 cycles, "
+                                   "1 software errors")
+        self.assertTrue(lines[4].startswith("Channel"))
+        self.assertTrue(lines[5].startswith("Ch 0"))
+        self.assertEqual(lines[7], "Board 1 serial --------: 12 cycles, "
+                                   "1 software errors")
+        self.assertEqual(lines[8], "Relay faults: 0")
+        self.assertEqual(lines[10], "Display timing")
+        self.assertTrue(lines[12].startswith("display"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+    Tests of the emulated 34401A
+
+    The SCPI parser is driven directly through Sim34401A.handle() with no
+    reading delay, and once through the in-process transport.
+"""
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from ce_common.instrument import InstrumentTimeout
+from ce_common.simdmm import Sim34401A, LocalTransport, IDENTITY, MAX_READINGS
+
+
+class Sim34401ATest(unittest.TestCase):
+    def setUp(self):
+        self.dmm = Sim34401A(voltage=1.25, noise=0.0, latency=0.0)
+
+    def testShortAndLongForms(self):
+        for command in ("*IDN?", "*idn?"):
+            self.assertEqual(self.dmm.handle(command), IDENTITY)
+        for command in ("MEAS:VOLT:DC?", "measure:voltage?", ":MEAS:VOLT?"):
+            self.assertEqual(float(self.dmm.handle(command)), 1.25)
+        self.assertEqual(self.dmm.handle("SYST:ERR?"), '+0,"No error"')
+
+    def testUndefinedHeader(self):
+        self.assertIsNone(self.dmm.handle("MEAS:CURR?"))
+        self.assertIsNone(self.dmm.handle("VOLTAGE?"))
+        self.assertEqual(self.dmm.handle("SYSTEM:ERROR?"),
+                         '-113,"Undefined header"')
+        self.assertEqual(self.dmm.handle("SYST:ERR:NEXT?"),
+                         '-113,"Undefined header"')
+        self.assertEqual(self.dmm.handle("SYST:ERR?"), '+0,"No error"')
+
+    def testCompoundLine(self):
+        reply = self.dmm.handle("CONF:VOLT:DC; SAMP:COUN 3; SAMP:COUN?; "
+                                "TRIG:COUN?")
+        self.assertEqual(reply, "+3;+1")
+
+    def testBufferedReadings(self):
+        self.dmm.handle("CONF:VOLT:DC;SAMP:COUN 4;TRIG:COUN 2")
+        self.dmm.handle("INIT")
+        readings = self.dmm.handle("FETC?").split(",")
+        self.assertEqual(len(readings), 8)
+        self.assertEqual(self.dmm.handle("DATA:POIN?"), "+8")
+        # CONF returns to one reading
+        self.dmm.handle("CONF:VOLT")
+        self.assertEqual(self.dmm.handle("SAMP:COUN?"), "+1")
+
+    def testReadingMemoryLimit(self):
+        self.dmm.handle("SAMP:COUN 1000")
+        self.assertEqual(len(self.dmm.handle("READ?").split(",")),
+                         MAX_READINGS)
+
+    def testCountErrors(self):
+        self.dmm.handle("SAMP:COUN 0")
+        self.dmm.handle("TRIG:COUN many")
+        self.assertEqual(self.dmm.handle("SYST:ERR?"),
+                         '-222,"Data out of range"')
+        self.assertEqual(self.dmm.handle("SYST:ERR?"),
+                         '-104,"Data type error"')
+        self.assertEqual(self.dmm.handle("SAMP:COUN?"), "+1")
+
+    def testStaleFetchAndDoubleInit(self):
+        self.assertIsNone(self.dmm.handle("FETC?"))
+        self.dmm.handle("INIT;INIT")
+        self.assertEqual(self.dmm.handle("SYST:ERR?"), '-230,"Data stale"')
+        self.assertEqual(self.dmm.handle("SYST:ERR?"), '-213,"Init ignored"')
+
+    def testSource(self):
+        voltages = [0.5, 2.5]
+        dmm = Sim34401A(noise=0.0, latency=0.0, source=lambda: voltages[0])
+        self.assertEqual(float(dmm.handle("READ?")), 0.5)
+        voltages[0] = voltages[1]
+        self.assertEqual(float(dmm.handle("READ?")), 2.5)
+
+    def testLocalTransport(self):
+        transport = LocalTransport(self.dmm)
+        self.assertEqual(transport.query("*IDN?"), IDENTITY)
+        transport.write("DISP:TEXT 'CE TEST'")
+        self.assertEqual(transport.query("DISP:TEXT?"), '"CE TEST"')
+        # a command without a reply leaves nothing to read
+        with self.assertRaises(InstrumentTimeout):
+            transport.query("*CLS")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+    Tests of the spectral monitor
+
+    A tone on one channel and low noise with a small DC offset on the
+    other are compared to the mask. The monitor needs NumPy.
+"""
+import os
+import random
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from ce_common import spectrum
+from ce_common.spectrum import (SpectrumMonitor, numpy, HAVE_NUMPY, FFT_SIZE,
+                                MAX_FLAGS, spectrumFilename)
+
+RATE = 51200.0
+SAMPLES = 8192
+TONE = 1000.0            # Hz, on a bin
+AMPLITUDE = 0.01         # V, 7.07 mV rms
+
+
+def scanData(amplitude=AMPLITUDE):
+    """ Channel 0 has the tone, channel 1 noise on a 1 mV offset. """
+    generator = random.Random(172)
+    times = numpy.arange(SAMPLES) / RATE
+    data = numpy.empty((SAMPLES, 2))
+    data[:, 0] = amplitude * numpy.sin(2 * numpy.pi * TONE * times)
+    data[:, 1] = [0.001 + generator.gauss(0.0, 1e-4) for _ in range(SAMPLES)]
+    return data.reshape(-1)
+
+
+@unittest.skipUnless(HAVE_NUMPY, "NumPy is not installed")
+class SpectrumTest(unittest.TestCase):
+    def testToneAboveTheMaskIsFlagged(self):
+        monitor = SpectrumMonitor(2, RATE)
+        flags = monitor.process(scanData(), SAMPLES)
+        self.assertEqual(monitor.flags, [1, 0])
+        self.assertEqual(monitor.frames, [3, 3])
+        self.assertTrue(flags)
+        self.assertLessEqual(len(flags), MAX_FLAGS)
+        self.assertTrue(all(flag.channel == 0 for flag in flags))
+        # the largest first
+        self.assertEqual(flags[0].frequency, TONE)
+        self.assertAlmostEqual(flags[0].level,
+                               AMPLITUDE * 1e3 / numpy.sqrt(2.0), places=3)
+        self.assertEqual(flags[0].limit, 1.0)
+        self.assertIs(monitor.last_flags, flags)
+
+    def testNothingAboveTheMask(self):
+        monitor = SpectrumMonitor(2, RATE)
+        self.assertEqual(monitor.process(scanData(0.0001), SAMPLES), [])
+        self.assertEqual(monitor.flags, [0, 0])
+
+    def testInterpolatedMask(self):
+        monitor = SpectrumMonitor(2, RATE, mask=[(2000.0, 1.0), (0.0, 20.0)])
+        self.assertEqual(monitor.mask[0], numpy.inf)
+        self.assertAlmostEqual(
+            monitor.mask[numpy.searchsorted(monitor.frequencies, TONE)], 10.5)
+        self.assertEqual(monitor.mask[-1], 1.0)
+        # the tone is under the mask at 1 kHz
+        self.assertEqual(monitor.process(scanData(), SAMPLES), [])
+
+    def testShortBlock(self):
+        monitor = SpectrumMonitor(2, RATE)
+        self.assertEqual(monitor.process(scanData()[:2 * (FFT_SIZE - 1)],
+                                         FFT_SIZE - 1), [])
+        self.assertEqual(monitor.frames, [0, 0])
+
+    def testMaxHoldAndAverage(self):
+        monitor = SpectrumMonitor(2, RATE)
+        monitor.process(scanData(), SAMPLES)
+        monitor.process(scanData(0.0), SAMPLES)
+        index = numpy.searchsorted(monitor.frequencies, TONE)
+        level = AMPLITUDE * 1e3 / numpy.sqrt(2.0)
+        self.assertAlmostEqual(monitor.max_hold[0, index], level, places=3)
+        # half of the frames had the tone
+        self.assertAlmostEqual(monitor.average()[0, index],
+                               level / numpy.sqrt(2.0), places=3)
+        monitor.reset()
+        self.assertEqual(monitor.max_hold.max(), 0.0)
+
+    def testWrite(self):
+        monitor = SpectrumMonitor(2, RATE)
+        monitor.process(scanData(), SAMPLES)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = spectrumFilename(
+                os.path.join(directory, "log.csv"), 4)
+            self.assertEqual(os.path.basename(filename),
+                             "log_spectrum_bd4.csv")
+            monitor.write(filename)
+            with open(filename) as spectrum_file:
+                lines = spectrum_file.read().splitlines()
+        self.assertEqual(len(lines), FFT_SIZE // 2 + 2)
+        self.assertEqual(lines[0].split(",")[-1], "Mask (mV rms)")
+
+
+class NoNumpyTest(unittest.TestCase):
+    def testNeedsNumpy(self):
+        with mock.patch.object(spectrum, "HAVE_NUMPY", False):
+            with self.assertRaises(RuntimeError):
+                SpectrumMonitor(2, RATE)
+
+
+if __name__ == "__main__":
+    unittest.main()